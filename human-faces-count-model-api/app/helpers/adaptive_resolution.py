@@ -0,0 +1,111 @@
+import json
+import logging
+import math
+
+import numpy as np
+
+from config.base_config import (
+    IMG_SIZE, ADAPTIVE_MIN_IMGSZ, ADAPTIVE_MIN_FACE_PX, ADAPTIVE_FULL_EVERY, ADAPTIVE_WARMUP,
+    ADAPTIVE_EWMA_ALPHA, ADAPTIVE_COUNT_JUMP, ADAPTIVE_STATE_TTL
+)
+from config.persistence.shared_store import get_shared_store
+
+logger = logging.getLogger(__name__)
+
+IMGSZ_STEP = 32         # YOLO stride; imgsz is always a multiple of it
+FACE_PERCENTILE = 20    # small faces drive the resolution, not the average one
+
+
+def state_key(device_imei: str) -> str:
+    return f"faces:res:{device_imei}"
+
+
+class ResolutionController:
+    """Picks the smallest inference imgsz that keeps a device's faces above min_face_px.
+
+    Per device it keeps an EWMA of the small-face size as a fraction of the frame's
+    longest side. That estimate is only learnt from full-resolution passes (a reduced
+    pass cannot see the faces it is too small for), which run for the first `warmup`
+    frames, every `full_every` frames, and on the next frame after the count jumps by
+    more than count_jump (relative, at least 2 faces). State lives in the shared store
+    so every worker sees the same device history.
+    """
+
+    def __init__(self, full_size=IMG_SIZE, min_size=ADAPTIVE_MIN_IMGSZ, min_face_px=ADAPTIVE_MIN_FACE_PX,
+                 full_every=ADAPTIVE_FULL_EVERY, warmup=ADAPTIVE_WARMUP, alpha=ADAPTIVE_EWMA_ALPHA,
+                 count_jump=ADAPTIVE_COUNT_JUMP, ttl=ADAPTIVE_STATE_TTL, store=None):
+        self.full_size = full_size
+        self.min_size = min(min_size, full_size)
+        self.min_face_px = min_face_px
+        self.full_every = full_every
+        self.warmup = warmup
+        self.alpha = alpha
+        self.count_jump = count_jump
+        self.ttl = ttl
+        self._store = store
+        self.stats = {"full": 0, "reduced": 0}
+
+    @property
+    def store(self):
+        if self._store is None:
+            self._store = get_shared_store()
+        return self._store
+
+    def _load(self, device_imei):
+        try:
+            raw = self.store.get(state_key(device_imei))
+        except Exception as e:
+            logger.warning(f"Resolution state lookup failed {type(e).__name__} - {e}")
+            return None
+        return json.loads(raw) if raw is not None else None
+
+    def _save(self, device_imei, state):
+        try:
+            self.store.set(state_key(device_imei), json.dumps(state), ex=self.ttl)
+        except Exception as e:
+            logger.warning(f"Resolution state write failed {type(e).__name__} - {e}")
+
+    def choose(self, device_imei: str) -> int:
+        """imgsz to run this device's next frame at."""
+        state = self._load(device_imei)
+        if (state is None or state["samples"] < self.warmup or state["force_full"]
+                or state["since_full"] >= self.full_every or not state["face_frac"]):
+            self.stats["full"] += 1
+            return self.full_size
+
+        needed = self.min_face_px / state["face_frac"]
+        imgsz = int(math.ceil(needed / IMGSZ_STEP) * IMGSZ_STEP)
+        imgsz = max(self.min_size, min(self.full_size, imgsz))
+        self.stats["full" if imgsz == self.full_size else "reduced"] += 1
+        return imgsz
+
+    def observe(self, device_imei: str, imgsz: int, frame_shape, boxes, count: int):
+        """Record the detections of a frame run at imgsz (boxes are xyxy in frame pixels)."""
+        state = self._load(device_imei) or {"face_frac": None, "samples": 0, "since_full": 0,
+                                            "last_count": None, "force_full": False}
+        full = imgsz >= self.full_size
+
+        last = state["last_count"]
+        jumped = last is not None and abs(count - last) >= max(2, self.count_jump * last)
+        state["last_count"] = count
+        state["force_full"] = jumped and not full
+
+        if full:
+            state["since_full"] = 0
+            boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+            if len(boxes):
+                sides = np.minimum(boxes[:, 2] - boxes[:, 0], boxes[:, 3] - boxes[:, 1])
+                frac = float(np.percentile(sides, FACE_PERCENTILE)) / max(frame_shape[:2])
+                if frac > 0:
+                    prev = state["face_frac"]
+                    state["face_frac"] = frac if prev is None else (1 - self.alpha) * prev + self.alpha * frac
+                    state["samples"] += 1
+        else:
+            state["since_full"] += 1
+
+        if jumped:
+            logger.info(f"Face count for {device_imei} jumped {last} -> {count}, next frame at full resolution")
+        self._save(device_imei, state)
+
+
+resolution_controller = ResolutionController()
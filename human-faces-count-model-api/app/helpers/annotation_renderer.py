@@ -0,0 +1,137 @@
+import logging
+import os
+import re
+import tempfile
+import threading
+
+import cv2
+import numpy as np
+from fastapi import HTTPException
+from sqlalchemy import select
+
+from config.base_config import RENDER_CACHE_DIR, RENDER_CACHE_MAX_BYTES
+from config.persistence.postgres_db import SyncSessionLocal
+from ..models.counts import FaceDetectionCount
+from .load_image_from_url import fetch_image_bytes, decode_image
+from .face_pipeline import draw_detections
+from .metrics import observe_stage, record_lookup
+
+logger = logging.getLogger(__name__)
+
+_IMAGE_ID = re.compile(r"^[0-9a-f]{16}$")
+
+
+class RenderCache:
+    """Rendered JPEGs on local disk, evicted least recently used once max_bytes is exceeded.
+
+    Recency is the file mtime (touched on every hit), so the cache survives restarts and
+    can be shared by API processes on the same host; the byte total is per process and
+    rebuilt from the directory on start.
+    """
+
+    def __init__(self, directory=RENDER_CACHE_DIR, max_bytes=RENDER_CACHE_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        self._total = sum(entry.stat().st_size for entry in os.scandir(directory) if entry.is_file())
+
+    def _path(self, key):
+        return os.path.join(self.directory, key)
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+            os.utime(path)
+            return data
+        except FileNotFoundError:
+            return None
+
+    def put(self, key, data: bytes):
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, self._path(key))
+        with self._lock:
+            self._total += len(data)
+            if self._total > self.max_bytes:
+                self._evict()
+
+    def _evict(self):
+        entries = sorted(
+            (entry for entry in os.scandir(self.directory) if entry.is_file() and not entry.name.endswith(".tmp")),
+            key=lambda entry: entry.stat().st_mtime,
+        )
+        self._total = sum(entry.stat().st_size for entry in entries)
+        target = self.max_bytes * 0.9   # evict a little extra so puts do not rescan every time
+        for entry in entries:
+            if self._total <= target:
+                break
+            try:
+                size = entry.stat().st_size
+                os.unlink(entry.path)
+                self._total -= size
+            except FileNotFoundError:
+                pass
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_render_cache() -> RenderCache:
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = RenderCache()
+    return _cache
+
+
+def render_annotated(image_id: str, size: int, quality: int) -> bytes:
+    """JPEG of the original image with its stored boxes drawn, longest side at most size (0 = original)."""
+    if not _IMAGE_ID.match(image_id):
+        raise HTTPException(status_code=404, detail="Unknown image id.")
+
+    key = f"{image_id}_{size}_{quality}.jpg"
+    cache = get_render_cache()
+    data = cache.get(key)
+    record_lookup("render_cache", data is not None)
+    if data is not None:
+        return data
+
+    with SyncSessionLocal() as session:
+        row = session.execute(
+            select(FaceDetectionCount).where(FaceDetectionCount.id == image_id).limit(1)
+        ).scalar_one_or_none()
+    if row is None:
+        raise HTTPException(status_code=404, detail="Unknown image id.")
+
+    with observe_stage("render"):
+        # Reduced JPEG decode when the requested size is far below the original
+        frame, scale = decode_image(fetch_image_bytes(row.original_image_url), size or None)
+        ratio = 1.0 / scale
+        if size and max(frame.shape[:2]) > size:
+            shrink = size / max(frame.shape[:2])
+            frame = cv2.resize(frame, None, fx=shrink, fy=shrink, interpolation=cv2.INTER_AREA)
+            ratio *= shrink
+
+        # Stored boxes are [x, y, w, h] in source image pixels
+        xywh, confs = row.face_arrays
+        xywh = xywh.astype(np.int32)
+        xyxy = np.rint(np.hstack([xywh[:, :2], xywh[:, :2] + xywh[:, 2:]]) * ratio).astype(int)
+        draw_detections(frame, [tuple(box) for box in xyxy.tolist()], (confs / 255).tolist())
+
+        success, encoded = cv2.imencode(".jpg", cv2.cvtColor(frame, cv2.COLOR_RGB2BGR),
+                                        [cv2.IMWRITE_JPEG_QUALITY, quality])
+        if not success:
+            raise HTTPException(status_code=500, detail="Failed to encode annotated image.")
+
+    data = encoded.tobytes()
+    try:
+        cache.put(key, data)
+    except OSError as e:
+        logger.warning(f"Render cache write failed {type(e).__name__} - {e}")
+    return data
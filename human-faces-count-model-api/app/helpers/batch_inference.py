@@ -0,0 +1,139 @@
+import logging
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+from config.base_config import (
+    IMG_SIZE, CONF_THRESH, IOU_THRESH, DEVICE,
+    INFERENCE_BATCHING, BATCH_MAX_SIZE, BATCH_MAX_WAIT_MS
+)
+from config.inference.model_registry import get_model, uses_model_server
+
+logger = logging.getLogger(__name__)
+
+# Ultralytics predictors are not thread-safe; threads of one process share the model
+_predict_lock = threading.Lock()
+
+
+def extract_detections(result):
+    """Return (xyxy boxes, confidences) numpy arrays from a YOLO result."""
+    return result.boxes.xyxy.cpu().numpy(), result.boxes.conf.cpu().numpy()
+
+
+def predict_frames(frames, imgsz=IMG_SIZE):
+    """Run a single model.predict call over a list of frames (on the host model server when enabled)."""
+    if uses_model_server():
+        from app.model_server.client import get_model_client
+        return get_model_client().predict(frames, imgsz)
+
+    model = get_model()
+    with _predict_lock:
+        results = model.predict(
+            source=list(frames),
+            imgsz=imgsz,
+            conf=CONF_THRESH,
+            iou=IOU_THRESH,
+            device=DEVICE,
+            verbose=False,
+        )
+    return [extract_detections(result) for result in results]
+
+
+class BatchInferenceEngine:
+    """Collects frames from concurrent callers and runs them as one batched predict.
+
+    A batch is dispatched when it reaches max_batch_size frames or when the oldest
+    frame has waited max_wait_ms, whichever comes first. Frames requested at different
+    imgsz values are never mixed in the same predict call.
+    """
+
+    def __init__(self, max_batch_size=BATCH_MAX_SIZE, max_wait_ms=BATCH_MAX_WAIT_MS, predict_fn=predict_frames):
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, max_wait_ms) / 1000.0
+        self._predict_fn = predict_fn
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+
+    @property
+    def pending(self) -> int:
+        """Frames waiting for the next batch in this process."""
+        return self._queue.qsize() if self._pid == os.getpid() else 0
+
+    def submit(self, frame, imgsz=IMG_SIZE) -> Future:
+        """Queue a frame and return a future resolving to (boxes, confidences)."""
+        self._ensure_started()
+        future = Future()
+        self._queue.put((frame, imgsz, future))
+        return future
+
+    def predict(self, frame, imgsz=IMG_SIZE):
+        """Blocking helper: submit a frame and wait for its detections."""
+        return self.submit(frame, imgsz).result()
+
+    def predict_many(self, frames, imgsz=IMG_SIZE):
+        """Submit several frames at once and wait for all of their detections."""
+        futures = [self.submit(frame, imgsz) for frame in frames]
+        return [future.result() for future in futures]
+
+    def _ensure_started(self):
+        # Celery prefork children inherit the parent's memory but not its threads,
+        # so the dispatcher is (re)started lazily in whichever process uses it.
+        if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+                return
+            if self._pid != os.getpid():
+                self._queue = queue.Queue()
+                self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name="batch-inference", daemon=True)
+            self._thread.start()
+            logger.info(f"Batch inference engine started (max_batch={self.max_batch_size}, max_wait={self.max_wait * 1000:.0f}ms)")
+
+    def _collect(self):
+        """Block for the first frame, then gather more until the batch is full or the wait expires."""
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+
+            groups = {}
+            for item in batch:
+                groups.setdefault(item[1], []).append(item)
+
+            for imgsz, items in groups.items():
+                try:
+                    detections = self._predict_fn([frame for frame, _, _ in items], imgsz)
+                except Exception as e:
+                    logger.error(f"Batched inference failed for {len(items)} frame(s): {type(e).__name__} - {e}")
+                    for _, _, future in items:
+                        future.set_exception(e)
+                    continue
+
+                for (_, _, future), result in zip(items, detections):
+                    future.set_result(result)
+
+
+engine = BatchInferenceEngine()
+
+
+def run_inference(frame, imgsz=IMG_SIZE):
+    """Detect faces in one frame, through the batching engine when INFERENCE_BATCHING is on."""
+    if INFERENCE_BATCHING:
+        return engine.predict(frame, imgsz)
+    return predict_frames([frame], imgsz)[0]
@@ -0,0 +1,174 @@
+import atexit
+import logging
+import os
+import queue
+import threading
+import time
+
+from config.base_config import DB_FLUSH_SIZE, DB_FLUSH_INTERVAL_MS, DB_WRITE_QUEUE_MAX, OCCUPANCY_ROLLUPS
+from config.persistence.postgres_db import engine as default_engine
+from config.persistence.partitions import ensure_row_partitions
+from ..models.counts import FaceDetectionCount
+from .occupancy_rollups import update_rollups, lock_stored_rows, changed_rows, rebuild_buckets
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+
+
+def _insert_for(dialect_name):
+    if dialect_name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    elif dialect_name == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        raise NotImplementedError(f"No upsert support for dialect '{dialect_name}'")
+    return insert
+
+
+def _upsert(conn, table, rows):
+    insert = _insert_for(conn.dialect.name)
+    stmt = insert(table).values(rows)
+    key = list(table.primary_key.columns)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=key,
+        set_={column.name: stmt.excluded[column.name] for column in table.columns if column not in key},
+    )
+    conn.execute(stmt)
+
+
+def upsert_rows(conn, rows, table=FaceDetectionCount.__table__):
+    """Multi-row INSERT ... ON CONFLICT (primary key) DO UPDATE in a single statement, plus occupancy rollups."""
+    # A statement may not touch the same key twice; keep the newest row per id
+    rows = list({row["id"]: row for row in rows}.values())
+    if table is not FaceDetectionCount.__table__:
+        _upsert(conn, table, rows)
+        return len(rows)
+    ensure_row_partitions(conn.engine, rows)
+    if not OCCUPANCY_ROLLUPS:
+        _upsert(conn, table, rows)
+        return len(rows)
+
+    # Insert first: RETURNING names exactly the rows this transaction added (a concurrent insert
+    # of the same id makes it wait and then conflict), and only those are added to the rollups
+    stmt = _insert_for(conn.dialect.name)(table).values(rows)
+    stmt = stmt.on_conflict_do_nothing(index_elements=list(table.primary_key.columns)).returning(table.c.id)
+    inserted = set(conn.execute(stmt).scalars())
+    update_rollups(conn, [row for row in rows if row["id"] in inserted])
+
+    existing = [row for row in rows if row["id"] not in inserted]
+    if existing:
+        stored = lock_stored_rows(conn, [row["id"] for row in existing])
+        _upsert(conn, table, existing)
+        changed = changed_rows(stored, existing)
+        if changed:
+            rebuild_buckets(conn, changed)
+    return len(rows)
+
+
+class BulkWriter:
+    """Background writer that batches face_detection_counts rows per worker process.
+
+    Rows are flushed when flush_size rows are pending or flush_interval_ms has passed
+    since the first pending row. The queue is bounded (max_pending), so producers
+    block instead of growing memory when the database falls behind. A failing batch
+    is retried row by row so one bad row cannot drop its neighbours.
+    """
+
+    def __init__(self, engine=default_engine, flush_size=DB_FLUSH_SIZE, flush_interval_ms=DB_FLUSH_INTERVAL_MS,
+                 max_pending=DB_WRITE_QUEUE_MAX, write_fn=upsert_rows):
+        self.engine = engine
+        self.flush_size = max(1, flush_size)
+        self.flush_interval = flush_interval_ms / 1000.0
+        self._write_fn = write_fn
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._closed = False
+        self.stats = {"rows_written": 0, "rows_failed": 0, "flushes": 0}
+        self._thread = threading.Thread(target=self._run, name="db-bulk-writer", daemon=True)
+        self._thread.start()
+
+    def submit(self, row: dict, timeout=None):
+        """Queue a row for the next flush; blocks while the queue is full."""
+        if self._closed:
+            raise RuntimeError("BulkWriter is closed")
+        self._queue.put(row, timeout=timeout)
+
+    def close(self, timeout=30):
+        """Flush everything still pending and stop the writer thread."""
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(_STOP)
+        self._thread.join(timeout)
+        logger.info(f"DB bulk writer stopped: {self.stats}")
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            first = self._queue.get()
+            if first is _STOP:
+                break
+            batch = [first]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.flush_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    row = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if row is _STOP:
+                    stopping = True
+                    break
+                batch.append(row)
+            self._flush(batch)
+
+    def _flush(self, rows):
+        self.stats["flushes"] += 1
+        try:
+            with self.engine.begin() as conn:
+                self._write_fn(conn, rows)
+            self.stats["rows_written"] += len(rows)
+            logger.info(f"Flushed {len(rows)} face count row(s) to the database.")
+            return
+        except Exception as e:
+            logger.error(f"Bulk flush of {len(rows)} rows failed, retrying row by row: {type(e).__name__} - {e}")
+
+        for row in rows:
+            try:
+                with self.engine.begin() as conn:
+                    self._write_fn(conn, [row])
+                self.stats["rows_written"] += 1
+            except Exception as e:
+                self.stats["rows_failed"] += 1
+                logger.error(f"Failed to save metadata row {row.get('id')}: {type(e).__name__} - {e}")
+
+
+_writer = None
+_writer_pid = None
+_writer_lock = threading.Lock()
+
+
+def get_bulk_writer() -> BulkWriter:
+    """The writer of this process (created lazily so each forked worker child gets its own)."""
+    global _writer, _writer_pid
+    if _writer is None or _writer_pid != os.getpid():
+        with _writer_lock:
+            if _writer is None or _writer_pid != os.getpid():
+                _writer, _writer_pid = BulkWriter(), os.getpid()
+    return _writer
+
+
+def writer_pending() -> int:
+    """Rows waiting for the next flush in this process."""
+    return _writer._queue.qsize() if _writer is not None and _writer_pid == os.getpid() else 0
+
+
+def shutdown_bulk_writer():
+    """Flush pending rows; wired to Celery worker shutdown and interpreter exit."""
+    if _writer is not None and _writer_pid == os.getpid():
+        _writer.close()
+
+
+atexit.register(shutdown_bulk_writer)
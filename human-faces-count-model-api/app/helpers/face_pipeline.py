@@ -0,0 +1,118 @@
+import logging
+import time
+
+import cv2
+from fastapi import HTTPException
+
+from config.base_config import (
+    FACE_FILTER_MODE, ENHANCE_MODE, ENHANCE_SHARPEN, ENHANCE_CLAHE, IMG_SIZE, INFERENCE_MODE, INFERENCE_BATCHING
+)
+from .filter_faces import MIN_FACE_SIZE, is_likely_face, filter_faces_batch
+from .image_enhancer import enhance_face_crop, enhance_frame_fast
+from .batch_inference import run_inference, engine, predict_frames
+from .tiled_inference import run_inference_tiled
+from .metrics import observe_stage, FACES_PER_IMAGE, STAGE_SECONDS
+
+logger = logging.getLogger(__name__)
+
+
+def enhance_frame(frame):
+    """Full-frame enhancement before inference (ENHANCE_MODE)."""
+    with observe_stage("enhance"):
+        if ENHANCE_MODE == "fast":
+            return enhance_frame_fast(frame, sharpen=ENHANCE_SHARPEN, clahe=ENHANCE_CLAHE)
+        return enhance_face_crop(frame)
+
+
+def detect_faces(frame, imgsz=IMG_SIZE):
+    """Run model inference (tiled or full frame, batched with other in-flight frames when enabled)."""
+    try:
+        with observe_stage("inference"):
+            return run_inference_tiled(frame) if INFERENCE_MODE == "tiled" else run_inference(frame, imgsz)
+    except Exception as e:
+        logger.exception(f"Model inference failed. {type(e).__name__} - {e}")
+        raise HTTPException(status_code=500, detail=f"Model inference failed: {type(e).__name__} - {e}")
+
+
+def detect_faces_many(frames, imgsz=IMG_SIZE):
+    """Inference for several frames at once: one predict call (tiled mode goes frame by frame)."""
+    if INFERENCE_MODE == "tiled":
+        return [detect_faces(frame, imgsz) for frame in frames]
+    with observe_stage("inference"):
+        return engine.predict_many(frames, imgsz) if INFERENCE_BATCHING else predict_frames(frames, imgsz)
+
+
+def draw_detections(frame, boxes, confs):
+    """Draw xyxy boxes and their confidences onto frame in place."""
+    for (x1, y1, x2, y2), conf in zip(boxes, confs):
+        cv2.rectangle(frame, (x1, y1), (x2, y2), (0, 255, 0), 2)
+        cv2.putText(
+            frame,
+            f"{conf:.2f}",
+            (x1, y1 - 5),
+            cv2.FONT_HERSHEY_SIMPLEX,
+            0.5,
+            (0, 255, 0),
+            1,
+        )
+    return frame
+
+
+def analyze_detections(frame, boxes, confs, scale=1, annotate=True):
+    """Filter false positives and annotate the frame.
+
+    Returns ({"faces", "count"}, annotated frame or None without annotate, kept xyxy boxes in
+    frame pixels); stored face boxes are in source image pixels, whatever resolution was decoded.
+    MIN_FACE_SIZE applies in source pixels too; the annotated frame is at decoded resolution.
+    """
+    output = {"faces": [], "count": 0}
+    annotated = None
+    kept_boxes, kept_confs = [], []
+    start = time.perf_counter()
+
+    try:
+        h_img, w_img = frame.shape[:2]
+
+        # Filter all boxes in one vectorized pass, or enhance + check each crop
+        min_size = MIN_FACE_SIZE / scale
+        keep = filter_faces_batch(frame, boxes, confs, min_size) if FACE_FILTER_MODE == "fast" else None
+
+        for i, box in enumerate(boxes):
+            x1, y1, x2, y2 = map(int, box)
+            conf = float(confs[i])
+
+            x1c, y1c = max(0, x1), max(0, y1)
+            x2c, y2c = min(w_img, x2), min(h_img, y2)
+            if x2c <= x1c or y2c <= y1c:
+                continue
+
+            if keep is not None:
+                if not keep[i]:
+                    continue
+            else:
+                face_crop = frame[y1c:y2c, x1c:x2c]
+                if face_crop.size == 0:
+                    continue
+
+                enhanced_crop = enhance_face_crop(face_crop)
+                if not is_likely_face(enhanced_crop, conf, min_size):
+                    continue
+
+            kept_boxes.append((x1c, y1c, x2c, y2c))
+            kept_confs.append(conf)
+
+            output["faces"].append(
+                {"bbox": [round(v * scale) for v in (x1c, y1c, x2c - x1c, y2c - y1c)], "confidence": round(conf, 2)}
+            )
+
+        output["count"] = len(output["faces"])
+        if annotate:
+            annotated = draw_detections(frame.copy(), kept_boxes, kept_confs)
+
+    except Exception as e:
+        logger.error(f"Error during result processing {type(e).__name__} - {e}")
+        raise HTTPException(status_code=500, detail=f"Error processing detection results: {type(e).__name__} - {e}")
+
+    STAGE_SECONDS.labels(stage="postprocess").observe(time.perf_counter() - start)
+    FACES_PER_IMAGE.observe(output["count"])
+    return output, annotated, kept_boxes
@@ -0,0 +1,122 @@
+"""Queue routing by lane and customer shard, and per-customer concurrency caps.
+
+Tasks go to faces.<lane>.<shard>: lane is "live" (single frames, /faces and uploads) or
+"backfill" (/faces/batch, or lane="backfill" on /faces), shard is a hash of the customer id
+(FAIR_SHARDS queues per lane). A worker consuming several queues takes from them in turn,
+so one customer's flood only fills its own shard; run.sh gives live queues their own
+workers so backfill can never occupy them.
+"""
+import logging
+import time
+import zlib
+
+from config.base_config import FAIR_SHARDS, TENANT_MAX_CONCURRENCY, TENANT_CONCURRENCY, TENANT_SLOT_TTL
+from config.persistence.shared_store import get_shared_store
+
+logger = logging.getLogger(__name__)
+
+LANES = ("live", "backfill")
+TASK_LANES = {"save_image_and_metadata_task": "live", "process_image_batch_task": "backfill",
+              "maintain_partitions_task": "backfill"}
+
+
+def shard_of(customer_id) -> int:
+    return zlib.crc32(str(customer_id).encode()) % FAIR_SHARDS if customer_id is not None else 0
+
+
+def queue_name(lane: str, customer_id=None) -> str:
+    return f"faces.{lane}.{shard_of(customer_id)}"
+
+
+def lane_queues(lane: str):
+    """All queues of a lane, e.g. for `celery worker -Q`."""
+    return [f"faces.{lane}.{shard}" for shard in range(FAIR_SHARDS)]
+
+
+def task_customer(name, args, kwargs):
+    if name == "process_image_batch_task":
+        items = kwargs.get("items", args[0] if args else None)
+        return items[0]["customer_id"] if items else None
+    if "customer_id" in kwargs:
+        return kwargs["customer_id"]
+    return args[1] if len(args) > 1 else None
+
+
+def route_task(name, args, kwargs, options, task=None, **kw):
+    """Celery task_routes router: {"queue": faces.<lane>.<shard>} for the face tasks."""
+    lane = kwargs.get("lane") or TASK_LANES.get(name)
+    if lane not in LANES:
+        return None
+    return {"queue": queue_name(lane, task_customer(name, args, kwargs))}
+
+
+def parse_limits(spec: str) -> dict:
+    """"acme:4,globex:1" -> {"acme": 4, "globex": 1}."""
+    limits = {}
+    for entry in filter(None, (part.strip() for part in spec.split(","))):
+        customer, _, limit = entry.rpartition(":")
+        limits[customer] = int(limit)
+    return limits
+
+
+class TenantLimiter:
+    """Caps the tasks one customer runs at once across all workers.
+
+    Each running task holds a slot: its id in a per-customer sorted set in the shared store,
+    scored by start time. acquire() admits a holder when it is among the `limit` oldest
+    slots, otherwise the task is retried later instead of holding a worker. Slots older
+    than slot_ttl seconds are trimmed, so the slot of a killed child expires on its own
+    (and a task running longer than slot_ttl only lets one extra task in meanwhile).
+    """
+
+    def __init__(self, default_limit=TENANT_MAX_CONCURRENCY, limits=None, slot_ttl=TENANT_SLOT_TTL, store=None):
+        self.default_limit = default_limit
+        self.limits = parse_limits(TENANT_CONCURRENCY) if limits is None else limits
+        self.slot_ttl = slot_ttl
+        self._store = store
+
+    @property
+    def store(self):
+        if self._store is None:
+            self._store = get_shared_store()
+        return self._store
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.default_limit) or any(self.limits.values())
+
+    def limit_for(self, customer_id) -> int:
+        return self.limits.get(customer_id, self.default_limit)
+
+    @staticmethod
+    def key(customer_id) -> str:
+        return f"faces:tenant:slots:{customer_id}"
+
+    def acquire(self, customer_id, holder: str) -> bool:
+        limit = self.limit_for(customer_id)
+        if not limit:
+            return True
+        key, now = self.key(customer_id), time.time()
+        try:
+            self.store.zremrangebyscore(key, "-inf", now - self.slot_ttl)
+            self.store.zadd(key, {holder: now})
+            self.store.expire(key, int(self.slot_ttl) + 1)
+            rank = self.store.zrank(key, holder)
+        except Exception as e:
+            logger.warning(f"Tenant limiter unavailable, not limiting {type(e).__name__} - {e}")
+            return True
+        if rank is not None and rank >= limit:
+            self.release(customer_id, holder)
+            return False
+        return True
+
+    def release(self, customer_id, holder: str):
+        if not self.limit_for(customer_id):
+            return
+        try:
+            self.store.zrem(self.key(customer_id), holder)
+        except Exception as e:
+            logger.warning(f"Tenant limiter release failed {type(e).__name__} - {e}")
+
+
+tenant_limiter = TenantLimiter()
@@ -0,0 +1,126 @@
+import base64
+import json
+import logging
+from datetime import datetime
+
+import cv2
+import numpy as np
+
+from config.base_config import CHANGE_THRESHOLD, CHANGE_MAX_REUSE_AGE, CHANGE_STATE_TTL
+from config.persistence.shared_store import get_shared_store
+
+logger = logging.getLogger(__name__)
+
+SIGNATURE_SIZE = 32     # px, side of the grayscale thumbnail kept per device
+REGION_GRID = 4         # signature is compared as REGION_GRID x REGION_GRID region means
+
+
+def state_key(device_imei: str) -> str:
+    return f"faces:change:{device_imei}"
+
+
+def frame_signature(frame: np.ndarray) -> np.ndarray:
+    """32x32 grayscale thumbnail of an RGB frame (1 KB), independent of decode resolution."""
+    gray = cv2.cvtColor(frame, cv2.COLOR_RGB2GRAY)
+    return cv2.resize(gray, (SIGNATURE_SIZE, SIGNATURE_SIZE), interpolation=cv2.INTER_AREA)
+
+
+def signature_difference(a: np.ndarray, b: np.ndarray) -> float:
+    """Largest mean absolute gray difference over a 4x4 grid of regions.
+
+    Taking the worst region rather than the global mean keeps a person walking into
+    one corner of an otherwise static scene from being averaged away.
+    """
+    diff = cv2.absdiff(a, b).astype(np.float32)
+    cell = SIGNATURE_SIZE // REGION_GRID
+    regions = diff.reshape(REGION_GRID, cell, REGION_GRID, cell).mean(axis=(1, 3))
+    return float(regions.max())
+
+
+class FrameChangeDetector:
+    """Reuses a device's last detections while its snapshots stay visually unchanged.
+
+    Per device_imei the shared store holds the signature of the last frame that went
+    through inference, its snapshot time and its result. A new frame reuses that result
+    when its signature differs by less than threshold and it was taken within
+    max_reuse_age seconds of the reference frame; otherwise it is processed and
+    becomes the new reference. Check/skip counters are kept in the shared store so
+    the skip ratio covers all workers.
+    """
+
+    def __init__(self, threshold=CHANGE_THRESHOLD, max_reuse_age=CHANGE_MAX_REUSE_AGE, ttl=CHANGE_STATE_TTL, store=None):
+        self.threshold = threshold
+        self.max_reuse_age = max_reuse_age
+        self.ttl = ttl
+        self._store = store
+        self.stats = {"checked": 0, "skipped": 0, "expired": 0}
+
+    @property
+    def store(self):
+        if self._store is None:
+            self._store = get_shared_store()
+        return self._store
+
+    def _count(self, name):
+        self.stats[name] += 1
+        try:
+            self.store.incr(f"faces:change:stats:{name}")
+        except Exception as e:
+            logger.warning(f"Frame change counter update failed {type(e).__name__} - {e}")
+
+    def lookup(self, device_imei: str, signature: np.ndarray, taken_at: datetime):
+        """Result to reuse for this frame, or None when it has to go through inference."""
+        self._count("checked")
+        try:
+            raw = self.store.get(state_key(device_imei))
+        except Exception as e:
+            logger.warning(f"Frame change lookup failed {type(e).__name__} - {e}")
+            return None
+        if raw is None:
+            return None
+
+        state = json.loads(raw)
+        reference = np.frombuffer(base64.b64decode(state["signature"]), dtype=np.uint8).reshape(signature.shape)
+        if signature_difference(signature, reference) >= self.threshold:
+            return None
+
+        age = abs((taken_at - datetime.fromisoformat(state["taken_at"])).total_seconds())
+        if age > self.max_reuse_age:
+            self._count("expired")
+            return None
+
+        self._count("skipped")
+        return state["result"]
+
+    def remember(self, device_imei: str, signature: np.ndarray, taken_at: datetime, result: dict):
+        """Make this processed frame the device's new reference."""
+        state = {
+            "signature": base64.b64encode(signature.tobytes()).decode("ascii"),
+            "taken_at": taken_at.isoformat(),
+            "result": result,
+        }
+        try:
+            self.store.set(state_key(device_imei), json.dumps(state), ex=self.ttl)
+        except Exception as e:
+            logger.warning(f"Frame change state write failed {type(e).__name__} - {e}")
+
+    def forget(self, device_imei: str, annotated_url: str):
+        """Drop the device's reference if its result points at annotated_url (e.g. the upload failed)."""
+        try:
+            raw = self.store.get(state_key(device_imei))
+            if raw is not None and json.loads(raw)["result"].get("annotated_url") == annotated_url:
+                self.store.delete(state_key(device_imei))
+        except Exception as e:
+            logger.warning(f"Frame change state delete failed {type(e).__name__} - {e}")
+
+    def skip_ratio(self) -> float:
+        """Share of checked frames that reused a previous result, across all workers."""
+        try:
+            checked = int(self.store.get("faces:change:stats:checked") or 0)
+            skipped = int(self.store.get("faces:change:stats:skipped") or 0)
+        except Exception:
+            checked, skipped = self.stats["checked"], self.stats["skipped"]
+        return skipped / checked if checked else 0.0
+
+
+frame_change_detector = FrameChangeDetector()
@@ -1,6 +1,21 @@
 import cv2
 import numpy as np
 
+THUMBNAIL_SIZE = 256  # longest side used for fast-path decision statistics
+
+def boost_grayscale(frame):
+    """Lift lightness and saturation of a grayscale-looking RGB frame."""
+    lab = cv2.cvtColor(frame, cv2.COLOR_RGB2LAB)
+    l, a, b_lab = cv2.split(lab)
+    l = cv2.add(l, 20)
+    a = cv2.add(a, 5)
+    b_lab = cv2.add(b_lab, 5)
+    frame = cv2.cvtColor(cv2.merge((l, a, b_lab)), cv2.COLOR_LAB2RGB)
+    hsv = cv2.cvtColor(frame, cv2.COLOR_RGB2HSV)
+    h, s, v = cv2.split(hsv)
+    s = cv2.add(s, 40)
+    return cv2.cvtColor(cv2.merge((h, s, v)), cv2.COLOR_HSV2RGB)
+
 def enhance_face_crop(frame):
     """Automatically enhance brightness, contrast, sharpness, and color balance."""
     if len(frame.shape) == 2:
@@ -18,16 +33,7 @@ def enhance_face_crop(frame):
     color_diff = np.mean(np.abs(r - g) + np.abs(g - b) + np.abs(b - r))
     gray_like = color_diff < 12
     if gray_like:
-        lab = cv2.cvtColor(frame, cv2.COLOR_RGB2LAB)
-        l, a, b_lab = cv2.split(lab)
-        l = cv2.add(l, 20)
-        a = cv2.add(a, 5)
-        b_lab = cv2.add(b_lab, 5)
-        frame = cv2.cvtColor(cv2.merge((l, a, b_lab)), cv2.COLOR_LAB2RGB)
-        hsv = cv2.cvtColor(frame, cv2.COLOR_RGB2HSV)
-        h, s, v = cv2.split(hsv)
-        s = cv2.add(s, 40)
-        frame = cv2.cvtColor(cv2.merge((h, s, v)), cv2.COLOR_HSV2RGB)
+        frame = boost_grayscale(frame)
 
     # Color cast correction
     avg_r, avg_g, avg_b = np.mean(r), np.mean(g), np.mean(b)
@@ -45,27 +51,121 @@ def enhance_face_crop(frame):
         ])
 
     # Brightness / contrast
-    if mean_val < 80 or std_val < 20:
-        alpha = 1.4 + (100 - mean_val) / 150.0
-        beta = 50 if mean_val < 60 else 30
-    else:
-        alpha = 1.0 + (100 - mean_val) / 200.0
-        beta = (128 - mean_val) * 0.4
-
+    alpha, beta = brightness_contrast_params(mean_val, std_val)
     frame = cv2.convertScaleAbs(frame, alpha=alpha, beta=beta)
 
     # Sharpness
     focus_after = cv2.Laplacian(cv2.cvtColor(frame, cv2.COLOR_RGB2GRAY), cv2.CV_64F).var()
     if focus_after < 60:
-        blur = cv2.GaussianBlur(frame, (0, 0), sigmaX=2)
-        frame = cv2.addWeighted(frame, 1.7, blur, -0.7, 0)
+        frame = unsharp_mask(frame)
 
     # Local contrast
     if std_val < 25 or mean_val < 70:
-        lab = cv2.cvtColor(frame, cv2.COLOR_RGB2LAB)
-        l, a, b_lab = cv2.split(lab)
-        clahe = cv2.createCLAHE(clipLimit=2.5, tileGridSize=(8, 8))
-        l = clahe.apply(l)
-        frame = cv2.cvtColor(cv2.merge((l, a, b_lab)), cv2.COLOR_LAB2RGB)
+        frame = local_contrast(frame)
+
+    return frame
+
+
+def enhance_frame_fast(frame, sharpen=False, clahe=False, thumbnail_size=THUMBNAIL_SIZE):
+    """Single-pass variant of enhance_face_crop for full-resolution frames.
+
+    Decision statistics (gray mean/std, channel means, color difference, focus) are
+    taken from a thumbnail instead of the full frame. Cast gains and the
+    brightness/contrast alpha/beta are fused into one 256-entry per-channel LUT,
+    applied with a single cv2.LUT pass; for grayscale frames the LAB/HSV boost is
+    folded into the same LUT as the boost of a neutral pixel at each level. The color
+    difference is computed without uint8 wraparound, so only frames that really are
+    grayscale get the boost.
+    Sharpening and CLAHE are skipped unless requested.
+    """
+    if len(frame.shape) == 2:
+        frame = cv2.cvtColor(frame, cv2.COLOR_GRAY2RGB)
+    elif frame.shape[2] == 4:
+        frame = cv2.cvtColor(frame, cv2.COLOR_RGBA2RGB)
+
+    thumb = _thumbnail(frame, thumbnail_size)
+    gray = cv2.cvtColor(thumb, cv2.COLOR_RGB2GRAY)
+    mean_val = float(np.mean(gray))
+    std_val = float(np.std(gray))
+
+    pixels = thumb.reshape(-1, 3).astype(np.int16)
+    channel_means = pixels.mean(axis=0)
+    color_diff = np.mean(np.abs(pixels - np.roll(pixels, 1, axis=1)).sum(axis=1))
+    cast_strength = np.std(channel_means)
+
+    if cast_strength > 5:
+        pre = np.clip(np.arange(256)[:, None] * (channel_means.mean() / (channel_means + 1e-6)), 0, 255).astype(np.uint8)
+    elif color_diff < 12:
+        pre = _neutral_boost_lut()
+    else:
+        pre = None
+
+    alpha, beta = brightness_contrast_params(mean_val, std_val)
+    lut = fused_lut(alpha, beta, pre)
+    frame = cv2.LUT(frame, lut)
+
+    if sharpen:
+        focus_after = cv2.Laplacian(cv2.cvtColor(cv2.LUT(thumb, lut), cv2.COLOR_RGB2GRAY), cv2.CV_64F).var()
+        if focus_after < 60:
+            frame = unsharp_mask(frame)
+
+    if clahe and (std_val < 25 or mean_val < 70):
+        frame = local_contrast(frame)
 
     return frame
+
+
+def fused_lut(alpha, beta, pre=None):
+    """Per-channel (1, 256, 3) LUT: an optional per-channel pre-mapping followed by convertScaleAbs.
+
+    pre is a (256, 3) uint8 table, either the cast gains (clip + truncate, like the
+    merge in enhance_face_crop) or the grayscale boost of a neutral pixel.
+    """
+    if pre is None:
+        pre = np.repeat(np.arange(256, dtype=np.uint8)[:, None], 3, axis=1)
+    scaled = np.abs(pre.astype(np.float64) * alpha + beta)
+    return np.clip(np.rint(scaled), 0, 255).astype(np.uint8).reshape(1, 256, 3)
+
+
+_boost_lut = None
+
+def _neutral_boost_lut():
+    """boost_grayscale applied to every neutral level; exact for gray pixels, close for gray-like frames."""
+    global _boost_lut
+    if _boost_lut is None:
+        ramp = np.repeat(np.arange(256, dtype=np.uint8)[None, :, None], 3, axis=2)
+        _boost_lut = boost_grayscale(ramp).reshape(256, 3)
+    return _boost_lut
+
+
+def brightness_contrast_params(mean_val, std_val):
+    """alpha/beta for convertScaleAbs, derived from the gray mean and std."""
+    if mean_val < 80 or std_val < 20:
+        alpha = 1.4 + (100 - mean_val) / 150.0
+        beta = 50 if mean_val < 60 else 30
+    else:
+        alpha = 1.0 + (100 - mean_val) / 200.0
+        beta = (128 - mean_val) * 0.4
+    return alpha, beta
+
+
+def unsharp_mask(frame):
+    blur = cv2.GaussianBlur(frame, (0, 0), sigmaX=2)
+    return cv2.addWeighted(frame, 1.7, blur, -0.7, 0)
+
+
+def local_contrast(frame):
+    """CLAHE on the LAB lightness channel."""
+    lab = cv2.cvtColor(frame, cv2.COLOR_RGB2LAB)
+    l, a, b_lab = cv2.split(lab)
+    clahe = cv2.createCLAHE(clipLimit=2.5, tileGridSize=(8, 8))
+    l = clahe.apply(l)
+    return cv2.cvtColor(cv2.merge((l, a, b_lab)), cv2.COLOR_LAB2RGB)
+
+
+def _thumbnail(frame, size):
+    h, w = frame.shape[:2]
+    scale = size / max(h, w)
+    if scale >= 1:
+        return frame
+    return cv2.resize(frame, (max(1, int(w * scale)), max(1, int(h * scale))), interpolation=cv2.INTER_AREA)
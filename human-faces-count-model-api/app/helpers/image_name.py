@@ -0,0 +1,22 @@
+import os
+from collections import namedtuple
+from datetime import datetime
+from urllib.parse import urlparse
+
+ImageName = namedtuple("ImageName", ["img_name", "device_imei", "date_str", "month", "time_str", "dt"])
+
+
+def parse_image_name(original_url: str) -> ImageName:
+    """Split a snapshot URL's file name (<imei>_<yyyymmdd>_<hhmmss>...) into its parts."""
+    img_name = os.path.basename(urlparse(original_url).path)
+
+    # Split by underscore, all image names in the URL contains imei, date and time
+    parts = img_name.split("_")
+
+    device_imei = parts[0]          # 350612079150221
+    date_str = parts[1]             # 20251023
+    month = date_str[4:6]           # 10
+    time_str = parts[2][:6]         # 143254
+
+    dt = datetime.strptime(f"{date_str}{time_str}", "%Y%m%d%H%M%S")
+    return ImageName(img_name, device_imei, date_str, month, time_str, dt)
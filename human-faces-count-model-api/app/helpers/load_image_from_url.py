@@ -1,11 +1,62 @@
+import os
+import threading
 import cv2
 import numpy as np
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from fastapi import HTTPException
 import logging
+from config.base_config import FETCH_POOL_CONNECTIONS, FETCH_POOL_MAXSIZE, FETCH_TIMEOUT, FETCH_MAX_BYTES
 
 logger = logging.getLogger(__name__)
 
+CHUNK_SIZE = 64 * 1024
+
+# JPEG start-of-frame markers carrying the image dimensions (excludes DHT/JPG/DAC)
+_SOF_MARKERS = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+_REDUCED_FLAGS = {
+    8: cv2.IMREAD_REDUCED_COLOR_8,
+    4: cv2.IMREAD_REDUCED_COLOR_4,
+    2: cv2.IMREAD_REDUCED_COLOR_2,
+}
+
+_session = None
+_session_pid = None
+_session_lock = threading.Lock()
+
+
+def get_session() -> requests.Session:
+    """Process-wide HTTP session with per-host keep-alive connection pools."""
+    global _session, _session_pid
+    # Pooled sockets must not be shared with forked Celery children
+    if _session is None or _session_pid != os.getpid():
+        with _session_lock:
+            if _session is None or _session_pid != os.getpid():
+                adapter = HTTPAdapter(
+                    pool_connections=FETCH_POOL_CONNECTIONS,
+                    pool_maxsize=FETCH_POOL_MAXSIZE,
+                    max_retries=Retry(total=2, connect=2, read=0, backoff_factor=0.2, allowed_methods=["GET"]),
+                )
+                session = requests.Session()
+                session.mount("http://", adapter)
+                session.mount("https://", adapter)
+                _session, _session_pid = session, os.getpid()
+    return _session
+
+
+def http_pool_in_use() -> int:
+    """Connections currently checked out of this process' keep-alive pools."""
+    if _session is None or _session_pid != os.getpid():
+        return 0
+    pools = _session.get_adapter("https://").poolmanager.pools
+    in_use = 0
+    for key in pools.keys():
+        pool = pools.get(key)
+        if pool is not None and pool.pool is not None:
+            in_use += pool.pool.maxsize - pool.pool.qsize()
+    return in_use
+
 
 def load_image_from_url(url: str):
     """Download and decode an image from a URL."""
@@ -19,34 +70,110 @@ def load_image_from_url(url: str):
         raise ValueError("Failed to decode image")
     return cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
 
-def load_image_from_url_safe(url: str, timeout: int = 5, max_size: int = 5_000_000):
-    """Securely download an image with validation."""
+
+def fetch_image_bytes(url: str, timeout: int = FETCH_TIMEOUT, max_size: int = FETCH_MAX_BYTES) -> memoryview:
+    """Stream an image into a preallocated buffer over a pooled connection.
+
+    The download is aborted as soon as the declared or received size exceeds max_size.
+    """
     if not url.lower().startswith(("http://", "https://")):
         logger.exception("Invalid URL format.")
         raise HTTPException(status_code=422, detail="Invalid URL format.")
 
     try:
-        response = requests.get(url, timeout=timeout, stream=True)
-        if response.status_code != 200:
-            logger.exception(f"Unable to fetch image (status code {response.status_code}).")
-            raise HTTPException(
-                status_code=400,
-                detail=f"Unable to fetch image (status code {response.status_code}).",
-            )
-
-        content_length = int(response.headers.get("content-length", 0))
-        if content_length > max_size:
-            logger.exception("Image too large (limit 5MB).")
-            raise HTTPException(status_code=413, detail="Image too large (limit 5MB).")
-
-        image_data = np.asarray(bytearray(response.content), dtype=np.uint8)
-        frame = cv2.imdecode(image_data, cv2.IMREAD_COLOR)
-        if frame is None:
-            logger.exception("Invalid image format")
-            raise HTTPException(status_code=422, detail="Invalid image format.")
-
-        return cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+        with get_session().get(url, timeout=timeout, stream=True) as response:
+            if response.status_code != 200:
+                logger.exception(f"Unable to fetch image (status code {response.status_code}).")
+                raise HTTPException(
+                    status_code=400,
+                    detail=f"Unable to fetch image (status code {response.status_code}).",
+                )
+
+            content_length = int(response.headers.get("content-length", 0))
+            if content_length > max_size:
+                logger.exception(f"Image too large (limit {max_size} bytes).")
+                raise HTTPException(status_code=413, detail=f"Image too large (limit {max_size} bytes).")
+
+            buffer = bytearray(content_length or CHUNK_SIZE)
+            received = 0
+            for chunk in response.iter_content(chunk_size=CHUNK_SIZE):
+                end = received + len(chunk)
+                if end > max_size:
+                    logger.exception(f"Image too large (limit {max_size} bytes).")
+                    raise HTTPException(status_code=413, detail=f"Image too large (limit {max_size} bytes).")
+                if end > len(buffer):
+                    # Missing/short content-length: grow geometrically, capped at max_size
+                    buffer.extend(bytes(min(max(end, 2 * len(buffer)), max_size) - len(buffer)))
+                buffer[received:end] = chunk
+                received = end
+
+            return memoryview(buffer)[:received]
 
     except requests.exceptions.RequestException as e:
         logger.error(f"Image download failed: {e}")
         raise HTTPException(status_code=400, detail="Failed to download image.")
+
+
+def jpeg_dimensions(data) -> tuple:
+    """Read (width, height) from a JPEG's SOF header without decoding; None if not a JPEG."""
+    view = memoryview(data)
+    if len(view) < 4 or view[0] != 0xFF or view[1] != 0xD8:
+        return None
+
+    i = 2
+    while i + 9 < len(view):
+        if view[i] != 0xFF:
+            return None
+        marker = view[i + 1]
+        if marker == 0xFF:         # fill byte
+            i += 1
+            continue
+        if marker in (0xD8, 0x01) or 0xD0 <= marker <= 0xD7:   # markers without a length
+            i += 2
+            continue
+        length = (view[i + 2] << 8) | view[i + 3]
+        if marker in _SOF_MARKERS:
+            height = (view[i + 5] << 8) | view[i + 6]
+            width = (view[i + 7] << 8) | view[i + 8]
+            return width, height
+        i += 2 + length
+    return None
+
+
+def reduction_factor(data, target_size: int) -> int:
+    """Largest JPEG DCT scale (2/4/8) that still leaves the longest side >= target_size."""
+    if not target_size:
+        return 1
+    dims = jpeg_dimensions(data)
+    if dims is None:
+        return 1
+    longest = max(dims)
+    for factor in (8, 4, 2):
+        if longest // factor >= target_size:
+            return factor
+    return 1
+
+
+def decode_image(data, target_size: int = None):
+    """Decode image bytes to RGB, at reduced resolution when the JPEG is much larger than target_size.
+
+    Returns (frame, scale) where scale maps frame coordinates back to the source image. The scale
+    is measured, not the nominal factor: reduced decodes round sizes up (ceil(width / factor)).
+    """
+    factor = reduction_factor(data, target_size)
+    flags = _REDUCED_FLAGS.get(factor, cv2.IMREAD_COLOR)
+
+    image_data = np.frombuffer(data, dtype=np.uint8)
+    frame = cv2.imdecode(image_data, flags)
+    if frame is None:
+        logger.exception("Invalid image format")
+        raise HTTPException(status_code=422, detail="Invalid image format.")
+
+    scale = max(jpeg_dimensions(data)) / max(frame.shape[:2]) if factor > 1 else 1
+    return cv2.cvtColor(frame, cv2.COLOR_BGR2RGB), scale
+
+
+def load_image_from_url_safe(url: str, timeout: int = FETCH_TIMEOUT, max_size: int = FETCH_MAX_BYTES, target_size: int = None):
+    """Securely download an image with validation."""
+    frame, _ = decode_image(fetch_image_bytes(url, timeout, max_size), target_size)
+    return frame
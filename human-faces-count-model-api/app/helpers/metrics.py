@@ -0,0 +1,72 @@
+import logging
+import time
+from contextlib import contextmanager
+
+from prometheus_client import Counter, Gauge, Histogram, start_http_server
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+LAG_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 900)
+FACE_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+STAGE_SECONDS = Histogram(
+    "faces_stage_seconds", "Time spent in each stage of the face count pipeline", ["stage"], buckets=LATENCY_BUCKETS
+)
+QUEUE_LAG_SECONDS = Histogram(
+    "faces_queue_lag_seconds", "Time from enqueue in the API to task start in a worker", buckets=LAG_BUCKETS
+)
+FACES_PER_IMAGE = Histogram("faces_per_image", "Faces counted per processed image", buckets=FACE_BUCKETS)
+TASKS = Counter("faces_tasks_total", "Face count tasks by outcome", ["outcome"])
+LOOKUPS = Counter("faces_lookups_total", "Result cache and change detection lookups", ["kind", "result"])
+UPLOAD_FAILURES = Counter("faces_upload_failures_total", "Annotated image uploads given up after all retries", ["reason"])
+POOL_IN_USE = Gauge("faces_pool_in_use", "Items in flight or queued per connection pool / queue", ["pool"])
+
+
+@contextmanager
+def observe_stage(stage: str):
+    """Time the enclosed block into faces_stage_seconds{stage=...}."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        STAGE_SECONDS.labels(stage=stage).observe(time.perf_counter() - start)
+
+
+def observe_queue_lag(enqueued_at):
+    """Record the wait since the API enqueued the task (epoch seconds), if it was sent."""
+    if enqueued_at is not None:
+        QUEUE_LAG_SECONDS.observe(max(0.0, time.time() - float(enqueued_at)))
+
+
+def record_lookup(kind: str, hit: bool):
+    LOOKUPS.labels(kind=kind, result="hit" if hit else "miss").inc()
+
+
+def register_pool_gauges():
+    """Sample the process' pools and queues at scrape time."""
+    from .load_image_from_url import http_pool_in_use
+    from .upload_pipeline import upload_pending
+    from .bulk_writer import writer_pending
+    from .batch_inference import engine
+    from ..websockets.relay_queue import relay_pending
+
+    POOL_IN_USE.labels(pool="http_fetch").set_function(http_pool_in_use)
+    POOL_IN_USE.labels(pool="s3_upload").set_function(upload_pending)
+    POOL_IN_USE.labels(pool="db_write").set_function(writer_pending)
+    POOL_IN_USE.labels(pool="batch_inference").set_function(lambda: engine.pending)
+    POOL_IN_USE.labels(pool="relay").set_function(relay_pending)
+
+    from config.base_config import SYNC_INFERENCE
+    if SYNC_INFERENCE:
+        from .sync_inference import sync_pool
+        POOL_IN_USE.labels(pool="sync_inference").set_function(lambda: sync_pool.outstanding)
+
+
+def start_metrics_server(port: int):
+    """Serve /metrics for this process on its own port (one per Celery worker child)."""
+    try:
+        start_http_server(port)
+        logger.info(f"Metrics listener on :{port}")
+    except OSError as e:
+        logger.warning(f"Metrics listener could not bind :{port}: {e}")
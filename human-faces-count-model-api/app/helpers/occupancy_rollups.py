@@ -0,0 +1,190 @@
+"""Per-minute, per-hour and per-day occupancy rollups of face_detection_counts.
+
+Rollups are updated in the same transaction as the raw upsert. Rows the upsert inserts are
+added into their buckets; rows whose id already existed (redelivered or reprocessed images)
+are counted once, and if their stored values changed, the buckets they touch are recomputed
+from the raw rows. Rebuild everything from raw rows with:
+
+    python -m app.helpers.occupancy_rollups [--customer-id ID] [--device-imei IMEI]
+"""
+import argparse
+import logging
+from collections import OrderedDict
+from datetime import timedelta
+
+from sqlalchemy import select, delete, case, func
+
+from config.base_config import ROLLUP_BACKFILL_CHUNK
+from ..models.counts import FaceDetectionCount, OccupancyMinute, OccupancyHour, OccupancyDay
+
+logger = logging.getLogger(__name__)
+
+GRANULARITIES = OrderedDict([
+    ("minute", (OccupancyMinute, lambda dt: dt.replace(second=0, microsecond=0))),
+    ("hour", (OccupancyHour, lambda dt: dt.replace(minute=0, second=0, microsecond=0))),
+    ("day", (OccupancyDay, lambda dt: dt.replace(hour=0, minute=0, second=0, microsecond=0))),
+])
+
+
+def aggregate_rows(rows, truncate):
+    """Raw row dicts -> rollup row dicts, one per (customer_id, device_imei, bucket)."""
+    buckets = {}
+    for row in rows:
+        key = (row["customer_id"], row["device_imei"], truncate(row["datetime"]))
+        count, at = row["face_count"], row["datetime"]
+        agg = buckets.get(key)
+        if agg is None:
+            buckets[key] = dict(customer_id=key[0], device_imei=key[1], bucket=key[2], samples=1, count_sum=count,
+                                count_min=count, count_max=count, last_count=count, last_at=at)
+            continue
+        agg["samples"] += 1
+        agg["count_sum"] += count
+        agg["count_min"] = min(agg["count_min"], count)
+        agg["count_max"] = max(agg["count_max"], count)
+        if at >= agg["last_at"]:
+            agg["last_count"], agg["last_at"] = count, at
+    return list(buckets.values())
+
+
+def merge_rollup_rows(conn, model, rows):
+    """Multi-row upsert adding rows into the existing buckets."""
+    if not rows:
+        return
+    from .bulk_writer import _insert_for
+
+    table = model.__table__
+    least, greatest = (func.least, func.greatest) if conn.dialect.name == "postgresql" else (func.min, func.max)
+    stmt = _insert_for(conn.dialect.name)(table).values(rows)
+    newer = stmt.excluded.last_at >= table.c.last_at
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[table.c.customer_id, table.c.device_imei, table.c.bucket],
+        set_={
+            "samples": table.c.samples + stmt.excluded.samples,
+            "count_sum": table.c.count_sum + stmt.excluded.count_sum,
+            "count_min": least(table.c.count_min, stmt.excluded.count_min),
+            "count_max": greatest(table.c.count_max, stmt.excluded.count_max),
+            "last_count": case((newer, stmt.excluded.last_count), else_=table.c.last_count),
+            "last_at": case((newer, stmt.excluded.last_at), else_=table.c.last_at),
+        },
+    )
+    conn.execute(stmt)
+
+
+ROLLUP_FIELDS = ("customer_id", "device_imei", "datetime", "face_count")
+
+
+def lock_stored_rows(conn, ids):
+    """id -> stored rollup fields of the existing raw rows, locked until the transaction ends."""
+    table = FaceDetectionCount.__table__
+    query = select(table.c.id, *(table.c[name] for name in ROLLUP_FIELDS)).where(table.c.id.in_(ids))
+    return {row["id"]: row for row in conn.execute(query.with_for_update()).mappings()}
+
+
+def changed_rows(stored, rows):
+    """The stored and new versions of rows whose rollup fields differ from what is stored."""
+    changed = []
+    for row in rows:
+        old = stored.get(row["id"])
+        if old is None or any(old[name] != row[name] for name in ROLLUP_FIELDS):
+            changed.append(row)
+            if old is not None:
+                changed.append(old)
+    return changed
+
+
+def update_rollups(conn, rows):
+    """Merge freshly inserted raw rows into every rollup table."""
+    for model, truncate in GRANULARITIES.values():
+        merge_rollup_rows(conn, model, aggregate_rows(rows, truncate))
+
+
+def rebuild_buckets(conn, rows):
+    """Recompute the rollup buckets that contain rows from the raw table (call after writing the rows).
+
+    Works a device-day at a time: the affected rollup rows are locked first (minute, hour,
+    day, the order merges take them in), so a concurrent merge into the same buckets either
+    commits before the raw rows are read or adds its delta after the rebuild commits.
+    """
+    raw = FaceDetectionCount.__table__
+    truncate_day = GRANULARITIES["day"][1]
+    days = {}
+    for row in rows:
+        days.setdefault((row["customer_id"], row["device_imei"], truncate_day(row["datetime"])), []).append(row)
+
+    for (customer_id, device_imei, day), affected in sorted(days.items(), key=lambda item: item[0]):
+        buckets = {}
+        for model, truncate in GRANULARITIES.values():
+            table = model.__table__
+            buckets[model] = sorted({truncate(row["datetime"]) for row in affected})
+            conn.execute(select(table.c.bucket).where(
+                table.c.customer_id == customer_id, table.c.device_imei == device_imei,
+                table.c.bucket.in_(buckets[model]),
+            ).order_by(table.c.bucket).with_for_update())
+
+        day_rows = conn.execute(select(*(raw.c[name] for name in ROLLUP_FIELDS)).where(
+            raw.c.customer_id == customer_id, raw.c.device_imei == device_imei,
+            raw.c.datetime >= day, raw.c.datetime < day + timedelta(days=1),
+        )).mappings().all()
+
+        for model, truncate in GRANULARITIES.values():
+            table = model.__table__
+            conn.execute(delete(table).where(
+                table.c.customer_id == customer_id, table.c.device_imei == device_imei,
+                table.c.bucket.in_(buckets[model]),
+            ))
+            fresh = [agg for agg in aggregate_rows(day_rows, truncate) if agg["bucket"] in buckets[model]]
+            if fresh:
+                conn.execute(table.insert(), fresh)
+
+
+def backfill_rollups(engine, customer_id=None, device_imei=None, chunk_size=ROLLUP_BACKFILL_CHUNK):
+    """Rebuild the rollups from raw rows: clear them, then stream the raw rows in chunks.
+
+    Run it while nothing is writing rows for the same customer/device (rows inserted
+    during the rebuild could be counted twice).
+    """
+    raw = FaceDetectionCount.__table__
+    columns = [raw.c.customer_id, raw.c.device_imei, raw.c.datetime, raw.c.face_count]
+    query = select(*columns).order_by(raw.c.datetime)
+
+    with engine.begin() as conn:
+        for model, _ in GRANULARITIES.values():
+            stmt = delete(model.__table__)
+            if customer_id is not None:
+                stmt = stmt.where(model.__table__.c.customer_id == customer_id)
+            if device_imei is not None:
+                stmt = stmt.where(model.__table__.c.device_imei == device_imei)
+            conn.execute(stmt)
+
+        if customer_id is not None:
+            query = query.where(raw.c.customer_id == customer_id)
+        if device_imei is not None:
+            query = query.where(raw.c.device_imei == device_imei)
+
+        total = 0
+        result = conn.execution_options(stream_results=True, yield_per=chunk_size).execute(query)
+        for chunk in result.mappings().partitions(chunk_size):
+            update_rollups(conn, chunk)
+            total += len(chunk)
+            logger.info(f"Rolled up {total} face count row(s)")
+    return total
+
+
+def main():
+    from config.persistence.postgres_db import engine
+
+    parser = argparse.ArgumentParser(description="Rebuild occupancy rollups from face_detection_counts.")
+    parser.add_argument("--customer-id")
+    parser.add_argument("--device-imei")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    with engine.begin() as conn:
+        for model, _ in GRANULARITIES.values():
+            model.__table__.create(bind=conn, checkfirst=True)
+    total = backfill_rollups(engine, args.customer_id, args.device_imei)
+    print(f"Backfilled occupancy rollups from {total} row(s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,15 +1,20 @@
 import os, sys
 sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
 import logging
-from config.base_config import SAVE_MODE, OUTPUT_DIR, BASE_URL,S3_BUCKET_NAME,AWS_REGION
+from config.base_config import SAVE_MODE, OUTPUT_DIR, BASE_URL,S3_BUCKET_NAME
 from config.persistence.aws_s3 import s3
-from ..models.counts import FaceDetectionCount
+from ..models.counts import FaceDetectionCount, hash_url
 from config.persistence.postgres_db import SyncSessionLocal
-from urllib.parse import urlparse
+from config.base_config import DB_BULK_WRITE, S3_ASYNC_UPLOAD, ANNOTATION_MODE, ANNOTATION_BASE_URL
+from .bulk_writer import get_bulk_writer, upsert_rows
+from .upload_pipeline import get_upload_pipeline, encode_jpeg, s3_object_url
+from .metrics import UPLOAD_FAILURES
 from datetime import datetime
 from io import BytesIO
 import numpy as np
 from .format_time import time_passed_str
+from .image_name import parse_image_name
+from .spool import is_spool_handle
 
 import cv2
 
@@ -18,63 +23,92 @@ logger = logging.getLogger(__name__)
 def save_image_and_metadata(frame, faces, count, original_url, customer_id, fileType):
     """Asynchronously save image + metadata depending on SAVE_MODE."""
 
-    img_name = os.path.basename(urlparse(original_url).path)
+    img_name, device_imei, date_str, month, _, dt = parse_image_name(original_url)
+    time_passed = time_passed_str(dt, datetime.utcnow())
 
-    # Split by underscore, all image names in the URL contains imei, date and time
-    parts = img_name.split("_")
+    if SAVE_MODE == "cloud":
+        object_name = customer_id + "/" + device_imei + "/" + month + "/" + date_str + "/" + img_name
 
-    device_imei = parts[0]          # 350612079150221
-    date_str = parts[1]             # 20251023
-    month = date_str[4:6]           # 10
-    time_str = parts[2]             # 143254
+        if S3_ASYNC_UPLOAD:
+            # URL is deterministic and returned right away; the row is written once the upload is
+            # done, pointing at the original image instead if the upload was given up
+            pipeline = get_upload_pipeline()
+            s3_url = s3_object_url(object_name, pipeline.bucket)
 
-    dt = datetime.strptime(f"{date_str}{time_str}", "%Y%m%d%H%M%S")
+            def write_row(uploaded):
+                save_metadata_to_db(original_url, s3_url if uploaded else original_url, faces, count,
+                                    device_imei, dt, customer_id)
 
-    if SAVE_MODE == "cloud":
-        s3_url =  upload_to_s3(frame, customer_id + "/" + device_imei + "/" + month + "/" + date_str + "/" + img_name, fileType, dt)
+            pipeline.submit(frame, object_name, fileType, on_done=write_row)
+            return s3_url, time_passed
 
-        save_metadata_to_db(original_url, s3_url, faces, count,device_imei,dt, customer_id)
+        s3_url, _ = upload_to_s3(frame, object_name, fileType, dt)
+        if s3_url is not None:
+            save_metadata_to_db(original_url, s3_url, faces, count,device_imei,dt, customer_id)
 
-        return s3_url
+        return s3_url, time_passed
     else:
         os.makedirs(OUTPUT_DIR, exist_ok=True)
         img_path = os.path.join(OUTPUT_DIR, img_name)
         cv2.imwrite(img_path, cv2.cvtColor(frame, cv2.COLOR_RGB2BGR))
-        return f"{BASE_URL}/{img_name}"
+        return f"{BASE_URL}/{img_name}", time_passed
 
-def save_metadata_to_db(image_url, annotated_url, faces, count, imei, dt, cust_id):
-    """Store detection metadata asynchronously."""
+def on_upload_failure(annotated_url, callback):
+    """Run callback if the background upload behind annotated_url is given up (no-op for other URLs)."""
+    if SAVE_MODE == "cloud" and S3_ASYNC_UPLOAD and annotated_url is not None:
+        get_upload_pipeline().when_failed(annotated_url, callback)
 
-    session = SyncSessionLocal()
 
-    try:
-            record = FaceDetectionCount.from_detection(
-                original_image_url=image_url,
-                annotated_image_url=annotated_url,
-                face_count= count,
-                device_imei=imei,
-                customer_id=cust_id,
-                datetime=dt,
-                faces_data=faces
-            )
-            session.add(record)
-            session.commit()
-            logger.info("Saved face count metadata to PostgreSQL.")
-    except Exception as e:
-            session.rollback()
-            logger.error(f"Failed to save metadata to database  {type(e).__name__} - {e}")
+def annotates_lazily(original_url) -> bool:
+    """ANNOTATION_MODE=lazy, for originals that can be fetched again (spooled uploads expire)."""
+    return ANNOTATION_MODE == "lazy" and not is_spool_handle(original_url)
+
+
+def lazy_annotation_url(original_url) -> str:
+    """Where the annotated image is rendered on demand (GET /faces/{id}/annotated)."""
+    return f"{ANNOTATION_BASE_URL.rstrip('/')}/faces/{hash_url(original_url)}/annotated"
 
-def upload_to_s3(frame: np.ndarray, object_name: str, fileType: str, dt: datetime) -> str:
-    """Uploads a BytesIO object to S3 asynchronously and returns its public URL."""
-    try:
 
-        bgr_frame = cv2.cvtColor(frame, cv2.COLOR_RGB2BGR)
+def save_detections(faces, count, original_url, customer_id):
+    """Lazy annotation: persist only the boxes; returns (render URL, time passed)."""
+    _, device_imei, _, _, _, dt = parse_image_name(original_url)
+    annotated_url = lazy_annotation_url(original_url)
+    save_metadata_to_db(original_url, annotated_url, faces, count, device_imei, dt, customer_id)
+    return annotated_url, time_passed_str(dt, datetime.utcnow())
 
-        success, encoded_image = cv2.imencode(".jpg", bgr_frame) # only JPG for now
-        if not success:
-            raise ValueError("Failed to encode frame as JPEG")
 
-        file_obj = BytesIO(encoded_image.tobytes())
+def save_metadata_to_db(image_url, annotated_url, faces, count, imei, dt, cust_id):
+    """Store detection metadata, buffered through the per-process bulk writer when DB_BULK_WRITE is on."""
+
+    row = FaceDetectionCount.row_from_detection(
+        original_image_url=image_url,
+        annotated_image_url=annotated_url,
+        face_count=count,
+        device_imei=imei,
+        customer_id=cust_id,
+        datetime=dt,
+        faces_data=faces
+    )
+
+    if DB_BULK_WRITE:
+        get_bulk_writer().submit(row)
+        return
+
+    with SyncSessionLocal() as session:
+        try:
+                upsert_rows(session.connection(), [row])
+                session.commit()
+                logger.info("Saved face count metadata to PostgreSQL.")
+        except Exception as e:
+                session.rollback()
+                logger.error(f"Failed to save metadata to database  {type(e).__name__} - {e}")
+
+def upload_to_s3(frame: np.ndarray, object_name: str, fileType: str, dt: datetime) -> tuple:
+    """Uploads the frame to S3 synchronously and returns (public URL or None on failure, time passed)."""
+    timePassed = time_passed_str(dt, datetime.utcnow())
+    try:
+
+        file_obj = BytesIO(encode_jpeg(frame))
         file_obj.seek(0)
         
         s3.put_object(
@@ -84,11 +118,11 @@ def upload_to_s3(frame: np.ndarray, object_name: str, fileType: str, dt: datetim
                 ContentType=fileType
             )
 
-        url = f"https://{S3_BUCKET_NAME}.s3.{AWS_REGION}.amazonaws.com/{object_name}"
-        timePassed = time_passed_str(dt, datetime.utcnow())
+        url = s3_object_url(object_name)
         logger.info(f"Uploaded to S3: {url}")
         return url, timePassed
 
     except Exception as e:
+        UPLOAD_FAILURES.labels(reason="upload").inc()
         logger.error(f"Failed to upload to S3  {type(e).__name__} - {e}")
-        return None
\ No newline at end of file
+        return None, timePassed
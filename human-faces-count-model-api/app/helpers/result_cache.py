@@ -0,0 +1,92 @@
+import hashlib
+import json
+import logging
+import threading
+from collections import OrderedDict
+
+from config.base_config import RESULT_CACHE_SIZE, RESULT_CACHE_TTL
+from config.persistence.shared_store import get_shared_store
+from ..models.counts import hash_url
+
+logger = logging.getLogger(__name__)
+
+
+def url_cache_key(url: str) -> str:
+    """Cache key derived from the same deterministic id used as the DB primary key."""
+    return f"faces:url:{hash_url(url)}"
+
+
+def digest_cache_key(image_bytes) -> str:
+    """Cache key for the downloaded image content, shared by every URL serving the same bytes."""
+    return f"faces:img:{hashlib.sha256(image_bytes).hexdigest()[:32]}"
+
+
+class ResultCache:
+    """Two-level inference result cache: in-process LRU in front of the shared store.
+
+    Entries are small JSON-able dicts (count, faces, annotated_url). Shared-store
+    failures are logged and treated as misses so the cache can never fail a task.
+    """
+
+    def __init__(self, max_entries=RESULT_CACHE_SIZE, ttl=RESULT_CACHE_TTL, store=None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._store = store
+        self._local = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {"local_hits": 0, "shared_hits": 0, "misses": 0}
+
+    @property
+    def store(self):
+        if self._store is None:
+            self._store = get_shared_store()
+        return self._store
+
+    def _remember(self, key, value):
+        with self._lock:
+            self._local[key] = value
+            self._local.move_to_end(key)
+            while len(self._local) > self.max_entries:
+                self._local.popitem(last=False)
+
+    def get(self, key):
+        with self._lock:
+            value = self._local.get(key)
+            if value is not None:
+                self._local.move_to_end(key)
+                self.stats["local_hits"] += 1
+                return value
+
+        try:
+            raw = self.store.get(key)
+        except Exception as e:
+            logger.warning(f"Result cache lookup failed {type(e).__name__} - {e}")
+            raw = None
+
+        if raw is None:
+            self.stats["misses"] += 1
+            return None
+
+        value = json.loads(raw)
+        self._remember(key, value)
+        self.stats["shared_hits"] += 1
+        return value
+
+    def set(self, key, value):
+        self._remember(key, value)
+        try:
+            self.store.set(key, json.dumps(value), ex=self.ttl)
+        except Exception as e:
+            logger.warning(f"Result cache write failed {type(e).__name__} - {e}")
+
+    def delete(self, *keys):
+        with self._lock:
+            for key in keys:
+                self._local.pop(key, None)
+        try:
+            self.store.delete(*keys)
+        except Exception as e:
+            logger.warning(f"Result cache delete failed {type(e).__name__} - {e}")
+
+
+result_cache = ResultCache()
@@ -0,0 +1,92 @@
+import hashlib
+import logging
+import os
+import tempfile
+import threading
+import time
+
+import numpy as np
+from fastapi import HTTPException
+
+from config.base_config import SPOOL_DIR, SPOOL_TTL, SPOOL_CLEANUP_INTERVAL
+
+logger = logging.getLogger(__name__)
+
+SPOOL_SCHEME = "spool://"
+
+
+def spool_dir() -> str:
+    os.makedirs(SPOOL_DIR, exist_ok=True)
+    return SPOOL_DIR
+
+
+def is_spool_handle(ref: str) -> bool:
+    return ref.startswith(SPOOL_SCHEME)
+
+
+def parse_spool_handle(handle: str):
+    """spool://<digest>/<file_name> -> (digest, file_name)."""
+    digest, _, file_name = handle[len(SPOOL_SCHEME):].partition("/")
+    if not digest or not all(c in "0123456789abcdef" for c in digest):
+        raise HTTPException(status_code=422, detail="Invalid spool handle.")
+    return digest, file_name
+
+
+def spool_image(data: bytes, file_name: str) -> str:
+    """Store uploaded bytes in the spool (content addressed) and return their handle.
+
+    The handle is what travels through Celery and is recorded as the original image
+    reference: spool://<sha256 prefix>/<file_name>. Identical uploads share one file.
+    """
+    digest = hashlib.sha256(data).hexdigest()[:32]
+    path = os.path.join(spool_dir(), digest)
+    if os.path.exists(path):
+        os.utime(path)   # re-upload restarts the TTL
+    else:
+        fd, tmp_path = tempfile.mkstemp(dir=spool_dir(), prefix=".tmp-")
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)  # atomic: workers never see a partial file
+    return f"{SPOOL_SCHEME}{digest}/{os.path.basename(file_name)}"
+
+
+def read_spooled(handle: str) -> np.ndarray:
+    """Map a spooled image read-only into memory; nothing is copied until it is decoded."""
+    digest, _ = parse_spool_handle(handle)
+    path = os.path.join(SPOOL_DIR, digest)
+    try:
+        if os.path.getsize(path) == 0:
+            raise HTTPException(status_code=422, detail="Spooled image is empty.")
+        return np.memmap(path, dtype=np.uint8, mode="r")
+    except FileNotFoundError:
+        logger.error(f"Spooled image {handle} not found (expired or spooled on another host)")
+        raise HTTPException(status_code=410, detail="Spooled image expired.")
+
+
+def cleanup_spool(ttl: int = SPOOL_TTL) -> int:
+    """Delete spooled images older than ttl seconds (by last upload); returns how many."""
+    removed = 0
+    cutoff = time.time() - ttl
+    for entry in os.scandir(spool_dir()):
+        try:
+            if entry.is_file() and entry.stat().st_mtime < cutoff:
+                os.remove(entry.path)
+                removed += 1
+        except FileNotFoundError:
+            pass
+    if removed:
+        logger.info(f"Removed {removed} expired spooled image(s)")
+    return removed
+
+
+def start_spool_cleanup(interval: int = SPOOL_CLEANUP_INTERVAL):
+    """Background TTL cleanup thread for the API process."""
+    def run():
+        while True:
+            try:
+                cleanup_spool()
+            except Exception as e:
+                logger.error(f"Spool cleanup failed {type(e).__name__} - {e}")
+            time.sleep(interval)
+
+    threading.Thread(target=run, name="spool-cleanup", daemon=True).start()
@@ -0,0 +1,82 @@
+import logging
+from datetime import datetime, timezone
+
+from config.base_config import STALE_FRAME_POLICY, MAX_FRAME_AGE, STALE_MARKER_TTL
+from config.persistence.shared_store import get_shared_store
+from .image_name import parse_image_name
+
+logger = logging.getLogger(__name__)
+
+
+def newest_key(device_imei: str) -> str:
+    # A one-member sorted set, so the marker only moves forward with an atomic ZADD GT
+    return f"faces:newest_at:{device_imei}"
+
+
+def capture_epoch(dt: datetime) -> float:
+    """Epoch seconds of a capture time; file names carry naive UTC times."""
+    return dt.replace(tzinfo=timezone.utc).timestamp() if dt.tzinfo is None else dt.timestamp()
+
+
+class StalenessTracker:
+    """Per-device "newest capture seen" markers shared by the API and all workers.
+
+    A frame is stale when it was captured more than max_age seconds ago, or when a newer
+    frame of the same device has been queued or started since. The marker is only ever
+    raised (ZADD GT), so concurrent marks cannot replace a newer capture with an older one.
+    """
+
+    MEMBER = "captured"
+
+    def __init__(self, max_age=MAX_FRAME_AGE, ttl=STALE_MARKER_TTL, store=None):
+        self.max_age = max_age
+        self.ttl = ttl
+        self._store = store
+
+    @property
+    def store(self):
+        if self._store is None:
+            self._store = get_shared_store()
+        return self._store
+
+    def newest(self, device_imei):
+        score = self.store.zscore(newest_key(device_imei), self.MEMBER)
+        return float(score) if score is not None else None
+
+    def mark(self, device_imei, dt: datetime):
+        """Record dt as the device's newest capture unless a newer one is already recorded."""
+        key = newest_key(device_imei)
+        try:
+            self.store.zadd(key, {self.MEMBER: capture_epoch(dt)}, gt=True)
+            self.store.expire(key, self.ttl)
+        except Exception as e:
+            logger.warning(f"Staleness marker update failed {type(e).__name__} - {e}")
+
+    def stale_reason(self, device_imei, dt: datetime, now: datetime = None):
+        """Why the frame is stale, or None if it is the device's freshest usable frame."""
+        now = now or datetime.utcnow()
+        age = (now - dt).total_seconds()
+        if self.max_age and age > self.max_age:
+            return f"captured {age:.0f}s ago (MAX_FRAME_AGE={self.max_age:g}s)"
+        try:
+            newest = self.newest(device_imei)
+        except Exception as e:
+            logger.warning(f"Staleness marker lookup failed {type(e).__name__} - {e}")
+            return None
+        if newest is not None and newest > capture_epoch(dt):
+            return f"superseded by a frame captured at {datetime.fromtimestamp(newest, timezone.utc):%Y-%m-%d %H:%M:%S}"
+        return None
+
+
+staleness_tracker = StalenessTracker()
+
+
+def mark_enqueued(original_url: str):
+    """Called when a live frame is queued, so frames queued before it know they are superseded."""
+    if STALE_FRAME_POLICY == "off":
+        return
+    try:
+        name = parse_image_name(original_url)
+    except (IndexError, ValueError):
+        return
+    staleness_tracker.mark(name.device_imei, name.dt)
@@ -0,0 +1,118 @@
+import logging
+import math
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from config.base_config import (
+    IMG_SIZE, REDUCED_DECODE, RESULT_CACHE_ENABLED,
+    SYNC_POOL_WORKERS, SYNC_POOL_QUEUE_MAX, SYNC_SERVICE_TIME_MS
+)
+from ..models.faces import FaceCountResponse
+from .load_image_from_url import fetch_image_bytes, decode_image
+from .spool import is_spool_handle, read_spooled
+from .face_pipeline import enhance_frame, detect_faces, analyze_detections
+from .persistence import save_image_and_metadata, save_detections, annotates_lazily, on_upload_failure
+from .result_cache import result_cache, url_cache_key
+from .metrics import observe_stage, record_lookup
+
+logger = logging.getLogger(__name__)
+
+
+class Overloaded(Exception):
+    """Raised when a request cannot be served within its deadline; retry_after is in seconds."""
+
+    def __init__(self, retry_after: int):
+        super().__init__(f"Inference pool overloaded, retry after {retry_after}s")
+        self.retry_after = retry_after
+
+
+class SyncInferencePool:
+    """Bounded thread pool running the face pipeline for synchronous requests.
+
+    Threads overlap download, decode and post-processing; model.predict itself is
+    serialized by predict_frames. Admission is deadline based: the wait for a new job
+    is predicted from the jobs ahead of it and an EWMA of the service time, and the
+    job is refused (Overloaded) when wait + service would exceed its deadline or when
+    max_outstanding jobs are already queued or running.
+    """
+
+    def __init__(self, workers=SYNC_POOL_WORKERS, max_outstanding=SYNC_POOL_QUEUE_MAX,
+                 initial_service_ms=SYNC_SERVICE_TIME_MS, alpha=0.2):
+        self.workers = max(1, workers)
+        self.max_outstanding = max(self.workers, max_outstanding)
+        self.alpha = alpha
+        self.service_time = initial_service_ms / 1000.0
+        self.outstanding = 0
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="sync-inference")
+        self.stats = {"accepted": 0, "rejected": 0}
+
+    def predicted_wait(self) -> float:
+        """Seconds a job submitted now would queue before a worker picks it up."""
+        ahead = max(0, self.outstanding - self.workers + 1)
+        return ahead * self.service_time / self.workers
+
+    def run(self, fn, deadline: float):
+        """Run fn on the pool and return its result, or raise Overloaded / TimeoutError."""
+        with self._lock:
+            wait = self.predicted_wait()
+            if self.outstanding >= self.max_outstanding or wait + self.service_time > deadline:
+                self.stats["rejected"] += 1
+                raise Overloaded(retry_after=max(1, math.ceil(wait + self.service_time)))
+            self.outstanding += 1
+            self.stats["accepted"] += 1
+
+        future = self._executor.submit(self._timed, fn)
+        return future.result(timeout=deadline)
+
+    def _timed(self, fn):
+        start = time.perf_counter()
+        try:
+            return fn()
+        finally:
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                self.outstanding -= 1
+                self.service_time = (1 - self.alpha) * self.service_time + self.alpha * elapsed
+
+
+sync_pool = SyncInferencePool()
+
+
+def count_faces_now(original_url: str, customer_id: str, fileType: str) -> FaceCountResponse:
+    """The full pipeline for one image, returning the response instead of relaying it."""
+    url_key = url_cache_key(original_url)
+    if RESULT_CACHE_ENABLED:
+        cached = result_cache.get(url_key)
+        record_lookup("url_cache", cached is not None)
+        if cached is not None:
+            return FaceCountResponse(faces=cached["faces"], count=cached["count"],
+                                     annotated_image_url=cached["annotated_url"] or original_url)
+
+    with observe_stage("fetch"):
+        image_bytes = read_spooled(original_url) if is_spool_handle(original_url) else fetch_image_bytes(original_url)
+    with observe_stage("decode"):
+        frame, scale = decode_image(image_bytes, IMG_SIZE if REDUCED_DECODE else None)
+
+    frame = enhance_frame(frame)
+    boxes, confs = detect_faces(frame)
+    lazy = annotates_lazily(original_url)
+    output, annotated, _ = analyze_detections(frame, boxes, confs, scale, annotate=not lazy)
+
+    annotated_url = None
+    try:
+        with observe_stage("save"):
+            if lazy:
+                annotated_url, _ = save_detections(output["faces"], output["count"], original_url, customer_id)
+            else:
+                annotated_url, _ = save_image_and_metadata(annotated, output["faces"], output["count"], original_url, customer_id, fileType)
+    except Exception as e:
+        logger.error(f"Failed saving metadata for {original_url}: {type(e).__name__} - {e}")
+
+    if RESULT_CACHE_ENABLED and annotated_url is not None:
+        result_cache.set(url_key, {"count": output["count"], "faces": output["faces"], "annotated_url": annotated_url})
+        on_upload_failure(annotated_url, lambda: result_cache.delete(url_key))
+
+    return FaceCountResponse(faces=output["faces"], count=output["count"],
+                             annotated_image_url=annotated_url or original_url)
@@ -0,0 +1,129 @@
+import logging
+
+import cv2
+import numpy as np
+
+from config.base_config import (
+    IMG_SIZE, IOU_THRESH, INFERENCE_BATCHING,
+    TILE_SIZE, TILE_OVERLAP, TILE_FULL_FRAME, TILE_MIN_STD, TILE_MIN_EDGE, TILE_MERGE_IOS
+)
+from .batch_inference import engine, predict_frames
+
+logger = logging.getLogger(__name__)
+
+ACTIVITY_SIZE = 256     # px, longest side of the thumbnail used to find empty tiles
+
+
+def _axis_starts(length, tile, stride):
+    """Tile origins along one axis; the last tile is shifted back to end at the border."""
+    if length <= tile:
+        return [0]
+    starts = list(range(0, length - tile, stride))
+    starts.append(length - tile)
+    return starts
+
+
+def tile_grid(height, width, tile_size=TILE_SIZE, overlap=TILE_OVERLAP):
+    """Overlapping (x1, y1, x2, y2) tiles covering the frame, each at most tile_size square."""
+    stride = max(1, int(tile_size * (1 - overlap)))
+    return [
+        (x, y, min(x + tile_size, width), min(y + tile_size, height))
+        for y in _axis_starts(height, tile_size, stride)
+        for x in _axis_starts(width, tile_size, stride)
+    ]
+
+
+def active_tiles(frame, tiles, min_std=TILE_MIN_STD, min_edge=TILE_MIN_EDGE):
+    """Boolean mask of tiles with enough texture to possibly hold a face.
+
+    Gray std and mean absolute Laplacian per tile are measured on a small thumbnail
+    of the frame; walls, ceilings, sky and black regions fall below both thresholds.
+    """
+    h, w = frame.shape[:2]
+    scale = min(1.0, ACTIVITY_SIZE / max(h, w))
+    small = cv2.resize(frame, (max(1, int(w * scale)), max(1, int(h * scale))), interpolation=cv2.INTER_AREA)
+    gray = cv2.cvtColor(small, cv2.COLOR_RGB2GRAY)
+    edges = np.abs(cv2.Laplacian(gray, cv2.CV_16S))
+
+    active = np.zeros(len(tiles), dtype=bool)
+    for i, (x1, y1, x2, y2) in enumerate(tiles):
+        sx1, sy1 = int(x1 * scale), int(y1 * scale)
+        sx2, sy2 = max(sx1 + 1, int(np.ceil(x2 * scale))), max(sy1 + 1, int(np.ceil(y2 * scale)))
+        active[i] = gray[sy1:sy2, sx1:sx2].std() >= min_std or edges[sy1:sy2, sx1:sx2].mean() >= min_edge
+    return active
+
+
+def merge_detections(boxes, confs, iou_thresh=IOU_THRESH, ios_thresh=TILE_MERGE_IOS):
+    """Greedy NMS over detections from several tiles (and the optional full-frame pass).
+
+    Besides IoU, a box is suppressed when most of it lies inside a higher-confidence box
+    (intersection over the smaller area >= ios_thresh): faces cut by a tile seam come
+    back as a partial box from one tile and a whole box from the neighbouring one, so the
+    kept box is grown to the union of the boxes merged into it that way.
+    """
+    if len(boxes) == 0:
+        return boxes, confs
+
+    order = np.argsort(-confs)
+    boxes, confs = boxes[order], confs[order]
+    areas = np.maximum(boxes[:, 2] - boxes[:, 0], 0) * np.maximum(boxes[:, 3] - boxes[:, 1], 0)
+    suppressed = np.zeros(len(boxes), dtype=bool)
+    keep = []
+
+    for i in range(len(boxes)):
+        if suppressed[i]:
+            continue
+        keep.append(i)
+        rest = np.flatnonzero(~suppressed[i + 1:]) + i + 1
+        if len(rest) == 0:
+            break
+        iw = np.maximum(np.minimum(boxes[i, 2], boxes[rest, 2]) - np.maximum(boxes[i, 0], boxes[rest, 0]), 0)
+        ih = np.maximum(np.minimum(boxes[i, 3], boxes[rest, 3]) - np.maximum(boxes[i, 1], boxes[rest, 1]), 0)
+        inter = iw * ih
+        iou = inter / (areas[i] + areas[rest] - inter + 1e-6)
+        ios = inter / (np.minimum(areas[i], areas[rest]) + 1e-6)
+        contained = rest[ios >= ios_thresh]
+        if len(contained):
+            boxes[i, :2] = np.minimum(boxes[i, :2], boxes[contained, :2].min(axis=0))
+            boxes[i, 2:] = np.maximum(boxes[i, 2:], boxes[contained, 2:].max(axis=0))
+        suppressed[rest[(iou >= iou_thresh) | (ios >= ios_thresh)]] = True
+
+    return boxes[keep], confs[keep]
+
+
+def run_inference_tiled(frame, tile_size=TILE_SIZE, overlap=TILE_OVERLAP, full_frame=TILE_FULL_FRAME):
+    """Detect faces tile by tile at native model resolution and merge them in frame coordinates.
+
+    All non-empty tiles go to the model in one batched predict; with full_frame the
+    whole frame is also run at IMG_SIZE so faces larger than the tile overlap are not
+    only seen cut in half. Frames that fit in a single tile take the normal path.
+    """
+    h, w = frame.shape[:2]
+    tiles = tile_grid(h, w, tile_size, overlap)
+    if len(tiles) == 1:
+        return (engine.predict(frame, IMG_SIZE) if INFERENCE_BATCHING else predict_frames([frame], IMG_SIZE)[0])
+
+    active = active_tiles(frame, tiles)
+    selected = [tile for tile, keep in zip(tiles, active) if keep]
+    crops = [np.ascontiguousarray(frame[y1:y2, x1:x2]) for x1, y1, x2, y2 in selected]
+    logger.debug(f"Tiled inference: {len(selected)}/{len(tiles)} tiles active")
+
+    if INFERENCE_BATCHING:
+        detections = engine.predict_many(crops, tile_size) if crops else []
+        if full_frame:
+            detections.append(engine.predict(frame, IMG_SIZE))
+    else:
+        detections = predict_frames(crops, tile_size) if crops else []
+        if full_frame:
+            detections += predict_frames([frame], IMG_SIZE)
+
+    offsets = [np.array([x1, y1, x1, y1], dtype=np.float32) for x1, y1, _, _ in selected]
+    if full_frame:
+        offsets.append(np.zeros(4, dtype=np.float32))
+
+    all_boxes = [boxes.reshape(-1, 4) + offset for (boxes, _), offset in zip(detections, offsets)]
+    all_confs = [confs.reshape(-1) for _, confs in detections]
+    if not all_boxes:
+        return np.zeros((0, 4), dtype=np.float32), np.zeros(0, dtype=np.float32)
+
+    return merge_detections(np.concatenate(all_boxes), np.concatenate(all_confs))
@@ -0,0 +1,195 @@
+import atexit
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+import cv2
+import numpy as np
+
+from config.base_config import (
+    S3_BUCKET_NAME, AWS_REGION, S3_ENDPOINT_URL, S3_UPLOAD_WORKERS, S3_UPLOAD_QUEUE_MAX,
+    S3_UPLOAD_RETRIES, S3_MULTIPART_THRESHOLD
+)
+from config.persistence.aws_s3 import s3
+from .metrics import UPLOAD_FAILURES
+
+logger = logging.getLogger(__name__)
+
+
+def s3_object_url(object_name: str, bucket: str = S3_BUCKET_NAME) -> str:
+    """Deterministic public URL of an object, known before the upload finishes."""
+    if S3_ENDPOINT_URL:
+        return f"{S3_ENDPOINT_URL.rstrip('/')}/{bucket}/{object_name}"
+    return f"https://{bucket}.s3.{AWS_REGION}.amazonaws.com/{object_name}"
+
+
+def encode_jpeg(frame: np.ndarray) -> bytes:
+    """RGB frame -> JPEG bytes."""
+    bgr_frame = cv2.cvtColor(frame, cv2.COLOR_RGB2BGR)
+    success, encoded_image = cv2.imencode(".jpg", bgr_frame) # only JPG for now
+    if not success:
+        raise ValueError("Failed to encode frame as JPEG")
+    return encoded_image.tobytes()
+
+
+class UploadPipeline:
+    """Encodes and uploads annotated frames on a thread pool, off the inference path.
+
+    submit() returns the object's URL immediately. At most max_pending uploads are
+    queued or in flight; beyond that submit() blocks, which throttles the producer
+    instead of buffering frames without bound. Failed uploads are retried with
+    exponential backoff; bodies over multipart_threshold go through a multipart upload.
+    on_done(uploaded) runs once the upload finished or was given up (e.g. to write the row
+    that references the object); callers that already handed the URL out register
+    when_failed() callbacks to undo that once the upload is given up.
+    """
+
+    FAILED_MEMORY = 1024   # recently failed URLs, for callbacks registered after the failure
+
+    def __init__(self, client=None, bucket=S3_BUCKET_NAME, max_workers=S3_UPLOAD_WORKERS, max_pending=S3_UPLOAD_QUEUE_MAX,
+                 retries=S3_UPLOAD_RETRIES, multipart_threshold=S3_MULTIPART_THRESHOLD):
+        self.client = client or s3
+        self.bucket = bucket
+        self.retries = retries
+        self.multipart_threshold = multipart_threshold
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="s3-upload")
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self.pending = 0
+        self._pending_lock = threading.Lock()
+        self._callbacks = {}           # URL in flight -> callbacks to run if it fails
+        self._done = {}                # URL in flight -> on_done(uploaded)
+        self._failed = OrderedDict()   # recently failed URLs
+        self.stats = {"uploaded": 0, "failed": 0, "retries": 0}
+
+    def submit(self, frame: np.ndarray, object_name: str, content_type: str, on_done=None) -> str:
+        """Queue the frame for upload and return its URL without waiting for S3."""
+        url = s3_object_url(object_name, self.bucket)
+        self._slots.acquire()
+        with self._pending_lock:
+            self.pending += 1
+            self._callbacks.setdefault(url, [])
+            self._failed.pop(url, None)
+            if on_done is not None:
+                self._done[url] = on_done
+        try:
+            future = self._executor.submit(self._upload, frame, object_name, content_type)
+        except Exception:
+            self._release()
+            raise
+        future.add_done_callback(lambda f: self._finish(url, f.exception() is None and f.result()))
+        return url
+
+    def when_failed(self, url: str, callback):
+        """Run callback() if the upload of url is given up; immediately if it already was."""
+        with self._pending_lock:
+            if url in self._callbacks:
+                self._callbacks[url].append(callback)
+                return
+            failed = url in self._failed
+        if failed:
+            callback()
+
+    def _count(self, name):
+        with self._pending_lock:
+            self.stats[name] += 1
+
+    def _finish(self, url, uploaded):
+        with self._pending_lock:
+            callbacks = self._callbacks.pop(url, [])
+            on_done = self._done.pop(url, None)
+            if not uploaded:
+                self._failed[url] = True
+                while len(self._failed) > self.FAILED_MEMORY:
+                    self._failed.popitem(last=False)
+        self._release()
+        if on_done is not None:
+            try:
+                on_done(uploaded)
+            except Exception as e:
+                logger.error(f"Upload completion callback for {url} failed: {type(e).__name__} - {e}")
+        if uploaded:
+            return
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception as e:
+                logger.error(f"Upload failure callback for {url} failed: {type(e).__name__} - {e}")
+
+    def _release(self):
+        with self._pending_lock:
+            self.pending -= 1
+        self._slots.release()
+
+    def drain(self):
+        """Wait for queued uploads to finish and stop the pool."""
+        self._executor.shutdown(wait=True)
+        logger.info(f"S3 upload pipeline drained: {self.stats}")
+
+    def _put(self, body: bytes, object_name: str, content_type: str):
+        if len(body) >= self.multipart_threshold:
+            from boto3.s3.transfer import TransferConfig
+
+            config = TransferConfig(multipart_threshold=self.multipart_threshold,
+                                    multipart_chunksize=max(self.multipart_threshold, 5 * 1024 * 1024),
+                                    use_threads=False)
+            self.client.upload_fileobj(BytesIO(body), self.bucket, object_name,
+                                       ExtraArgs={"ContentType": content_type}, Config=config)
+        else:
+            self.client.put_object(Body=body, Bucket=self.bucket, Key=object_name, ContentType=content_type)
+
+    def _upload(self, frame: np.ndarray, object_name: str, content_type: str) -> bool:
+        try:
+            body = encode_jpeg(frame)
+        except Exception as e:
+            self._count("failed")
+            UPLOAD_FAILURES.labels(reason="encode").inc()
+            logger.error(f"Failed to encode {object_name}: {type(e).__name__} - {e}")
+            return False
+
+        for attempt in range(self.retries + 1):
+            try:
+                self._put(body, object_name, content_type)
+                self._count("uploaded")
+                logger.info(f"Uploaded to S3: {object_name}")
+                return True
+            except Exception as e:
+                if attempt == self.retries:
+                    self._count("failed")
+                    UPLOAD_FAILURES.labels(reason="upload").inc()
+                    logger.error(f"Failed to upload to S3 after {attempt + 1} attempts {object_name}: {type(e).__name__} - {e}")
+                    return False
+                self._count("retries")
+                time.sleep(min(0.2 * 2 ** attempt, 5))
+
+
+_pipeline = None
+_pipeline_pid = None
+_pipeline_lock = threading.Lock()
+
+
+def get_upload_pipeline() -> UploadPipeline:
+    """The upload pipeline of this process (thread pools do not survive a fork)."""
+    global _pipeline, _pipeline_pid
+    if _pipeline is None or _pipeline_pid != os.getpid():
+        with _pipeline_lock:
+            if _pipeline is None or _pipeline_pid != os.getpid():
+                _pipeline, _pipeline_pid = UploadPipeline(), os.getpid()
+    return _pipeline
+
+
+def upload_pending() -> int:
+    """Uploads queued or in flight in this process."""
+    return _pipeline.pending if _pipeline is not None and _pipeline_pid == os.getpid() else 0
+
+
+def shutdown_upload_pipeline():
+    """Finish pending uploads; wired to Celery worker shutdown and interpreter exit."""
+    if _pipeline is not None and _pipeline_pid == os.getpid():
+        _pipeline.drain()
+
+
+atexit.register(shutdown_upload_pipeline)
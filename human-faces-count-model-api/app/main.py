@@ -2,13 +2,22 @@ from fastapi import FastAPI
 from fastapi.staticfiles import StaticFiles
 import os
 from  app.routes.faces_routes import router
+from app.routes.occupancy_routes import router as occupancy_router
 from config.base_config import OUTPUT_DIR
 from fastapi.templating import Jinja2Templates
 from fastapi.requests import Request
+from fastapi.responses import Response
+from prometheus_client import generate_latest, CONTENT_TYPE_LATEST
+from app.helpers.metrics import register_pool_gauges
+from config.base_config import SYNC_INFERENCE, STALE_FRAME_POLICY
+from app.helpers.spool import start_spool_cleanup
 from fastapi.openapi.docs import get_swagger_ui_html
 from config.logging.file_logging import setup_logging
 from config.logging.logging_middleware import RequestLoggingMiddleware
 from config.persistence.postgres_db import engine, Base
+from config.persistence.migrations import run_migrations
+from config.persistence.partitions import maintain_partitions
+from config.persistence.shared_store import require_shared_store
 from app.websockets.websocket_connect import WebSocketManager
 import threading
 
@@ -53,6 +62,7 @@ app.mount("/output", StaticFiles(directory=OUTPUT_DIR), name="output")
 
 # Include API routes
 app.include_router(router)
+app.include_router(occupancy_router)
 
 # Add logging middleware
 app.add_middleware(RequestLoggingMiddleware)
@@ -73,6 +83,11 @@ async def custom_swagger_ui(request: Request):
         "swagger.html", {"request": request, "swagger_html": swagger_html}
     )
 
+@app.get("/metrics", include_in_schema=False)
+def metrics():
+    """Prometheus metrics of the API process."""
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
+
 # connectToWebsocketServer()
 # listenWebSocketServerForMessageOrConnectionLoss()
 
@@ -81,10 +96,21 @@ async def custom_swagger_ui(request: Request):
 @app.on_event("startup")
 def startup_event():
     logger.info("🚀 Application started successfully.")
+    register_pool_gauges()
+    start_spool_cleanup()
+    if STALE_FRAME_POLICY != "off":
+        # The API writes the markers the workers check
+        require_shared_store("STALE_FRAME_POLICY")
+    if SYNC_INFERENCE:
+        # /faces/sync runs inference in this process
+        from config.inference.model_registry import load_and_warm_up
+        load_and_warm_up()
     with engine.begin() as conn:
         Base.metadata.create_all(bind=conn)
+    run_migrations(engine)
+    maintain_partitions(engine)
     logger.info("✅ Tables created (if not already existing)")
-    WebSocketManager.connect()  # Start connection once
+    # Connects in the background so an unreachable WSS server cannot block startup
     threading.Thread(target=WebSocketManager.listen, daemon=True).start()
 
 
@@ -0,0 +1,134 @@
+import atexit
+import logging
+import os
+import socket
+import threading
+import time
+
+import numpy as np
+from multiprocessing import shared_memory
+
+from config.base_config import IMG_SIZE, MODEL_SERVER_SOCKET, MODEL_SERVER_TIMEOUT
+from .protocol import send_message, recv_message
+
+logger = logging.getLogger(__name__)
+
+MIN_SEGMENT_BYTES = 8 * 1024 * 1024
+
+
+class ModelServerClient:
+    """Connection + shared-memory frame buffer to the host's model server.
+
+    Not thread-safe: use one client per thread (see get_model_client). The buffer is
+    owned (and unlinked) by the client and grows to fit the largest request.
+    """
+
+    def __init__(self, path=MODEL_SERVER_SOCKET, timeout=MODEL_SERVER_TIMEOUT):
+        self.path = path
+        self.timeout = timeout
+        self._sock = None
+        self._shm = None
+
+    def _connect(self):
+        """Connect, waiting up to timeout for a server that is still starting (socket missing or refusing)."""
+        deadline = time.monotonic() + self.timeout
+        delay = 0.05
+        while True:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.settimeout(self.timeout)
+            try:
+                sock.connect(self.path)
+                self._sock = sock
+                return
+            except (FileNotFoundError, ConnectionRefusedError):
+                sock.close()
+                if time.monotonic() + delay > deadline:
+                    raise
+                logger.info(f"Model server at {self.path} not ready, retrying in {delay:.2f}s")
+                time.sleep(delay)
+                delay = min(delay * 2, 2.0)
+
+    def _buffer(self, size):
+        if self._shm is None or self._shm.size < size:
+            self._release_buffer()
+            self._shm = shared_memory.SharedMemory(create=True, size=max(size, MIN_SEGMENT_BYTES))
+        return self._shm
+
+    def _release_buffer(self):
+        if self._shm is not None:
+            self._shm.close()
+            try:
+                self._shm.unlink()
+            except FileNotFoundError:
+                pass
+            self._shm = None
+
+    def predict(self, frames, imgsz=IMG_SIZE):
+        """Same contract as predict_frames: list of (xyxy boxes, confidences) per frame."""
+        frames = [np.ascontiguousarray(frame, dtype=np.uint8) for frame in frames]
+        shm = self._buffer(sum(frame.nbytes for frame in frames))
+
+        layout, offset = [], 0
+        for frame in frames:
+            np.ndarray(frame.shape, dtype=np.uint8, buffer=shm.buf, offset=offset)[...] = frame
+            layout.append({"offset": offset, "shape": list(frame.shape)})
+            offset += frame.nbytes
+
+        request = {"shm": shm.name, "frames": layout, "imgsz": imgsz}
+        for attempt in (1, 2):
+            try:
+                if self._sock is None:
+                    self._connect()
+                send_message(self._sock, request)
+                response = recv_message(self._sock)
+                break
+            except (OSError, ConnectionError) as e:
+                self.close_connection()
+                if attempt == 2:
+                    raise RuntimeError(f"Model server unavailable at {self.path}: {e}") from e
+
+        if "error" in response:
+            raise RuntimeError(f"Model server error: {response['error']}")
+        return [
+            (np.asarray(boxes, dtype=np.float32).reshape(-1, 4), np.asarray(confs, dtype=np.float32))
+            for boxes, confs in response["detections"]
+        ]
+
+    def close_connection(self):
+        if self._sock is not None:
+            try:
+                self._sock.close()
+            except OSError:
+                pass
+            self._sock = None
+
+    def close(self):
+        self.close_connection()
+        self._release_buffer()
+
+
+_local = threading.local()
+_clients = []
+_clients_lock = threading.Lock()
+
+
+def get_model_client() -> ModelServerClient:
+    """The calling thread's client (sockets and buffers are not shared across forks either)."""
+    client = getattr(_local, "client", None)
+    if client is None or getattr(_local, "pid", None) != os.getpid():
+        client = ModelServerClient()
+        _local.client, _local.pid = client, os.getpid()
+        with _clients_lock:
+            _clients.append((os.getpid(), client))
+    return client
+
+
+def close_model_clients():
+    """Unlink this process' shared-memory buffers."""
+    with _clients_lock:
+        for pid, client in _clients:
+            if pid == os.getpid():
+                client.close()
+
+
+atexit.register(close_model_clients)
@@ -0,0 +1,43 @@
+import json
+import socket
+import struct
+
+from multiprocessing import resource_tracker, shared_memory
+
+_HEADER = struct.Struct("!I")
+
+
+def send_message(sock: socket.socket, message: dict):
+    """Length-prefixed JSON frame."""
+    payload = json.dumps(message).encode("utf-8")
+    sock.sendall(_HEADER.pack(len(payload)) + payload)
+
+
+def _recv_exact(sock: socket.socket, size: int) -> bytes:
+    chunks, remaining = [], size
+    while remaining:
+        chunk = sock.recv(remaining)
+        if not chunk:
+            raise ConnectionError("Model server connection closed")
+        chunks.append(chunk)
+        remaining -= len(chunk)
+    return b"".join(chunks)
+
+
+def recv_message(sock: socket.socket) -> dict:
+    (size,) = _HEADER.unpack(_recv_exact(sock, _HEADER.size))
+    return json.loads(_recv_exact(sock, size))
+
+
+def attach_shared_memory(name: str) -> shared_memory.SharedMemory:
+    """Attach to a segment owned by another process without adopting it.
+
+    Before Python 3.13 attaching registers the segment with this process' resource
+    tracker, which would unlink it (and warn) when this process exits.
+    """
+    shm = shared_memory.SharedMemory(name=name)
+    try:
+        resource_tracker.unregister(shm._name, "shared_memory")
+    except Exception:
+        pass
+    return shm
@@ -0,0 +1,109 @@
+"""Per-host model server: one model copy for all Celery children of the host.
+
+Children write frames into their own shared-memory segment and send a small
+request over a unix socket; the server runs them through the batching engine, so
+frames from different children end up in the same predict call, and answers
+with the boxes.
+
+    python -m app.model_server.server
+"""
+import logging
+import os
+import socketserver
+
+import numpy as np
+
+from config.base_config import IMG_SIZE, MODEL_SERVER_SOCKET, MODEL_SERVER_THREADS, MODEL_SERVER_CPUS
+from config.inference.model_registry import set_process_role, load_and_warm_up
+from app.helpers.batch_inference import BatchInferenceEngine
+from .protocol import send_message, recv_message, attach_shared_memory
+
+logger = logging.getLogger(__name__)
+
+
+def parse_cpu_list(spec: str):
+    """'0-3,8,10-11' -> {0, 1, 2, 3, 8, 10, 11}."""
+    cpus = set()
+    for part in filter(None, (p.strip() for p in spec.split(","))):
+        start, _, end = part.partition("-")
+        cpus.update(range(int(start), int(end or start) + 1))
+    return cpus
+
+
+def tune_runtime(cpus_spec=MODEL_SERVER_CPUS, threads=MODEL_SERVER_THREADS):
+    """Pin the server to its cores and size torch's thread pools to them."""
+    if cpus_spec and hasattr(os, "sched_setaffinity"):
+        os.sched_setaffinity(0, parse_cpu_list(cpus_spec))
+    cores = len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else os.cpu_count()
+    threads = threads or cores
+
+    # torch is already imported (and its OpenMP runtime initialised) by now, so OMP_NUM_THREADS
+    # would be ignored here; set_num_threads resizes the intra-op pool directly
+    try:
+        import torch
+        torch.set_num_threads(threads)
+        torch.set_num_interop_threads(1)
+    except ImportError:
+        pass
+    logger.info(f"Model server using {threads} intra-op thread(s) on {cores} core(s)")
+
+
+class InferenceRequestHandler(socketserver.BaseRequestHandler):
+    """One connection per client thread; requests on it are served in order."""
+
+    def handle(self):
+        shm = None
+        try:
+            while True:
+                try:
+                    request = recv_message(self.request)
+                except ConnectionError:
+                    break
+
+                try:
+                    if shm is None or shm.name != request["shm"]:
+                        if shm is not None:
+                            shm.close()
+                        shm = attach_shared_memory(request["shm"])
+
+                    frames = [
+                        np.ndarray(tuple(frame["shape"]), dtype=np.uint8, buffer=shm.buf, offset=frame["offset"])
+                        for frame in request["frames"]
+                    ]
+                    detections = self.server.engine.predict_many(frames, request.get("imgsz", IMG_SIZE))
+                    del frames  # views into shm.buf must be gone before it can be closed
+                    send_message(self.request, {
+                        "detections": [[boxes.tolist(), confs.tolist()] for boxes, confs in detections]
+                    })
+                except Exception as e:
+                    logger.error(f"Model server request failed: {type(e).__name__} - {e}")
+                    send_message(self.request, {"error": f"{type(e).__name__} - {e}"})
+        finally:
+            if shm is not None:
+                shm.close()
+
+
+class ModelServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, path, engine):
+        if os.path.exists(path):
+            os.unlink(path)   # stale socket from a previous run
+        super().__init__(path, InferenceRequestHandler)
+        os.chmod(path, 0o660)
+        self.engine = engine
+
+
+def main():
+    logging.basicConfig(level=os.getenv("LOGGING_LEVEL", "INFO"))
+    tune_runtime()
+    set_process_role("model_server")
+    load_and_warm_up()
+
+    with ModelServer(MODEL_SERVER_SOCKET, BatchInferenceEngine()) as server:
+        logger.info(f"Model server listening on {MODEL_SERVER_SOCKET}")
+        server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,40 @@
 import hashlib
-from sqlalchemy import Column, String, Integer, JSON, DateTime
+import numpy as np
+from sqlalchemy import Column, String, Integer, JSON, DateTime, Index, LargeBinary
+from config.base_config import FACES_STORAGE, DB_PARTITIONING
 from config.persistence.postgres_db import Base
 
+# faces_blob layout: N little-endian uint16 [x, y, w, h] boxes, then N uint8 confidences (x / 255)
+_BOX_DTYPE = np.dtype("<u2")
+_BYTES_PER_FACE = 4 * _BOX_DTYPE.itemsize + 1
+
 def hash_url(url: str) -> str:
     """Return a deterministic short hash for a given URL."""
     return hashlib.sha256(url.encode("utf-8")).hexdigest()[:16]  # 16 hex chars = 8 bytes
 
+def encode_faces(faces) -> bytes:
+    """[{"bbox": [x, y, w, h], "confidence": c}, ...] -> faces_blob bytes (9 bytes per face)."""
+    boxes = np.array([face["bbox"] for face in faces], dtype=np.float64).reshape(-1, 4)
+    confs = np.array([face["confidence"] for face in faces], dtype=np.float64)
+    boxes = np.clip(np.rint(boxes), 0, np.iinfo(np.uint16).max).astype(_BOX_DTYPE)
+    confs = np.clip(np.rint(confs * 255), 0, 255).astype(np.uint8)
+    return boxes.tobytes() + confs.tobytes()
+
+def decode_boxes(blob):
+    """Zero-copy views of a faces_blob: (N x 4 uint16 [x, y, w, h] boxes, N uint8 confidences)."""
+    n = len(blob) // _BYTES_PER_FACE
+    boxes = np.frombuffer(blob, dtype=_BOX_DTYPE, count=4 * n).reshape(n, 4)
+    confs = np.frombuffer(blob, dtype=np.uint8, count=n, offset=4 * n * _BOX_DTYPE.itemsize)
+    return boxes, confs
+
+def decode_faces(blob):
+    """faces_blob -> the FaceBox dicts of the API (confidences back to 2 decimals)."""
+    boxes, confs = decode_boxes(blob)
+    return [
+        {"bbox": box, "confidence": round(conf / 255, 2)}
+        for box, conf in zip(boxes.tolist(), confs.tolist())
+    ]
+
 class FaceDetectionCount(Base):
     __tablename__ = "face_detection_counts"
 
@@ -14,15 +43,47 @@ class FaceDetectionCount(Base):
     annotated_image_url = Column(String, nullable=False)
     face_count = Column(Integer, nullable=False)
     device_imei = Column(String, nullable=False)
-    customer_id = Column(String, nullable=False)
-    datetime = Column(DateTime, nullable=False)
-    faces_data = Column(JSON, nullable=False)
+    # Partitioned tables need the partition keys in the primary key (see config.persistence.partitions);
+    # both derive from the request like id, so upserts on the wider key still hit the same row
+    customer_id = Column(String, nullable=False, primary_key=DB_PARTITIONING == "month_customer")
+    datetime = Column(DateTime, nullable=False, primary_key=DB_PARTITIONING in ("month", "month_customer"))
+    faces_data = Column(JSON, nullable=True)        # FACES_STORAGE=json and rows not yet migrated
+    faces_blob = Column(LargeBinary, nullable=True)  # FACES_STORAGE=blob, see encode_faces
+
+    __table_args__ = (
+        Index("ix_face_counts_customer_device_datetime", "customer_id", "device_imei", "datetime"),
+        Index("ix_face_counts_customer_datetime", "customer_id", "datetime"),
+        {"postgresql_partition_by": "RANGE (datetime)"} if DB_PARTITIONING in ("month", "month_customer") else {},
+    )
+
+    @property
+    def faces(self):
+        """Detected faces as FaceBox dicts, whichever column holds them."""
+        if self.faces_blob is not None:
+            return decode_faces(self.faces_blob)
+        return self.faces_data or []
+
+    @property
+    def face_arrays(self):
+        """(boxes, confidences) arrays; zero-copy views for faces_blob rows."""
+        if self.faces_blob is not None:
+            return decode_boxes(self.faces_blob)
+        return decode_boxes(encode_faces(self.faces_data or []))
 
     @classmethod
     def from_detection(cls, original_image_url, annotated_image_url, face_count,
                        device_imei, customer_id, datetime, faces_data):
         """Factory method to create instance with hashed ID."""
-        return cls(
+        return cls(**cls.row_from_detection(
+            original_image_url, annotated_image_url, face_count,
+            device_imei, customer_id, datetime, faces_data
+        ))
+
+    @staticmethod
+    def row_from_detection(original_image_url, annotated_image_url, face_count,
+                           device_imei, customer_id, datetime, faces_data):
+        """Plain column dict for bulk inserts, with the same hashed ID as from_detection."""
+        return dict(
             id=hash_url(original_image_url),
             original_image_url=original_image_url,
             annotated_image_url=annotated_image_url,
@@ -30,5 +91,35 @@ class FaceDetectionCount(Base):
             device_imei=device_imei,
             customer_id=customer_id,
             datetime=datetime,
-            faces_data=faces_data
+            faces_data=faces_data if FACES_STORAGE == "json" else None,
+            faces_blob=encode_faces(faces_data) if FACES_STORAGE == "blob" else None,
         )
+
+
+class OccupancyRollupMixin:
+    """Face counts of one device aggregated over a time bucket (see app.helpers.occupancy_rollups).
+
+    The primary key (customer_id, device_imei, bucket) is the index range queries use.
+    """
+
+    customer_id = Column(String, primary_key=True)
+    device_imei = Column(String, primary_key=True)
+    bucket = Column(DateTime, primary_key=True)
+    samples = Column(Integer, nullable=False)
+    count_sum = Column(Integer, nullable=False)
+    count_min = Column(Integer, nullable=False)
+    count_max = Column(Integer, nullable=False)
+    last_count = Column(Integer, nullable=False)
+    last_at = Column(DateTime, nullable=False)
+
+
+class OccupancyMinute(OccupancyRollupMixin, Base):
+    __tablename__ = "occupancy_minute"
+
+
+class OccupancyHour(OccupancyRollupMixin, Base):
+    __tablename__ = "occupancy_hour"
+
+
+class OccupancyDay(OccupancyRollupMixin, Base):
+    __tablename__ = "occupancy_day"
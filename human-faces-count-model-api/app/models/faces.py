@@ -1,7 +1,7 @@
 # app/models/face.py
 
 from pydantic import BaseModel, Field
-from typing import List
+from typing import List, Optional
 
 
 class FaceBox(BaseModel):
@@ -26,3 +26,27 @@ class FaceCountResponse(BaseModel):
         example="https://api.example.com/images/face_annotated.jpg",
     )
 
+
+class FaceBatchItem(BaseModel):
+    image_url: str = Field(..., description="Public URL of the image to analyze.")
+    customer_id: str = Field(..., description="Customer id")
+    target_session: str = Field(..., description="WSS socket session to send face counts")
+    fileType: str = Field(..., description="Image Type", example="image/jpeg")
+
+
+class FaceBatchRequest(BaseModel):
+    items: List[FaceBatchItem] = Field(..., description="Images to queue, e.g. a device backlog.")
+
+
+class FaceBatchItemStatus(BaseModel):
+    index: int = Field(..., description="Position of the item in the request.")
+    image_url: str
+    accepted: bool = Field(..., description="Whether the item was queued for processing.")
+    detail: Optional[str] = Field(None, description="Why the item was rejected.")
+
+
+class FaceBatchResponse(BaseModel):
+    accepted: int = Field(..., description="Number of items queued.")
+    rejected: int = Field(..., description="Number of items refused.")
+    tasks: int = Field(..., description="Number of Celery tasks the accepted items were split into.")
+    items: List[FaceBatchItemStatus]
@@ -0,0 +1,22 @@
+from datetime import datetime
+from typing import List
+
+from pydantic import BaseModel, Field
+
+
+class OccupancyPoint(BaseModel):
+    device_imei: str = Field(..., description="Device IMEI")
+    bucket: datetime = Field(..., description="Start of the minute/hour/day bucket (UTC).")
+    samples: int = Field(..., description="Images counted in the bucket.", example=12)
+    min: int = Field(..., description="Lowest face count in the bucket.", example=3)
+    max: int = Field(..., description="Highest face count in the bucket.", example=9)
+    avg: float = Field(..., description="Mean face count in the bucket.", example=5.5)
+    last: int = Field(..., description="Face count of the newest image in the bucket.", example=6)
+
+
+class OccupancyResponse(BaseModel):
+    customer_id: str = Field(..., description="Customer id")
+    granularity: str = Field(..., description="minute, hour or day", example="hour")
+    start: datetime
+    end: datetime
+    points: List[OccupancyPoint] = Field(..., description="Buckets ordered by device, then time.")
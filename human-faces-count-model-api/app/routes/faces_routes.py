@@ -1,10 +1,22 @@
 import cv2
-from fastapi import APIRouter, Form,HTTPException
-from fastapi.responses import JSONResponse
-from config.base_config import model, IMG_SIZE, CONF_THRESH, IOU_THRESH, DEVICE, OUTPUT_DIR, BASE_URL
+import time
+from fastapi import APIRouter, Form,HTTPException, File, UploadFile, Query, Request
+from starlette.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse, Response
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from config.base_config import IMG_SIZE, CONF_THRESH, IOU_THRESH, DEVICE, OUTPUT_DIR, BASE_URL
+from config.base_config import SYNC_INFERENCE, SYNC_DEADLINE_MS, BATCH_SUBMIT_MAX, BATCH_TASK_SIZE, FETCH_MAX_BYTES
+from config.base_config import RENDER_MAX_SIZE, RENDER_DEFAULT_QUALITY
+from celery import group
 import logging
-from ..models.faces import FaceCountResponse
-from app.tasks.face_tasks import save_image_and_metadata_task
+from ..models.faces import FaceCountResponse, FaceBatchRequest, FaceBatchResponse, FaceBatchItemStatus
+from app.tasks.face_tasks import save_image_and_metadata_task, process_image_batch_task
+from app.helpers.image_name import parse_image_name
+from app.helpers.sync_inference import sync_pool, count_faces_now, Overloaded
+from app.helpers.spool import spool_image
+from app.helpers.fair_scheduling import LANES
+from app.helpers.staleness import mark_enqueued
+from app.helpers.annotation_renderer import render_annotated
 
 
 logger = logging.getLogger(__name__)
@@ -41,23 +53,30 @@ router = APIRouter()
 def count_faces(image_url: str = Form(..., description="Public URL of the image to analyze."), 
                 customer_id: str = Form(..., description="Customer id"), 
                 target_session: str = Form(..., description="WSS socket session to send face counts"),
-                fileType: str = Form(..., description="Image Type")):
+                fileType: str = Form(..., description="Image Type"),
+                lane: str = Form("live", description="live, or backfill for historical frames (queued behind live ones)")):
     """
     Detect faces in the provided image URL.
     Returns bounding boxes, confidence scores, and a URL to the annotated image.
     """
     logger.info(f"Processing image from URL: {image_url}")
+    if lane not in LANES:
+        raise HTTPException(status_code=422, detail="lane must be live or backfill.")
 
     # Save annotated image
     try:
 
 
-        # Send async task to Celery
+        # Send async task to Celery; older live frames of the device queued before it become stale
+        if lane == "live":
+            mark_enqueued(image_url)
         save_image_and_metadata_task.delay(
             image_url,
             customer_id,
             fileType,
-            target_session
+            target_session,
+            enqueued_at=time.time(),
+            lane=lane
         )
 
         logger.info(" ai - image queued for processing " + image_url)
@@ -66,3 +85,189 @@ def count_faces(image_url: str = Form(..., description="Public URL of the image
     except Exception as e:
         logger.exception(f"Error saving annotated image {type(e).__name__} - {e}")
         raise HTTPException(status_code=500, detail=f"Failed to save annotated image: {e}")
+
+
+@router.post(
+    "/faces/sync",
+    summary="Detect and count faces in an image, synchronously",
+    tags=["Face Counter"],
+    response_model=FaceCountResponse,
+    responses={
+        200: {"description": "Faces detected successfully"},
+        400: {"description": "Bad Request"},
+        422: {"description": "Unprocessable Entity"},
+        501: {"description": "Synchronous inference is disabled (SYNC_INFERENCE)"},
+        503: {"description": "Inference pool cannot meet the deadline, see Retry-After"},
+        504: {"description": "Deadline exceeded while processing"},
+    },
+)
+def count_faces_sync(image_url: str = Form(..., description="Public URL of the image to analyze."),
+                     customer_id: str = Form(..., description="Customer id"),
+                     fileType: str = Form(..., description="Image Type"),
+                     deadline_ms: int = Form(SYNC_DEADLINE_MS, description="Give up (503/504) if the count cannot be returned within this many ms")):
+    """
+    Detect faces in the provided image URL in this process and return the result directly,
+    without the broker and WSS relay hops. Meant for interactive callers such as kiosks.
+    """
+    if not SYNC_INFERENCE:
+        raise HTTPException(status_code=501, detail="Synchronous inference is disabled.")
+
+    try:
+        return sync_pool.run(lambda: count_faces_now(image_url, customer_id, fileType), deadline_ms / 1000.0)
+    except Overloaded as e:
+        logger.warning(f"/faces/sync refused {image_url}: {e}")
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+    except FutureTimeoutError:
+        logger.warning(f"/faces/sync deadline of {deadline_ms}ms exceeded for {image_url}")
+        raise HTTPException(status_code=504, detail=f"Deadline of {deadline_ms}ms exceeded.")
+
+
+def validate_batch_item(item, seen):
+    """Reason the item cannot be queued, or None."""
+    if not item.image_url.lower().startswith(("http://", "https://")):
+        return "Invalid URL format."
+    if item.image_url in seen:
+        return "Duplicate image_url in this batch."
+    try:
+        parse_image_name(item.image_url)
+    except (IndexError, ValueError):
+        return "Image name must be <imei>_<yyyymmdd>_<hhmmss>."
+    return None
+
+
+@router.post(
+    "/faces/batch",
+    summary="Queue many images for face counting in one request",
+    tags=["Face Counter"],
+    response_model=FaceBatchResponse,
+    responses={
+        413: {"description": "More than BATCH_SUBMIT_MAX items"},
+        500: {"description": "Internal Server Error"},
+    },
+)
+def count_faces_batch(request: FaceBatchRequest):
+    """
+    Validate all items, then enqueue the accepted ones in chunks of BATCH_TASK_SIZE images per task.
+    Each chunk is processed by one worker task with overlapping downloads and batched inference;
+    results are relayed per image to each item's target_session, as with /faces.
+    """
+    if len(request.items) > BATCH_SUBMIT_MAX:
+        raise HTTPException(status_code=413, detail=f"At most {BATCH_SUBMIT_MAX} items per batch.")
+
+    statuses, accepted, seen = [], [], set()
+    for index, item in enumerate(request.items):
+        detail = validate_batch_item(item, seen)
+        seen.add(item.image_url)
+        statuses.append(FaceBatchItemStatus(index=index, image_url=item.image_url, accepted=detail is None, detail=detail))
+        if detail is None:
+            accepted.append(item.model_dump())
+
+    # One customer per chunk: chunks are routed to the customer's backfill shard and take its concurrency slots
+    by_customer = {}
+    for item in accepted:
+        by_customer.setdefault(item["customer_id"], []).append(item)
+    chunks = [items[i:i + BATCH_TASK_SIZE] for items in by_customer.values() for i in range(0, len(items), BATCH_TASK_SIZE)]
+    if chunks:
+        try:
+            enqueued_at = time.time()
+            group(process_image_batch_task.s(chunk, enqueued_at=enqueued_at) for chunk in chunks).apply_async()
+        except Exception as e:
+            logger.exception(f"Failed to queue batch of {len(accepted)} images {type(e).__name__} - {e}")
+            raise HTTPException(status_code=500, detail=f"Failed to queue batch: {e}")
+
+    logger.info(f" ai - batch queued: {len(accepted)}/{len(request.items)} images in {len(chunks)} task(s)")
+    return FaceBatchResponse(accepted=len(accepted), rejected=len(request.items) - len(accepted),
+                             tasks=len(chunks), items=statuses)
+
+
+def queue_uploaded_image(data: bytes, file_name: str, customer_id: str, fileType: str, target_session: str):
+    """Spool uploaded bytes and queue the task with the spool handle instead of a URL."""
+    if not data:
+        raise HTTPException(status_code=422, detail="Empty image body.")
+    if len(data) > FETCH_MAX_BYTES:
+        raise HTTPException(status_code=413, detail=f"Image too large (limit {FETCH_MAX_BYTES} bytes).")
+    try:
+        parse_image_name(file_name or "")
+    except (IndexError, ValueError):
+        raise HTTPException(status_code=422, detail="file_name must be <imei>_<yyyymmdd>_<hhmmss>.")
+
+    try:
+        handle = spool_image(data, file_name)
+        mark_enqueued(handle)
+        save_image_and_metadata_task.delay(handle, customer_id, fileType, target_session, enqueued_at=time.time())
+    except Exception as e:
+        logger.exception(f"Error queueing uploaded image {type(e).__name__} - {e}")
+        raise HTTPException(status_code=500, detail=f"Failed to queue uploaded image: {e}")
+
+    logger.info(" ai - uploaded image queued for processing " + handle)
+    return JSONResponse({"message": "OK", "status": " ai - image queued for processing " + handle, "image_ref": handle})
+
+
+@router.post(
+    "/faces/upload",
+    summary="Upload an image (multipart) for face counting",
+    tags=["Face Counter"],
+    responses={
+        413: {"description": "Image too large"},
+        422: {"description": "Empty image or file name not <imei>_<yyyymmdd>_<hhmmss>"},
+        500: {"description": "Internal Server Error"},
+    },
+)
+def count_faces_upload(image: UploadFile = File(..., description="Image file."),
+                       customer_id: str = Form(..., description="Customer id"),
+                       target_session: str = Form(..., description="WSS socket session to send face counts"),
+                       fileType: str = Form(None, description="Image Type, defaults to the part's content type"),
+                       file_name: str = Form(None, description="<imei>_<yyyymmdd>_<hhmmss>.jpg, defaults to the uploaded file name")):
+    """
+    Like /faces, but with the image bytes in the request: they are spooled locally and the worker
+    maps them from the spool instead of downloading an image URL. The spool handle
+    (spool://<digest>/<file_name>) is recorded as the original image reference.
+    """
+    data = image.file.read(FETCH_MAX_BYTES + 1)
+    return queue_uploaded_image(data, file_name or image.filename, customer_id, fileType or image.content_type, target_session)
+
+
+@router.post(
+    "/faces/upload/raw",
+    summary="Upload raw image bytes for face counting",
+    tags=["Face Counter"],
+    responses={
+        413: {"description": "Image too large"},
+        422: {"description": "Empty image or file name not <imei>_<yyyymmdd>_<hhmmss>"},
+        500: {"description": "Internal Server Error"},
+    },
+)
+async def count_faces_upload_raw(request: Request,
+                                 customer_id: str = Query(..., description="Customer id"),
+                                 target_session: str = Query(..., description="WSS socket session to send face counts"),
+                                 file_name: str = Query(..., description="<imei>_<yyyymmdd>_<hhmmss>.jpg")):
+    """
+    Same as /faces/upload with the image as the raw request body; fileType is the Content-Type header.
+    """
+    if int(request.headers.get("content-length") or 0) > FETCH_MAX_BYTES:
+        raise HTTPException(status_code=413, detail=f"Image too large (limit {FETCH_MAX_BYTES} bytes).")
+    data = await request.body()
+    fileType = request.headers.get("content-type", "image/jpeg")
+    return await run_in_threadpool(queue_uploaded_image, data, file_name, customer_id, fileType, target_session)
+
+
+@router.get(
+    "/faces/{image_id}/annotated",
+    summary="Annotated image, rendered on demand from the original and its stored boxes",
+    tags=["Face Counter"],
+    response_class=Response,
+    responses={
+        200: {"content": {"image/jpeg": {}}, "description": "Annotated JPEG"},
+        400: {"description": "Original image could not be downloaded"},
+        404: {"description": "Unknown image id"},
+    },
+)
+def annotated_image(image_id: str,
+                    size: int = Query(0, ge=0, le=RENDER_MAX_SIZE, description="Longest side in pixels, 0 = original"),
+                    quality: int = Query(RENDER_DEFAULT_QUALITY, ge=1, le=100, description="JPEG quality")):
+    """
+    The annotated_image_url of images processed with ANNOTATION_MODE=lazy. Renders are cached on
+    local disk per (image, size, quality) with least-recently-used eviction.
+    """
+    data = render_annotated(image_id, size, quality)
+    return Response(content=data, media_type="image/jpeg", headers={"Cache-Control": "public, max-age=86400"})
@@ -0,0 +1,73 @@
+import logging
+from datetime import datetime, timedelta
+
+from fastapi import APIRouter, HTTPException, Query
+from sqlalchemy import select
+
+from config.base_config import OCCUPANCY_MAX_POINTS
+from config.persistence.postgres_db import SyncSessionLocal
+from ..models.occupancy import OccupancyPoint, OccupancyResponse
+from ..helpers.occupancy_rollups import GRANULARITIES
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter()
+
+
+def pick_granularity(start: datetime, end: datetime) -> str:
+    """Finest rollup that keeps a chart at a few hundred points per device."""
+    span = end - start
+    if span <= timedelta(hours=6):
+        return "minute"
+    if span <= timedelta(days=14):
+        return "hour"
+    return "day"
+
+
+@router.get(
+    "/occupancy/{customer_id}",
+    summary="Occupancy over a time range, from the minute/hour/day rollups",
+    tags=["Occupancy"],
+    response_model=OccupancyResponse,
+    responses={
+        422: {"description": "Invalid range, granularity, or too many points for the granularity"},
+    },
+)
+def occupancy(customer_id: str,
+              start: datetime = Query(..., description="Range start (UTC, inclusive)"),
+              end: datetime = Query(..., description="Range end (UTC, exclusive)"),
+              device_imei: str = Query(None, description="Only this device; all devices of the customer by default"),
+              granularity: str = Query("auto", description="minute, hour, day or auto (from the range length)")):
+    """
+    Min/max/avg/last face counts per device and bucket. Answered from the rollup tables by
+    primary-key range scans, so the cost depends on the number of buckets, not on raw images.
+    """
+    if end <= start:
+        raise HTTPException(status_code=422, detail="end must be after start.")
+    if granularity == "auto":
+        granularity = pick_granularity(start, end)
+    if granularity not in GRANULARITIES:
+        raise HTTPException(status_code=422, detail="granularity must be minute, hour, day or auto.")
+
+    model, truncate = GRANULARITIES[granularity]
+    query = (
+        select(model)
+        .where(model.customer_id == customer_id, model.bucket >= truncate(start), model.bucket < end)
+        .order_by(model.device_imei, model.bucket)
+        .limit(OCCUPANCY_MAX_POINTS + 1)
+    )
+    if device_imei is not None:
+        query = query.where(model.device_imei == device_imei)
+
+    with SyncSessionLocal() as session:
+        rows = session.execute(query).scalars().all()
+    if len(rows) > OCCUPANCY_MAX_POINTS:
+        raise HTTPException(status_code=422,
+                            detail=f"More than {OCCUPANCY_MAX_POINTS} points, use a coarser granularity or shorter range.")
+
+    points = [
+        OccupancyPoint(device_imei=row.device_imei, bucket=row.bucket, samples=row.samples, min=row.count_min,
+                       max=row.count_max, avg=row.count_sum / row.samples, last=row.last_count)
+        for row in rows
+    ]
+    return OccupancyResponse(customer_id=customer_id, granularity=granularity, start=start, end=end, points=points)
@@ -1 +1 @@
-from app.tasks import face_tasks
\ No newline at end of file
+from app.tasks import face_tasks, maintenance_tasks
\ No newline at end of file
@@ -1,13 +1,26 @@
 from app.celery_app import celery_app
-import cv2
 import traceback
-from ..helpers.load_image_from_url import load_image_from_url_safe
-from ..helpers.filter_faces import is_likely_face
-from ..helpers.image_enhancer import enhance_face_crop
-from ..helpers.persistence import save_image_and_metadata
-from app.helpers.persistence import save_image_and_metadata
-from config.base_config import model, IMG_SIZE, CONF_THRESH, IOU_THRESH, DEVICE
-from fastapi import HTTPException
+from ..helpers.load_image_from_url import fetch_image_bytes, decode_image
+from ..helpers.spool import is_spool_handle, read_spooled
+from ..helpers.face_pipeline import enhance_frame, detect_faces, detect_faces_many, analyze_detections
+from ..helpers.persistence import (
+    save_image_and_metadata, save_metadata_to_db, save_detections, annotates_lazily, on_upload_failure
+)
+from ..helpers.result_cache import result_cache, url_cache_key, digest_cache_key
+from ..helpers.image_name import parse_image_name
+from ..helpers.format_time import time_passed_str
+from datetime import datetime
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from ..helpers.adaptive_resolution import resolution_controller
+from ..helpers.frame_change import frame_change_detector, frame_signature
+from ..helpers.metrics import observe_stage, observe_queue_lag, record_lookup, TASKS
+from ..helpers.fair_scheduling import tenant_limiter
+from ..helpers.staleness import staleness_tracker
+from config.base_config import IMG_SIZE, REDUCED_DECODE
+from config.base_config import INFERENCE_MODE, TILE_DECODE_SIZE, ADAPTIVE_RESOLUTION, CHANGE_DETECTION
+from config.base_config import RESULT_CACHE_ENABLED, RESULT_CACHE_BY_DIGEST, SAVE_MODE, BATCH_FETCH_WORKERS
+from config.base_config import TENANT_RETRY_DELAY, STALE_FRAME_POLICY
 import logging
 from ..websockets.relay_count import send_json_message
 
@@ -15,104 +28,276 @@ from ..websockets.relay_count import send_json_message
 
 logger = logging.getLogger(__name__)
 
-@celery_app.task(name="save_image_and_metadata_task")
-def save_image_and_metadata_task(original_url, customer_id, fileType, target_session):
-    """Runs model inference and metadata persistence asynchronously inside Celery."""
+@celery_app.task(name="save_image_and_metadata_task", bind=True)
+def save_image_and_metadata_task(self, original_url, customer_id, fileType, target_session, enqueued_at=None, lane=None):
+    """Runs model inference and metadata persistence asynchronously inside Celery.
 
-      # Securely load image
-    frame = load_image_from_url_safe(original_url)
+    lane ("live" or "backfill") selects the queue, see app.helpers.fair_scheduling; stale frames
+    are handled per STALE_FRAME_POLICY (always stored without relay on the backfill lane).
+    """
+    if STALE_FRAME_POLICY != "off":
+        reason = stale_reason(original_url)
+        if reason is not None:
+            if STALE_FRAME_POLICY == "skip" and lane != "backfill":
+                logger.info(f"[Celery] Skipping stale frame {original_url}: {reason}")
+                TASKS.labels(outcome="stale").inc()
+                return
+            if STALE_FRAME_POLICY == "defer" and lane != "backfill":
+                logger.info(f"[Celery] Deferring stale frame {original_url} to backfill: {reason}")
+                save_image_and_metadata_task.apply_async(
+                    (original_url, customer_id, fileType, target_session),
+                    {"enqueued_at": enqueued_at, "lane": "backfill"},
+                )
+                TASKS.labels(outcome="deferred").inc()
+                return
+            logger.info(f"[Celery] Storing stale frame {original_url} without relay: {reason}")
+            target_session = None
 
-    frame = enhance_face_crop(frame)
+    if not tenant_limiter.acquire(customer_id, self.request.id):
+        TASKS.labels(outcome="throttled").inc()
+        raise self.retry(countdown=TENANT_RETRY_DELAY, max_retries=None)
 
-    # Run model inference
+    observe_queue_lag(enqueued_at)
     try:
-        results = model.predict(
-            source=frame,
-            imgsz=IMG_SIZE,
-            conf=CONF_THRESH,
-            iou=IOU_THRESH,
-            device=DEVICE,
-            verbose=False,
-        )
-    except Exception as e:
-        logger.exception(f"Model inference failed. {type(e).__name__} - {e}")
-        raise HTTPException(status_code=500, detail=f"Model inference failed: {type(e).__name__} - {e}")
+        with observe_stage("total"):
+            outcome = process_image(original_url, customer_id, fileType, target_session)
+    except Exception:
+        TASKS.labels(outcome="failed").inc()
+        raise
+    finally:
+        tenant_limiter.release(customer_id, self.request.id)
+    TASKS.labels(outcome=outcome).inc()
+
 
-    # Process detections
-    output = {"faces": [], "count": 0}
-    annotated = frame.copy()
+PreparedImage = namedtuple(
+    "PreparedImage",
+    ["original_url", "customer_id", "fileType", "target_session", "url_key", "digest_key",
+     "frame", "scale", "imgsz", "device_imei", "name", "signature"],
+)
 
+
+def stale_reason(original_url):
+    """Record the frame in its device's newest-seen marker and say why it is stale, if it is."""
     try:
-        for result in results:
-            boxes = result.boxes.xyxy.cpu().numpy()
-            confs = result.boxes.conf.cpu().numpy()
-
-            for i, box in enumerate(boxes):
-                x1, y1, x2, y2 = map(int, box)
-                conf = float(confs[i])
-
-                h_img, w_img = frame.shape[:2]
-                x1c, y1c = max(0, x1), max(0, y1)
-                x2c, y2c = min(w_img, x2), min(h_img, y2)
-                if x2c <= x1c or y2c <= y1c:
-                    continue
-
-                face_crop = frame[y1c:y2c, x1c:x2c]
-                if face_crop.size == 0:
-                    continue
-
-                enhanced_crop = enhance_face_crop(face_crop)
-                if not is_likely_face(enhanced_crop, conf):
-                    continue
-                
-                cv2.rectangle(annotated, (x1c, y1c), (x2c, y2c), (0, 255, 0), 2)
-                cv2.putText(
-                    annotated,
-                    f"{conf:.2f}",
-                    (x1c, y1c - 5),
-                    cv2.FONT_HERSHEY_SIMPLEX,
-                    0.5,
-                    (0, 255, 0),
-                    1,
-                )
+        name = parse_image_name(original_url)
+    except (IndexError, ValueError):
+        return None
+    staleness_tracker.mark(name.device_imei, name.dt)
+    return staleness_tracker.stale_reason(name.device_imei, name.dt)
 
-                output["faces"].append(
-                    {"bbox": [x1c, y1c, x2c - x1c, y2c - y1c], "confidence": round(conf, 2)}
-                )
 
-        output["count"] = len(output["faces"])
+def process_image(original_url, customer_id, fileType, target_session):
+    """The task pipeline; returns the outcome label recorded in faces_tasks_total."""
+    outcome, prepared = prepare_image(original_url, customer_id, fileType, target_session)
+    if prepared is None:
+        return outcome
 
-    except Exception as e:
-        logger.error(f"Error during result processing {type(e).__name__} - {e}")
-        raise HTTPException(status_code=500, detail=f"Error processing detection results: {type(e).__name__} - {e}")
-    
-    # save annotated image and its metadata to s3 and postgres
+    boxes, confs = detect_faces(prepared.frame, prepared.imgsz)
+    return finish_image(prepared, boxes, confs)
+
+
+def prepare_image(original_url, customer_id, fileType, target_session):
+    """Everything before inference: caches, download, decode, change detection, enhancement.
+
+    Returns (outcome, None) when the image was answered without inference, else
+    ("ready", PreparedImage) with the enhanced frame to run the model on.
+    """
+
+    # Redelivered or retried image: skip download and inference entirely
+    url_key = url_cache_key(original_url)
+    if RESULT_CACHE_ENABLED:
+        cached = result_cache.get(url_key)
+        record_lookup("url_cache", cached is not None)
+        if cached is not None:
+            logger.info(f"[Celery] Result cache hit for {original_url}")
+            relay_face_count(target_session, cached["count"], cached["annotated_url"], original_url,
+                             time_passed_str(parse_image_name(original_url).dt, datetime.utcnow()))
+            return "cached", None
 
+      # Securely load image (decoded at reduced resolution when far larger than IMG_SIZE);
+    # uploaded images are mapped from the local spool instead of downloaded
+    with observe_stage("fetch"):
+        image_bytes = read_spooled(original_url) if is_spool_handle(original_url) else fetch_image_bytes(original_url)
+
+    # Same bytes already processed under another URL: record this URL, reuse the detections
+    digest_key = digest_cache_key(image_bytes) if RESULT_CACHE_ENABLED and RESULT_CACHE_BY_DIGEST else None
+    if digest_key:
+        cached = result_cache.get(digest_key)
+        record_lookup("digest_cache", cached is not None)
+        if cached is not None:
+            logger.info(f"[Celery] Image digest cache hit for {original_url}")
+            reuse_result(cached, original_url, customer_id, target_session, url_key)
+            return "cached", None
+
+    # Per-device imgsz learnt from past detections; tiled mode needs the extra resolution for small faces
+    adaptive = ADAPTIVE_RESOLUTION and INFERENCE_MODE != "tiled"
+    device_imei = parse_image_name(original_url).device_imei if adaptive else None
+    imgsz = resolution_controller.choose(device_imei) if adaptive else IMG_SIZE
+    decode_size = TILE_DECODE_SIZE if INFERENCE_MODE == "tiled" else imgsz
+    with observe_stage("decode"):
+        frame, scale = decode_image(image_bytes, decode_size if REDUCED_DECODE else None)
+
+    # Near-identical to the device's last processed snapshot: reuse its detections
+    name, signature = None, None
+    if CHANGE_DETECTION:
+        name = parse_image_name(original_url)
+        with observe_stage("change_detection"):
+            signature = frame_signature(frame)
+            cached = frame_change_detector.lookup(name.device_imei, signature, name.dt)
+        record_lookup("frame_change", cached is not None)
+        if cached is not None:
+            logger.info(f"[Celery] Unchanged frame for {name.device_imei}, reusing detections for {original_url}")
+            reuse_result(cached, original_url, customer_id, target_session, url_key)
+            return "unchanged", None
+
+    frame = enhance_frame(frame)
+    return "ready", PreparedImage(original_url, customer_id, fileType, target_session, url_key, digest_key,
+                                  frame, scale, imgsz, device_imei, name, signature)
+
+
+def finish_image(prepared, boxes, confs):
+    """Everything after inference: filtering, annotation, persistence, caches and relay."""
+    original_url = prepared.original_url
+    lazy = annotates_lazily(original_url)
+    output, annotated, kept_boxes = analyze_detections(prepared.frame, boxes, confs, prepared.scale, annotate=not lazy)
+
+    if prepared.device_imei is not None:
+        resolution_controller.observe(prepared.device_imei, prepared.imgsz, prepared.frame.shape, kept_boxes, output["count"])
+
+    # save annotated image and its metadata to s3 and postgres (lazy: boxes only, rendered on view)
+
+    annotated_url, time_passed = None, None
     try:
-        annotated_url, time_passed = save_image_and_metadata(annotated, output["faces"], output["count"], original_url, customer_id, fileType)
+        with observe_stage("save"):
+            if lazy:
+                annotated_url, time_passed = save_detections(output["faces"], output["count"], original_url,
+                                                             prepared.customer_id)
+            else:
+                annotated_url, time_passed = save_image_and_metadata(annotated, output["faces"], output["count"],
+                                                                     original_url, prepared.customer_id, prepared.fileType)
         logger.info(f"[Celery] Saved metadata for {original_url}")
     except Exception as e:
         logger.error(f"[Celery] Failed saving metadata for {original_url}: {type(e).__name__} - {e}")
         traceback.print_exc()
-    
+
+    entry = {"count": output["count"], "faces": output["faces"], "annotated_url": annotated_url}
+    if RESULT_CACHE_ENABLED and annotated_url is not None:
+        result_cache.set(prepared.url_key, entry)
+        if prepared.digest_key:
+            result_cache.set(prepared.digest_key, entry)
+
+    if prepared.signature is not None and annotated_url is not None:
+        frame_change_detector.remember(prepared.name.device_imei, prepared.signature, prepared.name.dt, entry)
+
+    # Cached results must not keep pointing at an annotated image whose upload was given up
+    on_upload_failure(annotated_url, lambda: forget_result(prepared, annotated_url))
+
     # Push face count and annotated image URL to websocket server for mobile app live occupancy
+    relay_face_count(prepared.target_session, output["count"], annotated_url, original_url, time_passed)
+    return "processed"
 
+
+@celery_app.task(name="process_image_batch_task", bind=True)
+def process_image_batch_task(self, items, enqueued_at=None):
+    """Process several images in one task: downloads overlap, inference runs as batched predicts.
+
+    items are dicts with image_url, customer_id, fileType and target_session, all of one
+    customer (the task takes one of its concurrency slots). A failing image is logged and
+    counted without affecting the others.
+    """
+    customer_id = items[0]["customer_id"] if items else None
+    if not tenant_limiter.acquire(customer_id, self.request.id):
+        TASKS.labels(outcome="throttled").inc(len(items))
+        raise self.retry(countdown=TENANT_RETRY_DELAY, max_retries=None)
+    try:
+        process_items(items, enqueued_at)
+    finally:
+        tenant_limiter.release(customer_id, self.request.id)
+
+
+def process_items(items, enqueued_at=None):
+    """The body of process_image_batch_task."""
+    observe_queue_lag(enqueued_at)
+
+    def prepare(item):
+        try:
+            return prepare_image(item["image_url"], item["customer_id"], item["fileType"], item["target_session"])
+        except Exception as e:
+            logger.error(f"[Celery] Batch item {item.get('image_url')} failed: {type(e).__name__} - {e}")
+            return "failed", None
+
+    with ThreadPoolExecutor(max_workers=max(1, min(BATCH_FETCH_WORKERS, len(items)))) as pool:
+        results = list(pool.map(prepare, items))
+
+    ready = [prepared for outcome, prepared in results if prepared is not None]
+    for outcome, prepared in results:
+        if prepared is None:
+            TASKS.labels(outcome=outcome).inc()
+
+    # One predict per imgsz for all frames of the batch
+    groups = {}
+    for prepared in ready:
+        groups.setdefault(prepared.imgsz, []).append(prepared)
+
+    for imgsz, group in groups.items():
+        try:
+            detections = detect_faces_many([prepared.frame for prepared in group], imgsz)
+        except Exception as e:
+            logger.error(f"[Celery] Batched inference failed for {len(group)} image(s): {type(e).__name__} - {e}")
+            TASKS.labels(outcome="failed").inc(len(group))
+            continue
+
+        for prepared, (boxes, confs) in zip(group, detections):
+            try:
+                TASKS.labels(outcome=finish_image(prepared, boxes, confs)).inc()
+            except Exception as e:
+                logger.error(f"[Celery] Batch item {prepared.original_url} failed: {type(e).__name__} - {e}")
+                TASKS.labels(outcome="failed").inc()
+
+
+def forget_result(prepared, annotated_url):
+    """Evict the cached result of an image whose annotated upload failed."""
+    if RESULT_CACHE_ENABLED:
+        result_cache.delete(*filter(None, (prepared.url_key, prepared.digest_key)))
+    if prepared.signature is not None:
+        frame_change_detector.forget(prepared.name.device_imei, annotated_url)
+
+
+def reuse_result(cached, original_url, customer_id, target_session, url_key):
+    """Record and relay a previously computed result for a new image URL without running inference."""
+    name = parse_image_name(original_url)
+    if SAVE_MODE == "cloud":
+        save_metadata_to_db(original_url, cached["annotated_url"], cached["faces"], cached["count"],
+                            name.device_imei, name.dt, customer_id)
+    if RESULT_CACHE_ENABLED:
+        result_cache.set(url_key, cached)
+        # The reused image may still be uploading
+        on_upload_failure(cached["annotated_url"], lambda: result_cache.delete(url_key))
+    relay_face_count(target_session, cached["count"], cached["annotated_url"], original_url,
+                     time_passed_str(name.dt, datetime.utcnow()))
+
+
+def relay_face_count(target_session, count, annotated_url, original_url, time_passed):
+    """Relay a face count to the WSS server for the client's target session (None: stale frame, no relay)."""
+    if target_session is None:
+        return
     try:
         payload = {
             "action": "relay_message",
             "target_session": target_session,
             "misc": {
                 "action": "face_count",
-                "count": output["count"],
+                "count": count,
                 "annotated_url": annotated_url if annotated_url is not None else original_url,
                 "original_url": original_url,
                 "time_passed": time_passed
             }
         
         }
-        send_json_message(payload)
+        with observe_stage("relay"):
+            send_json_message(payload)
 
         logger.info(f"[Celery] Face count relayed for {target_session}")
     except Exception as e:
         logger.error(f"[Celery] Failed to relay face count for {target_session}: {type(e).__name__} - {e}")
-        traceback.print_exc()
\ No newline at end of file
+        traceback.print_exc()
@@ -0,0 +1,14 @@
+from app.celery_app import celery_app
+import logging
+from config.persistence.postgres_db import engine
+from config.persistence.partitions import maintain_partitions
+
+logger = logging.getLogger(__name__)
+
+
+@celery_app.task(name="maintain_partitions_task")
+def maintain_partitions_task():
+    """Pre-creates upcoming face_detection_counts partitions and drops expired ones."""
+    result = maintain_partitions(engine)
+    logger.info(f"[Celery] Partition maintenance: {result}")
+    return result
@@ -1,10 +1,9 @@
-import json
-from .websocket_connect import WebSocketManager
+from .relay_queue import get_relay_publisher
 import logging
 
 logger = logging.getLogger(__name__)
 
 def send_json_message(payload):
 
-    # Send from anywhere
-    WebSocketManager.send(payload)            
\ No newline at end of file
+    # Send from anywhere: queued for the relay sender thread, never blocks the caller
+    get_relay_publisher().publish(payload)
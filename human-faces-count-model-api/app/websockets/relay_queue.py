@@ -0,0 +1,170 @@
+import json, os, time, ssl, logging, threading, websocket
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+WSS_URL = os.getenv("WSS_SERVER")
+RELAY_MAX_PENDING = int(os.getenv("RELAY_MAX_PENDING", "10000"))        # sessions waiting to be relayed
+RELAY_BATCH_SIZE = int(os.getenv("RELAY_BATCH_SIZE", "1"))              # > 1 sends "relay_batch" frames
+RELAY_SEND_TIMEOUT = float(os.getenv("RELAY_SEND_TIMEOUT", "5"))
+RELAY_BACKOFF_MAX = float(os.getenv("RELAY_BACKOFF_MAX", "30"))
+RELAY_STATS_INTERVAL = float(os.getenv("RELAY_STATS_INTERVAL", "60"))
+
+
+def coalesce_key(payload):
+    """Messages with the same key replace each other while queued; None never coalesces."""
+    misc = payload.get("misc") or {}
+    if payload.get("target_session") and misc.get("action"):
+        return payload["target_session"], misc["action"]
+    return None
+
+
+class RelayPublisher:
+    """Outbound WSS relay drained by a dedicated sender thread.
+
+    publish() never blocks: it stores the payload under its coalescing key
+    (target_session + misc action), so a session that updates faster than the relay
+    can deliver only ever has its newest face count queued. When more than max_pending
+    keys are waiting, the oldest is dropped. The sender thread owns the connection and
+    reconnects with exponential backoff, so a relay outage only delays relay messages,
+    never the tasks that publish them.
+    """
+
+    def __init__(self, url=WSS_URL, max_pending=RELAY_MAX_PENDING, batch_size=RELAY_BATCH_SIZE,
+                 send_timeout=RELAY_SEND_TIMEOUT, backoff_max=RELAY_BACKOFF_MAX, connect_fn=None):
+        self.url = url
+        self.max_pending = max(1, max_pending)
+        self.batch_size = max(1, batch_size)
+        self.send_timeout = send_timeout
+        self.backoff_max = backoff_max
+        self._connect_fn = connect_fn or self._connect
+        self._pending = OrderedDict()
+        self._seq = 0
+        self._cond = threading.Condition()
+        self._closed = False
+        self._ws = None
+        self.stats = {"published": 0, "sent": 0, "coalesced": 0, "dropped": 0, "connections": 0}
+        self._thread = threading.Thread(target=self._run, name="wss-relay", daemon=True)
+        self._thread.start()
+
+    def publish(self, payload):
+        """Queue a payload for the sender thread; returns immediately."""
+        key = coalesce_key(payload)
+        with self._cond:
+            if key is None:
+                self._seq += 1
+                key = ("_unique", self._seq)
+            if self._pending.pop(key, None) is not None:
+                self.stats["coalesced"] += 1
+            self._pending[key] = payload
+            if len(self._pending) > self.max_pending:
+                self._pending.popitem(last=False)
+                self.stats["dropped"] += 1
+            self.stats["published"] += 1
+            self._cond.notify()
+
+    def close(self, timeout=5):
+        """Give the sender thread up to timeout seconds to deliver what is queued, then stop it."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+        self._thread.join(timeout)
+        logger.info(f"WSS relay stopped: {self.stats}, {len(self._pending)} undelivered")
+
+    def _connect(self):
+        return websocket.create_connection(self.url, sslopt={"cert_reqs": ssl.CERT_NONE}, timeout=self.send_timeout)
+
+    def _take(self):
+        """Wait for queued payloads and pop up to batch_size of them, oldest first."""
+        with self._cond:
+            while not self._pending and not self._closed:
+                self._cond.wait()
+            batch = []
+            while self._pending and len(batch) < self.batch_size:
+                batch.append(self._pending.popitem(last=False))
+            return batch
+
+    def _requeue(self, batch):
+        """Put back an undelivered batch, unless a newer payload for the key arrived meanwhile."""
+        with self._cond:
+            for key, payload in reversed(batch):
+                if key not in self._pending:
+                    self._pending[key] = payload
+                    self._pending.move_to_end(key, last=False)
+
+    def _ensure_connected(self, backoff):
+        while self._ws is None:
+            try:
+                self._ws = self._connect_fn()
+                self.stats["connections"] += 1
+                logger.info("✅ WSS relay connected.")
+            except Exception as e:
+                logger.error(f"🛑 WSS relay connection failed, retrying in {backoff:.1f} sec: {e}")
+                with self._cond:
+                    if self._closed:
+                        return backoff
+                    self._cond.wait(backoff)
+                backoff = min(backoff * 2, self.backoff_max)
+        return 1.0
+
+    def _send(self, batch):
+        payloads = [payload for _, payload in batch]
+        if len(payloads) == 1:
+            self._ws.send(json.dumps(payloads[0]))
+        else:
+            self._ws.send(json.dumps({"action": "relay_batch", "messages": payloads}))
+
+    def _run(self):
+        backoff = 1.0
+        last_stats = time.monotonic()
+        while True:
+            batch = self._take()
+            if not batch:
+                break   # closed and nothing left to send
+
+            backoff = self._ensure_connected(backoff)
+            if self._ws is None:
+                self._requeue(batch)
+                break   # closed while disconnected
+
+            try:
+                self._send(batch)
+                self.stats["sent"] += len(batch)
+            except Exception as e:
+                logger.error(f"WSS relay send error, reconnecting: {type(e).__name__} - {e}")
+                self._requeue(batch)
+                try:
+                    self._ws.close()
+                except Exception:
+                    pass
+                self._ws = None
+
+            if time.monotonic() - last_stats >= RELAY_STATS_INTERVAL:
+                last_stats = time.monotonic()
+                logger.info(f"WSS relay: {self.stats}, {len(self._pending)} pending")
+
+
+_publisher = None
+_publisher_pid = None
+_publisher_lock = threading.Lock()
+
+
+def get_relay_publisher() -> RelayPublisher:
+    """The relay publisher of this process (its thread and socket do not survive a fork)."""
+    global _publisher, _publisher_pid
+    if _publisher is None or _publisher_pid != os.getpid():
+        with _publisher_lock:
+            if _publisher is None or _publisher_pid != os.getpid():
+                _publisher, _publisher_pid = RelayPublisher(), os.getpid()
+    return _publisher
+
+
+def relay_pending() -> int:
+    """Relay messages queued in this process."""
+    return len(_publisher._pending) if _publisher is not None and _publisher_pid == os.getpid() else 0
+
+
+def shutdown_relay_publisher():
+    """Best-effort delivery of queued relay messages on worker shutdown."""
+    if _publisher is not None and _publisher_pid == os.getpid():
+        _publisher.close()
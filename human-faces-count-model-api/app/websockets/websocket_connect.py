@@ -1,4 +1,4 @@
-import json, os, time, ssl, logging, websocket
+import os, time, ssl, logging, websocket
 
 logger = logging.getLogger(__name__)
 
@@ -31,21 +31,16 @@ class WebSocketManager:
 
     @classmethod
     def send(cls, data):
-        """Send JSON data; if closed, reconnect and retry once."""
-        if not cls.is_open():
-            logger.error("WSS Server not open, reconnecting...")
-            cls.connect()
+        """Queue JSON data on the non-blocking relay publisher (see relay_queue)."""
+        from .relay_queue import get_relay_publisher
 
-        try:
-            cls.ws.send(json.dumps(data))
-            logger.info("✅ WSS relay message sent: %s", data)
-        except Exception as e:
-            logger.error("WSS relay message Send error: %s", e)
-            cls.ws = None  # safely mark it dead
+        get_relay_publisher().publish(data)
 
     @classmethod
     def listen(cls):
-        """Listen for messages and reconnect on disconnect."""
+        """Connect, listen for messages and reconnect on disconnect (run on a background thread)."""
+        if not cls.is_open():
+            cls.connect()
         while True:
             try:
                 msg = cls.ws.recv()
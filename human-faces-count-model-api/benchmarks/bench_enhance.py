@@ -0,0 +1,87 @@
+"""Benchmark enhance_face_crop against enhance_frame_fast on full frames.
+
+Frames are sample images from train_model/datasets/faces resized to 1080p and 4K,
+in color and grayscale (IR night) variants.
+
+    python -m benchmarks.bench_enhance --repeat 20
+"""
+import argparse
+import json
+import time
+
+import cv2
+import numpy as np
+
+from app.helpers.image_enhancer import enhance_face_crop, enhance_frame_fast
+
+RESOLUTIONS = {"1080p": (1920, 1080), "4k": (3840, 2160)}
+SAMPLES = {
+    "color": "train_model/datasets/faces/images/train/sample13.jpg",
+    "gray": "train_model/datasets/faces/images/train/sample10.jpg",
+}
+
+
+def load_frame(path, size):
+    image = cv2.imread(path, cv2.IMREAD_COLOR)
+    if image is None:
+        # Fall back to a synthetic scene if the dataset is not available
+        rng = np.random.default_rng(0)
+        image = cv2.GaussianBlur(rng.integers(0, 256, (size[1] // 4, size[0] // 4, 3), dtype=np.uint8), (0, 0), 3)
+    return cv2.cvtColor(cv2.resize(image, size, interpolation=cv2.INTER_LINEAR), cv2.COLOR_BGR2RGB)
+
+
+def time_fn(fn, frame, repeat):
+    fn(frame)  # warm-up
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(frame)
+        samples.append((time.perf_counter() - start) * 1000)
+    return {
+        "mean_ms": float(np.mean(samples)),
+        "p50_ms": float(np.percentile(samples, 50)),
+        "p95_ms": float(np.percentile(samples, 95)),
+    }
+
+
+def run(repeat):
+    variants = {
+        "full": enhance_face_crop,
+        "fast": enhance_frame_fast,
+        "fast+sharpen+clahe": lambda f: enhance_frame_fast(f, sharpen=True, clahe=True),
+    }
+    report = []
+    for res_name, size in RESOLUTIONS.items():
+        for sample_name, path in SAMPLES.items():
+            frame = load_frame(path, size)
+            reference = enhance_face_crop(frame)
+            row = {"resolution": res_name, "sample": sample_name}
+            for name, fn in variants.items():
+                row[name] = time_fn(fn, frame, repeat)
+                row[name]["mean_abs_diff"] = float(np.mean(cv2.absdiff(fn(frame), reference)))
+            row["speedup"] = row["full"]["mean_ms"] / row["fast"]["mean_ms"]
+            report.append(row)
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="enhance_face_crop vs enhance_frame_fast")
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument("--json", help="Write the report to this file")
+    args = parser.parse_args(argv)
+
+    report = run(args.repeat)
+    for row in report:
+        print(
+            f"{row['resolution']:>6} {row['sample']:<6} "
+            + " | ".join(f"{name} {row[name]['mean_ms']:7.1f}ms (diff {row[name]['mean_abs_diff']:.2f})"
+                         for name in ("full", "fast", "fast+sharpen+clahe"))
+            + f" | speedup x{row['speedup']:.1f}"
+        )
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,337 @@
+"""Stage-by-stage and end-to-end benchmark of save_image_and_metadata_task.
+
+Every stage runs in its own spawned process so its peak RSS is measured in
+isolation. Frames are synthetic scenes at several face densities plus sample
+images from train_model/datasets/faces (with their labelled boxes), at 720p,
+1080p and 4K. S3 and the relay are local stand-ins and the database is SQLite,
+so the suite runs offline; model.predict is skipped when the model cannot load.
+Stages call the production helpers (decode_image, enhance_frame, analyze_detections,
+draw_detections), so REDUCED_DECODE, ENHANCE_MODE and FACE_FILTER_MODE apply as in
+the workers.
+
+    python -m benchmarks.pipeline_bench --repeat 20 --json bench.json
+    python -m benchmarks.pipeline_bench --stages decode,enhance --sizes 1080p
+"""
+import argparse
+import glob
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+import cv2
+import numpy as np
+
+RESOLUTIONS = {"720p": (1280, 720), "1080p": (1920, 1080), "4k": (3840, 2160)}
+DENSITIES = (0, 5, 25, 100)
+SAMPLE_DIR = "train_model/datasets/faces"
+SAMPLE_LIMIT = 2
+STAGES = ("decode", "enhance", "predict", "postprocess", "annotate", "encode", "persist", "relay", "end_to_end")
+
+ORIGINAL_URL = "https://bench.local/images/350612079150221_20251023_143254.jpg"
+
+# Offline configuration, applied before any app module reads config.base_config
+BENCH_ENV = {
+    "SAVE_MODE": "cloud",
+    "S3_ASYNC_UPLOAD": "false",     # time the upload inline, not its enqueue
+    "DB_BULK_WRITE": "false",       # same for the DB write
+    "S3_BUCKET_NAME": "bench",
+    "AWS_REGION": "us-east-1",
+    "RESULT_CACHE_ENABLED": "false",
+}
+
+
+class MemoryS3:
+    """put_object stand-in keeping uploaded bodies in memory."""
+
+    def __init__(self):
+        self.objects = {}
+
+    def put_object(self, Body, Bucket, Key, ContentType=None):
+        self.objects[(Bucket, Key)] = Body.read() if hasattr(Body, "read") else Body
+
+
+class NullSocket:
+    """WebSocket stand-in for the relay sender thread."""
+
+    def send(self, message):
+        pass
+
+    def close(self):
+        pass
+
+
+def synthetic_case(size, density, seed=0):
+    """Textured background with `density` drawn faces; returns (rgb frame, xyxy boxes, confs)."""
+    w, h = size
+    rng = np.random.default_rng(seed + density)
+    noise = rng.integers(40, 200, (h // 8, w // 8, 3), dtype=np.uint8)
+    frame = cv2.resize(cv2.GaussianBlur(noise, (0, 0), 2), (w, h), interpolation=cv2.INTER_LINEAR)
+
+    boxes = []
+    for _ in range(density):
+        side = int(rng.integers(h // 40, h // 8))
+        x, y = int(rng.integers(0, w - side)), int(rng.integers(0, h - side))
+        center, axes = (x + side // 2, y + side // 2), (side // 2 - 1, side // 2)
+        cv2.ellipse(frame, center, axes, 0, 0, 360, (224, 172, 140), -1)
+        for dx in (-side // 5, side // 5):
+            cv2.circle(frame, (center[0] + dx, center[1] - side // 8), max(1, side // 12), (40, 30, 30), -1)
+        cv2.line(frame, (center[0] - side // 6, center[1] + side // 5), (center[0] + side // 6, center[1] + side // 5),
+                 (120, 60, 60), max(1, side // 20))
+        boxes.append((x, y, x + side, y + side))
+
+    confs = rng.uniform(0.2, 0.95, len(boxes))
+    return frame, np.array(boxes, dtype=np.float32).reshape(-1, 4), confs
+
+
+def sample_cases(size):
+    """Dataset images resized to size, with their YOLO labels as boxes."""
+    w, h = size
+    cases = []
+    for path in sorted(glob.glob(os.path.join(SAMPLE_DIR, "images", "train", "*.jpg")))[:SAMPLE_LIMIT]:
+        image = cv2.imread(path, cv2.IMREAD_COLOR)
+        if image is None:
+            continue
+        frame = cv2.cvtColor(cv2.resize(image, size, interpolation=cv2.INTER_LINEAR), cv2.COLOR_BGR2RGB)
+        label = path.replace(os.sep + "images" + os.sep, os.sep + "labels" + os.sep).rsplit(".", 1)[0] + ".txt"
+        rows = np.loadtxt(label, ndmin=2) if os.path.exists(label) else np.zeros((0, 5))
+        cx, cy, bw, bh = rows[:, 1] * w, rows[:, 2] * h, rows[:, 3] * w, rows[:, 4] * h
+        boxes = np.stack([cx - bw / 2, cy - bh / 2, cx + bw / 2, cy + bh / 2], axis=1).astype(np.float32)
+        cases.append((os.path.basename(path), frame, boxes, np.full(len(boxes), 0.6)))
+    return cases
+
+
+def build_cases(sizes, densities):
+    cases = []
+    for size_name in sizes:
+        size = RESOLUTIONS[size_name]
+        for density in densities:
+            frame, boxes, confs = synthetic_case(size, density)
+            cases.append({"resolution": size_name, "source": "synthetic", "faces": density,
+                          "frame": frame, "boxes": boxes, "confs": confs})
+        for name, frame, boxes, confs in sample_cases(size):
+            cases.append({"resolution": size_name, "source": name, "faces": len(boxes),
+                          "frame": frame, "boxes": boxes, "confs": confs})
+    for case in cases:
+        ok, encoded = cv2.imencode(".jpg", cv2.cvtColor(case["frame"], cv2.COLOR_RGB2BGR))
+        case["jpeg"] = encoded.tobytes()
+    return cases
+
+
+def decode_size():
+    """The task's decode target (see prepare_image): full resolution unless REDUCED_DECODE."""
+    from config.base_config import IMG_SIZE, REDUCED_DECODE, INFERENCE_MODE, TILE_DECODE_SIZE
+
+    if not REDUCED_DECODE:
+        return None
+    return TILE_DECODE_SIZE if INFERENCE_MODE == "tiled" else IMG_SIZE
+
+
+def postprocess(frame, boxes, confs, scale=1):
+    """The task's box filtering (analyze_detections without drawing); returns (output, kept xyxy boxes)."""
+    from app.helpers.face_pipeline import analyze_detections
+
+    output, _, kept_boxes = analyze_detections(frame, boxes, confs, scale, annotate=False)
+    return output, kept_boxes
+
+
+def annotate(frame, output, kept_boxes):
+    from app.helpers.face_pipeline import draw_detections
+
+    return draw_detections(frame.copy(), kept_boxes, [face["confidence"] for face in output["faces"]])
+
+
+def stage_fn(stage, case, env):
+    """A zero-argument callable running one stage on one case, or None if the stage is unavailable."""
+    from app.helpers.load_image_from_url import decode_image
+    from app.helpers.face_pipeline import enhance_frame, analyze_detections
+    from app.helpers.upload_pipeline import encode_jpeg
+    from app.helpers.persistence import save_image_and_metadata
+    from app.tasks.face_tasks import relay_face_count
+    from config.base_config import IMG_SIZE
+
+    frame, boxes, confs = case["frame"], case["boxes"], case["confs"]
+    output, kept_boxes = postprocess(frame, boxes, confs)
+    annotated = annotate(frame, output, kept_boxes)
+
+    if stage == "decode":
+        return lambda: decode_image(case["jpeg"], decode_size())
+    if stage == "enhance":
+        return lambda: enhance_frame(frame)
+    if stage == "predict":
+        if env.get("predict") is None:
+            return None
+        return lambda: env["predict"]([frame], IMG_SIZE)
+    if stage == "postprocess":
+        return lambda: postprocess(frame, boxes, confs)
+    if stage == "annotate":
+        return lambda: annotate(frame, output, kept_boxes)
+    if stage == "encode":
+        return lambda: encode_jpeg(annotated)
+    if stage == "persist":
+        return lambda: save_image_and_metadata(annotated, output["faces"], output["count"], ORIGINAL_URL, "bench",
+                                               "image/jpeg")
+    if stage == "relay":
+        return lambda: relay_face_count("bench-session", output["count"], "https://bench.local/a.jpg", ORIGINAL_URL, "1s")
+    if stage == "end_to_end":
+        def run():
+            decoded, scale = decode_image(case["jpeg"], decode_size())
+            enhanced = enhance_frame(decoded)
+            if env.get("predict") is not None:
+                env["predict"]([enhanced], IMG_SIZE)
+            # Labelled boxes are in source pixels, detections come back in decoded pixels
+            result, image, _ = analyze_detections(enhanced, boxes / scale, confs, scale)
+            url, time_passed = save_image_and_metadata(image, result["faces"], result["count"], ORIGINAL_URL, "bench",
+                                                       "image/jpeg")
+            relay_face_count("bench-session", result["count"], url, ORIGINAL_URL, time_passed)
+        return run
+    raise ValueError(f"Unknown stage '{stage}'")
+
+
+def setup_environment(workdir, with_model):
+    """Point persistence and relay at local stand-ins; returns the shared stage context."""
+    os.environ.update(BENCH_ENV)
+    os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(workdir, 'bench.db')}")
+    os.environ.setdefault("OUTPUT_DIR", os.path.join(workdir, "output"))
+
+    from config.persistence.postgres_db import engine, Base
+    # Imported for its side effect: defining the models registers face_detection_counts and the
+    # occupancy tables on Base, which create_all below needs
+    import app.models.counts  # noqa: F401
+    import app.helpers.persistence as persistence
+    import app.websockets.relay_queue as relay_queue
+
+    Base.metadata.create_all(engine)
+    persistence.s3 = MemoryS3()
+    relay_queue._publisher = relay_queue.RelayPublisher(url="ws://bench.local", connect_fn=NullSocket)
+    relay_queue._publisher_pid = os.getpid()
+
+    env = {"predict": None}
+    if with_model:
+        try:
+            from config.inference.model_registry import set_process_role, load_and_warm_up
+            from app.helpers.batch_inference import predict_frames
+            set_process_role("worker")
+            load_and_warm_up()
+            env["predict"] = predict_frames
+        except Exception as e:
+            print(f"model.predict unavailable, skipping: {type(e).__name__} - {e}", file=sys.stderr)
+    return env
+
+
+def time_callable(fn, repeat):
+    fn()  # warm-up
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    mean = float(np.mean(samples))
+    return {
+        "mean_ms": mean,
+        "p50_ms": float(np.percentile(samples, 50)),
+        "p95_ms": float(np.percentile(samples, 95)),
+        "p99_ms": float(np.percentile(samples, 99)),
+        "throughput_per_s": 1000.0 / mean if mean else None,
+    }
+
+
+def peak_rss_mb():
+    # ru_maxrss is KB on Linux, bytes on macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024
+
+
+def run_stage(stage, sizes, densities, repeat, workdir, result_queue):
+    """Child process body: build cases, run one stage over all of them, report timings + RSS."""
+    try:
+        env = setup_environment(workdir, with_model=stage in ("predict", "end_to_end"))
+        cases = build_cases(sizes, densities)
+        baseline = peak_rss_mb()
+        rows = []
+        for case in cases:
+            fn = stage_fn(stage, case, env)
+            row = {"stage": stage, "resolution": case["resolution"], "source": case["source"], "faces": case["faces"]}
+            if fn is None:
+                row["skipped"] = True
+            else:
+                row.update(time_callable(fn, repeat))
+            rows.append(row)
+        result_queue.put({"stage": stage, "rows": rows, "baseline_rss_mb": baseline, "peak_rss_mb": peak_rss_mb()})
+    except Exception as e:
+        result_queue.put({"stage": stage, "error": f"{type(e).__name__} - {e}"})
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True,
+                                       stderr=subprocess.DEVNULL).strip()
+    except Exception:
+        return None
+
+
+def run(stages, sizes, densities, repeat):
+    ctx = multiprocessing.get_context("spawn")
+    results = []
+    with tempfile.TemporaryDirectory() as workdir:
+        for stage in stages:
+            result_queue = ctx.Queue()
+            process = ctx.Process(target=run_stage, args=(stage, sizes, densities, repeat, workdir, result_queue))
+            process.start()
+            results.append(result_queue.get())
+            process.join()
+    return {
+        "revision": git_revision(),
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "cpu_count": os.cpu_count(),
+        "repeat": repeat,
+        "stages": results,
+    }
+
+
+def print_report(report):
+    print(f"revision {report['revision']}  repeat {report['repeat']}")
+    for result in report["stages"]:
+        if "error" in result:
+            print(f"{result['stage']:<11} failed: {result['error']}")
+            continue
+        print(f"{result['stage']:<11} peak RSS {result['peak_rss_mb']:.0f} MB (setup {result['baseline_rss_mb']:.0f} MB)")
+        for row in result["rows"]:
+            label = f"  {row['resolution']:>5} {row['source']:<13} {row['faces']:>3} faces"
+            if row.get("skipped"):
+                print(f"{label}  skipped")
+            else:
+                print(f"{label}  {row['throughput_per_s']:8.1f}/s  p50 {row['p50_ms']:8.2f}ms"
+                      f"  p95 {row['p95_ms']:8.2f}ms  p99 {row['p99_ms']:8.2f}ms")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Per-stage and end-to-end pipeline benchmark")
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument("--stages", default=",".join(STAGES), help=f"Comma separated subset of {','.join(STAGES)}")
+    parser.add_argument("--sizes", default=",".join(RESOLUTIONS), help=f"Comma separated subset of {','.join(RESOLUTIONS)}")
+    parser.add_argument("--densities", default=",".join(map(str, DENSITIES)), help="Synthetic faces per frame")
+    parser.add_argument("--json", help="Write the report to this file")
+    args = parser.parse_args(argv)
+
+    stages = [stage for stage in args.stages.split(",") if stage]
+    unknown = set(stages) - set(STAGES)
+    if unknown:
+        parser.error(f"Unknown stage(s): {', '.join(sorted(unknown))}")
+
+    report = run(stages, args.sizes.split(","), [int(d) for d in args.densities.split(",")], args.repeat)
+    print_report(report)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,5 @@
 import os
 from dotenv import load_dotenv
-from ultralytics import YOLO
 
 # Load environment variables
 load_dotenv()
@@ -15,10 +14,125 @@ OUTPUT_DIR = os.getenv("OUTPUT_DIR", "./output")
 BASE_URL = os.getenv("BASE_URL", "http://localhost:8000/output")
 DEVICE = os.getenv("DEVICE", "cpu")
 
-os.makedirs(OUTPUT_DIR, exist_ok=True)
+# False-positive filter: "fast" (integral images, all boxes at once) or "exact" (enhance every crop)
+FACE_FILTER_MODE = os.getenv("FACE_FILTER_MODE", "fast").lower()
+
+# Full-frame enhancement before inference: "full" (enhance_face_crop) or "fast" (thumbnail stats + fused LUT)
+ENHANCE_MODE = os.getenv("ENHANCE_MODE", "full").lower()
+ENHANCE_SHARPEN = os.getenv("ENHANCE_SHARPEN", "false").lower() == "true"
+ENHANCE_CLAHE = os.getenv("ENHANCE_CLAHE", "false").lower() == "true"
+
+# Batched inference (frames from concurrent tasks share one model.predict call)
+INFERENCE_BATCHING = os.getenv("INFERENCE_BATCHING", "false").lower() == "true"
+BATCH_MAX_SIZE = int(os.getenv("BATCH_MAX_SIZE", 16))
+BATCH_MAX_WAIT_MS = float(os.getenv("BATCH_MAX_WAIT_MS", 30))
+
+# POST /faces/batch: items are validated together and enqueued as process_image_batch_task chunks
+BATCH_SUBMIT_MAX = int(os.getenv("BATCH_SUBMIT_MAX", 1000))     # items per request
+BATCH_TASK_SIZE = int(os.getenv("BATCH_TASK_SIZE", 16))         # images per task (one batched predict)
+BATCH_FETCH_WORKERS = int(os.getenv("BATCH_FETCH_WORKERS", 8))  # concurrent downloads inside a batch task
+
+# Task scheduling: queues faces.<live|backfill>.<shard>, shard = hash(customer_id) % FAIR_SHARDS
+# (see app.helpers.fair_scheduling); late acks with prefetch 1 so a busy child holds no queued frames
+FAIR_SHARDS = max(1, int(os.getenv("FAIR_SHARDS", 4)))
+CELERY_PREFETCH_MULTIPLIER = int(os.getenv("CELERY_PREFETCH_MULTIPLIER", 1))
+# Tasks one customer may run at once across all workers (0 = unlimited), per-customer overrides "acme:8,globex:2";
+# slots live in the shared store, so this needs SHARED_STORE_URL (otherwise the cap is per worker child).
+# A slot is reclaimed TENANT_SLOT_TTL seconds after its task started: keep it above the longest task
+TENANT_MAX_CONCURRENCY = int(os.getenv("TENANT_MAX_CONCURRENCY", 0))
+TENANT_CONCURRENCY = os.getenv("TENANT_CONCURRENCY", "")
+TENANT_RETRY_DELAY = float(os.getenv("TENANT_RETRY_DELAY", 2))
+TENANT_SLOT_TTL = int(os.getenv("TENANT_SLOT_TTL", 600))
+
+# Stale snapshots (checked at task start): older than MAX_FRAME_AGE seconds (0 = no limit) or superseded by a
+# newer queued frame of the same device. Policy "off", "store" (process and save, no relay), "skip" (drop)
+# or "defer" (re-queue on the backfill lane, saved there without relay). The "newest queued frame" markers are
+# written by the API and read by the workers, so any policy but "off" needs SHARED_STORE_URL (otherwise only
+# MAX_FRAME_AGE takes effect reliably)
+STALE_FRAME_POLICY = os.getenv("STALE_FRAME_POLICY", "off").lower()
+MAX_FRAME_AGE = float(os.getenv("MAX_FRAME_AGE", 0))
+STALE_MARKER_TTL = int(os.getenv("STALE_MARKER_TTL", 86400))
+
+# POST /faces/upload: bytes are spooled (tmpfs by default) and only a spool://<digest>/<name> handle is
+# queued; API and workers must share SPOOL_DIR (same host or a shared mount)
+SPOOL_DIR = os.getenv("SPOOL_DIR", "/dev/shm/faces-spool" if os.path.isdir("/dev/shm") else "./spool")
+SPOOL_TTL = int(os.getenv("SPOOL_TTL", 900))
+SPOOL_CLEANUP_INTERVAL = int(os.getenv("SPOOL_CLEANUP_INTERVAL", 60))
+
+# Annotated images: "eager" draws, encodes and uploads one per image in the worker; "lazy" only stores
+# the boxes and GET /faces/{id}/annotated renders from the original on first view (disk LRU cache)
+ANNOTATION_MODE = os.getenv("ANNOTATION_MODE", "eager").lower()
+ANNOTATION_BASE_URL = os.getenv("ANNOTATION_BASE_URL", "http://localhost:8000")   # public URL of this API
+RENDER_CACHE_DIR = os.getenv("RENDER_CACHE_DIR", os.path.join(OUTPUT_DIR, "rendered"))
+RENDER_CACHE_MAX_BYTES = int(os.getenv("RENDER_CACHE_MAX_BYTES", 512 * 1024 * 1024))
+RENDER_MAX_SIZE = int(os.getenv("RENDER_MAX_SIZE", 4096))
+RENDER_DEFAULT_QUALITY = int(os.getenv("RENDER_DEFAULT_QUALITY", 85))
+
+# Image fetching: pooled keep-alive connections, streamed with a size cap. REDUCED_DECODE decodes large JPEGs
+# at 1/2, 1/4 or 1/8 scale when that still leaves the longest side >= IMG_SIZE: faster, and stored boxes and
+# MIN_FACE_SIZE stay in source pixels, but eager annotated images come out at the reduced resolution and the
+# crop brightness/texture checks see downscaled crops (small faces can be filtered differently)
+FETCH_TIMEOUT = int(os.getenv("FETCH_TIMEOUT", 5))
+FETCH_MAX_BYTES = int(os.getenv("FETCH_MAX_BYTES", 5_000_000))
+FETCH_POOL_CONNECTIONS = int(os.getenv("FETCH_POOL_CONNECTIONS", 8))   # distinct hosts kept pooled
+FETCH_POOL_MAXSIZE = int(os.getenv("FETCH_POOL_MAXSIZE", 16))          # keep-alive sockets per host
+REDUCED_DECODE = os.getenv("REDUCED_DECODE", "false").lower() == "true"
+
+# "full" runs the whole frame at IMG_SIZE; "tiled" also slices it into overlapping TILE_SIZE tiles
+# (one batched predict, textureless tiles skipped, boxes merged across seams) to recover small faces
+INFERENCE_MODE = os.getenv("INFERENCE_MODE", "full").lower()
+TILE_SIZE = int(os.getenv("TILE_SIZE", 640))
+TILE_OVERLAP = float(os.getenv("TILE_OVERLAP", 0.2))
+TILE_FULL_FRAME = os.getenv("TILE_FULL_FRAME", "true").lower() == "true"
+TILE_DECODE_SIZE = int(os.getenv("TILE_DECODE_SIZE", 2048))   # reduced-decode floor in tiled mode
+TILE_MIN_STD = float(os.getenv("TILE_MIN_STD", 6))
+TILE_MIN_EDGE = float(os.getenv("TILE_MIN_EDGE", 4))
+TILE_MERGE_IOS = float(os.getenv("TILE_MERGE_IOS", 0.6))
+
+# Adaptive per-device imgsz (INFERENCE_MODE=full): smallest size keeping a device's faces
+# >= ADAPTIVE_MIN_FACE_PX, learnt from periodic full-resolution passes
+ADAPTIVE_RESOLUTION = os.getenv("ADAPTIVE_RESOLUTION", "false").lower() == "true"
+ADAPTIVE_MIN_IMGSZ = int(os.getenv("ADAPTIVE_MIN_IMGSZ", 320))
+ADAPTIVE_MIN_FACE_PX = float(os.getenv("ADAPTIVE_MIN_FACE_PX", 24))
+ADAPTIVE_FULL_EVERY = int(os.getenv("ADAPTIVE_FULL_EVERY", 20))     # frames between full-resolution passes
+ADAPTIVE_WARMUP = int(os.getenv("ADAPTIVE_WARMUP", 3))              # full passes with faces before reducing
+ADAPTIVE_EWMA_ALPHA = float(os.getenv("ADAPTIVE_EWMA_ALPHA", 0.3))
+ADAPTIVE_COUNT_JUMP = float(os.getenv("ADAPTIVE_COUNT_JUMP", 0.5))  # relative count change forcing a full pass
+ADAPTIVE_STATE_TTL = int(os.getenv("ADAPTIVE_STATE_TTL", 7 * 86400))
+
+# Per-device change detection: a snapshot whose 32x32 gray signature differs from the device's last
+# processed frame by < CHANGE_THRESHOLD gray levels (worst 8x8 region) reuses its detections
+CHANGE_DETECTION = os.getenv("CHANGE_DETECTION", "false").lower() == "true"
+CHANGE_THRESHOLD = float(os.getenv("CHANGE_THRESHOLD", 4))
+CHANGE_MAX_REUSE_AGE = int(os.getenv("CHANGE_MAX_REUSE_AGE", 600))   # seconds between snapshot times
+CHANGE_STATE_TTL = int(os.getenv("CHANGE_STATE_TTL", 86400))
 
-# Load YOLO model
-model = YOLO(MODEL_PATH)
+# Synchronous /faces/sync: the API process loads the model and serves requests from a bounded pool,
+# refusing (503 + Retry-After) those whose predicted queue wait would exceed their deadline
+SYNC_INFERENCE = os.getenv("SYNC_INFERENCE", "false").lower() == "true"
+SYNC_POOL_WORKERS = int(os.getenv("SYNC_POOL_WORKERS", 2))
+SYNC_POOL_QUEUE_MAX = int(os.getenv("SYNC_POOL_QUEUE_MAX", 16))
+SYNC_DEADLINE_MS = int(os.getenv("SYNC_DEADLINE_MS", 2000))           # default per-request deadline
+SYNC_SERVICE_TIME_MS = float(os.getenv("SYNC_SERVICE_TIME_MS", 500))  # initial service time estimate
+
+# Per-host model server (python -m app.model_server.server): holds the model once; Celery children
+# send frames through shared memory over a unix socket instead of loading their own copy
+MODEL_SERVER = os.getenv("MODEL_SERVER", "false").lower() == "true"
+MODEL_SERVER_SOCKET = os.getenv("MODEL_SERVER_SOCKET", "/tmp/faces-model-server.sock")
+MODEL_SERVER_THREADS = int(os.getenv("MODEL_SERVER_THREADS", 0))   # torch intra-op threads, 0 = cores available
+MODEL_SERVER_CPUS = os.getenv("MODEL_SERVER_CPUS", "")             # core affinity, e.g. "0-7"
+MODEL_SERVER_TIMEOUT = float(os.getenv("MODEL_SERVER_TIMEOUT", 30))
+
+# Inference runtime: torch, onnx or openvino (exported next to MODEL_PATH on first use)
+INFERENCE_BACKEND = os.getenv("INFERENCE_BACKEND", "torch").lower()
+INFERENCE_INT8 = os.getenv("INFERENCE_INT8", "false").lower() == "true"
+INT8_CALIBRATION_DIR = os.getenv("INT8_CALIBRATION_DIR", "./train_model/datasets/faces")
+
+# Process role: the API ("api") never loads YOLO, Celery workers ("worker") load it
+# once per child process (see config.inference.model_registry)
+PROCESS_ROLE = os.getenv("PROCESS_ROLE", "api").lower()
+
+os.makedirs(OUTPUT_DIR, exist_ok=True)
 
 # Environment flags
 SAVE_MODE = os.getenv("SAVE_MODE", "local").lower()
@@ -28,6 +142,49 @@ AWS_ACCESS_KEY_ID = os.getenv("AWS_ACCESS_KEY_ID")
 AWS_SECRET_ACCESS_KEY = os.getenv("AWS_SECRET_ACCESS_KEY")
 AWS_REGION = os.getenv("AWS_REGION")
 S3_BUCKET_NAME =os.getenv("S3_BUCKET_NAME")
+S3_ENDPOINT_URL = os.getenv("S3_ENDPOINT_URL")  # optional, e.g. a local moto/minio server
+
+# Annotated image uploads run on a bounded background thread pool
+S3_ASYNC_UPLOAD = os.getenv("S3_ASYNC_UPLOAD", "true").lower() == "true"
+S3_UPLOAD_WORKERS = int(os.getenv("S3_UPLOAD_WORKERS", 4))
+S3_UPLOAD_QUEUE_MAX = int(os.getenv("S3_UPLOAD_QUEUE_MAX", 32))
+S3_UPLOAD_RETRIES = int(os.getenv("S3_UPLOAD_RETRIES", 3))
+S3_MULTIPART_THRESHOLD = int(os.getenv("S3_MULTIPART_THRESHOLD", 8 * 1024 * 1024))
 
 # DB Config
 DATABASE_URL = os.getenv("DATABASE_URL")
+
+# Buffered multi-row upserts of face_detection_counts (one background writer per worker process)
+DB_BULK_WRITE = os.getenv("DB_BULK_WRITE", "true").lower() == "true"
+DB_FLUSH_SIZE = int(os.getenv("DB_FLUSH_SIZE", 200))
+DB_FLUSH_INTERVAL_MS = float(os.getenv("DB_FLUSH_INTERVAL_MS", 500))
+DB_WRITE_QUEUE_MAX = int(os.getenv("DB_WRITE_QUEUE_MAX", 5_000))
+
+# Postgres partitioning of face_detection_counts: "none", "month" (RANGE on datetime) or "month_customer"
+# (each month also LIST-partitioned by customer_id for PARTITION_CUSTOMERS, the rest in a DEFAULT partition).
+# Retention drops whole partitions; PARTITION_CUSTOMERS entries may carry their own months, e.g. "acme:6,globex"
+DB_PARTITIONING = os.getenv("DB_PARTITIONING", "none").lower()
+PARTITION_PREMAKE_MONTHS = int(os.getenv("PARTITION_PREMAKE_MONTHS", 3))
+PARTITION_RETENTION_MONTHS = int(os.getenv("PARTITION_RETENTION_MONTHS", 0))   # 0 keeps everything
+PARTITION_CUSTOMERS = os.getenv("PARTITION_CUSTOMERS", "")
+PARTITION_MAINTENANCE_INTERVAL = int(os.getenv("PARTITION_MAINTENANCE_INTERVAL", 6 * 3600))
+
+# faces_data storage: "json" keeps the JSON list; "blob" packs boxes as uint16 + uint8 confidences into faces_blob
+# (9 bytes per face) and leaves faces_data NULL. Opt in only once every reader of faces_data uses
+# FaceDetectionCount.faces, then convert old rows with python -m config.persistence.migrations --convert-faces
+FACES_STORAGE = os.getenv("FACES_STORAGE", "json").lower()
+FACES_MIGRATION_CHUNK = int(os.getenv("FACES_MIGRATION_CHUNK", 5_000))
+
+# Occupancy rollups (occupancy_minute/hour/day), merged in the same transaction as new rows
+OCCUPANCY_ROLLUPS = os.getenv("OCCUPANCY_ROLLUPS", "true").lower() == "true"
+ROLLUP_BACKFILL_CHUNK = int(os.getenv("ROLLUP_BACKFILL_CHUNK", 10_000))
+OCCUPANCY_MAX_POINTS = int(os.getenv("OCCUPANCY_MAX_POINTS", 10_000))   # per /occupancy response
+
+# Shared key/value store (redis://...), falls back to an in-process store when unset
+SHARED_STORE_URL = os.getenv("SHARED_STORE_URL")
+
+# Inference result cache (in-process LRU + shared store), keyed by URL hash and optionally image digest
+RESULT_CACHE_ENABLED = os.getenv("RESULT_CACHE_ENABLED", "true").lower() == "true"
+RESULT_CACHE_BY_DIGEST = os.getenv("RESULT_CACHE_BY_DIGEST", "false").lower() == "true"
+RESULT_CACHE_SIZE = int(os.getenv("RESULT_CACHE_SIZE", 10_000))
+RESULT_CACHE_TTL = int(os.getenv("RESULT_CACHE_TTL", 86_400))
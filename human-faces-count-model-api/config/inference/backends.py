@@ -0,0 +1,148 @@
+import glob
+import logging
+import os
+import tempfile
+
+import cv2
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+SUPPORTED_BACKENDS = ("torch", "onnx", "openvino")
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png")
+
+
+def exported_model_path(model_path: str, backend: str, int8: bool = False) -> str:
+    """Return where the exported copy of model_path lives for a given backend."""
+    stem = os.path.splitext(model_path)[0]
+    if backend == "onnx":
+        return f"{stem}-int8.onnx" if int8 else f"{stem}.onnx"
+    if backend == "openvino":
+        # Ultralytics' own naming for OpenVINO exports
+        return f"{stem}_int8_openvino_model" if int8 else f"{stem}_openvino_model"
+    return model_path
+
+
+def calibration_images(dataset_dir: str, limit: int = 300):
+    """List calibration images under a YOLO dataset directory (images/train + images/val)."""
+    paths = []
+    for ext in IMAGE_EXTENSIONS:
+        paths.extend(glob.glob(os.path.join(dataset_dir, "**", f"*{ext}"), recursive=True))
+    return sorted(paths)[:limit]
+
+
+def letterbox(image: np.ndarray, imgsz: int) -> np.ndarray:
+    """Resize keeping aspect ratio and pad to an imgsz x imgsz square (YOLO preprocessing)."""
+    h, w = image.shape[:2]
+    scale = imgsz / max(h, w)
+    new_w, new_h = int(round(w * scale)), int(round(h * scale))
+    resized = cv2.resize(image, (new_w, new_h), interpolation=cv2.INTER_LINEAR)
+    canvas = np.full((imgsz, imgsz, 3), 114, dtype=np.uint8)
+    top, left = (imgsz - new_h) // 2, (imgsz - new_w) // 2
+    canvas[top:top + new_h, left:left + new_w] = resized
+    return canvas
+
+
+def quantize_onnx(fp32_path: str, int8_path: str, dataset_dir: str, imgsz: int) -> str:
+    """Statically quantize an ONNX model to INT8, calibrated on the training dataset."""
+    import onnxruntime as ort
+    from onnxruntime.quantization import CalibrationDataReader, QuantFormat, QuantType, quantize_static
+
+    image_paths = calibration_images(dataset_dir)
+    if not image_paths:
+        raise FileNotFoundError(f"No calibration images found under {dataset_dir}")
+
+    input_name = ort.InferenceSession(fp32_path, providers=["CPUExecutionProvider"]).get_inputs()[0].name
+
+    class DatasetReader(CalibrationDataReader):
+        """Feeds letterboxed dataset images, preprocessed like YOLO inputs."""
+
+        def __init__(self):
+            self._paths = iter(image_paths)
+
+        def get_next(self):
+            for path in self._paths:
+                image = cv2.imread(path, cv2.IMREAD_COLOR)
+                if image is None:
+                    continue
+                rgb = cv2.cvtColor(letterbox(image, imgsz), cv2.COLOR_BGR2RGB)
+                return {input_name: rgb.transpose(2, 0, 1)[None].astype(np.float32) / 255.0}
+            return None
+
+    quantize_static(
+        fp32_path,
+        int8_path,
+        DatasetReader(),
+        quant_format=QuantFormat.QDQ,
+        per_channel=True,
+        weight_type=QuantType.QInt8,
+        activation_type=QuantType.QUInt8,
+    )
+    logger.info(f"Quantized {fp32_path} -> {int8_path} using {len(image_paths)} calibration images")
+    return int8_path
+
+
+def _calibration_yaml(dataset_dir: str) -> str:
+    """Write a throwaway data yaml with absolute paths for Ultralytics' INT8 export."""
+    dataset_dir = os.path.abspath(dataset_dir)
+    fd, path = tempfile.mkstemp(suffix=".yml")
+    with os.fdopen(fd, "w") as f:
+        f.write(
+            f"path: {dataset_dir}\n"
+            "train: images/train\n"
+            "val: images/val\n"
+            "nc: 1\n"
+            "names: ['face']\n"
+        )
+    return path
+
+
+def export_model(model_path: str, backend: str, imgsz: int, int8: bool = False, calibration_dir: str = None) -> str:
+    """Export the PyTorch weights to the requested backend and return the exported path."""
+    from ultralytics import YOLO
+
+    if backend not in SUPPORTED_BACKENDS or backend == "torch":
+        raise ValueError(f"Cannot export to backend '{backend}'")
+
+    yolo = YOLO(model_path)
+    target = exported_model_path(model_path, backend, int8)
+
+    if backend == "openvino":
+        data = _calibration_yaml(calibration_dir) if int8 else None
+        try:
+            exported = yolo.export(format="openvino", imgsz=imgsz, dynamic=True, int8=int8, data=data)
+        finally:
+            if data:
+                os.remove(data)
+    else:
+        exported = yolo.export(format="onnx", imgsz=imgsz, dynamic=True, simplify=True)
+        if int8:
+            exported = quantize_onnx(exported, target, calibration_dir, imgsz)
+
+    logger.info(f"Exported {model_path} to {backend}{' (INT8)' if int8 else ''}: {exported}")
+    return str(exported)
+
+
+def load_model(model_path: str, backend: str = "torch", imgsz: int = 1024, int8: bool = False, calibration_dir: str = None):
+    """Load the face model on the configured inference backend, exporting it on first use.
+
+    Every backend is loaded through Ultralytics, so predict() returns the same Results
+    objects (boxes.xyxy / boxes.conf) whichever runtime executes the graph.
+    """
+    from ultralytics import YOLO
+
+    backend = backend.lower()
+    if backend not in SUPPORTED_BACKENDS:
+        raise ValueError(f"Unsupported INFERENCE_BACKEND '{backend}', expected one of {SUPPORTED_BACKENDS}")
+
+    if backend == "torch":
+        logger.info(f"Loading PyTorch model {model_path}")
+        return YOLO(model_path)
+
+    target = exported_model_path(model_path, backend, int8)
+    if not os.path.exists(target):
+        logger.info(f"No {backend} export found at {target}, exporting...")
+        target = export_model(model_path, backend, imgsz, int8=int8, calibration_dir=calibration_dir)
+
+    logger.info(f"Loading {backend}{' INT8' if int8 else ''} model {target}")
+    return YOLO(target, task="detect")
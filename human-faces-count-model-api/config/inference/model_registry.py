@@ -0,0 +1,75 @@
+import logging
+import threading
+
+import numpy as np
+
+from config.base_config import (
+    MODEL_PATH, INFERENCE_BACKEND, INFERENCE_INT8, INT8_CALIBRATION_DIR,
+    IMG_SIZE, CONF_THRESH, IOU_THRESH, DEVICE, PROCESS_ROLE, SYNC_INFERENCE, MODEL_SERVER
+)
+from config.inference.backends import load_model
+
+logger = logging.getLogger(__name__)
+
+_model = None
+_lock = threading.Lock()
+_role = PROCESS_ROLE
+
+
+def set_process_role(role: str):
+    """Declare what this process is for ("api", "worker" or "model_server"); only workers and
+    the model server may load the model, plus the API when it serves /faces/sync (SYNC_INFERENCE)."""
+    global _role
+    _role = role.lower()
+
+
+def get_process_role() -> str:
+    return _role
+
+
+def is_model_loaded() -> bool:
+    return _model is not None
+
+
+def get_model():
+    """Return this process' YOLO model, loading it on first use.
+
+    The API process only enqueues work, so asking for the model there is a bug
+    rather than a reason to pull in ultralytics/torch and the yolov8x weights,
+    unless SYNC_INFERENCE makes it serve inference itself.
+    """
+    global _model
+    if _model is None:
+        with _lock:
+            if _model is None:
+                if _role not in ("worker", "model_server") and not (_role == "api" and SYNC_INFERENCE):
+                    raise RuntimeError(f"Model loading is disabled for process role '{_role}'")
+                _model = load_model(
+                    MODEL_PATH,
+                    INFERENCE_BACKEND,
+                    imgsz=IMG_SIZE,
+                    int8=INFERENCE_INT8,
+                    calibration_dir=INT8_CALIBRATION_DIR,
+                )
+    return _model
+
+
+def warm_up(imgsz: int = IMG_SIZE):
+    """Run one dummy inference so the first real task doesn't pay graph/allocator setup."""
+    dummy = np.zeros((imgsz, imgsz, 3), dtype=np.uint8)
+    get_model().predict(source=dummy, imgsz=imgsz, conf=CONF_THRESH, iou=IOU_THRESH, device=DEVICE, verbose=False)
+    logger.info(f"Model warmed up at imgsz={imgsz}")
+
+
+def uses_model_server() -> bool:
+    """Whether this process sends its frames to the host's model server instead of a local model."""
+    return MODEL_SERVER and _role != "model_server"
+
+
+def load_and_warm_up():
+    """Load the model for this worker process and warm it up."""
+    if uses_model_server():
+        logger.info("Inference is served by the host model server, no local model loaded")
+        return
+    get_model()
+    warm_up()
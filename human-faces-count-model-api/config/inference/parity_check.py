@@ -0,0 +1,89 @@
+"""Compare an exported inference backend against the PyTorch model.
+
+Runs both models over the face dataset and reports per-image detection count
+differences and mean latency. Exits non-zero when the share of images whose
+counts differ by more than --max-count-diff exceeds --max-mismatch-rate.
+
+    python -m config.inference.parity_check --backend onnx --int8
+"""
+import argparse
+import logging
+import sys
+import time
+
+import cv2
+
+from config.base_config import MODEL_PATH, IMG_SIZE, CONF_THRESH, IOU_THRESH, DEVICE, INT8_CALIBRATION_DIR
+from config.inference.backends import SUPPORTED_BACKENDS, calibration_images, load_model
+
+logger = logging.getLogger(__name__)
+
+
+def count_detections(model, frame, imgsz):
+    """Return (number of boxes, latency in ms) for a single predict call."""
+    start = time.perf_counter()
+    results = model.predict(source=frame, imgsz=imgsz, conf=CONF_THRESH, iou=IOU_THRESH, device=DEVICE, verbose=False)
+    elapsed = (time.perf_counter() - start) * 1000
+    return sum(len(result.boxes) for result in results), elapsed
+
+
+def run_parity_check(backend, int8=False, dataset_dir=INT8_CALIBRATION_DIR, imgsz=IMG_SIZE, max_count_diff=0):
+    """Run both models over the dataset and return a summary dict."""
+    reference = load_model(MODEL_PATH, "torch")
+    candidate = load_model(MODEL_PATH, backend, imgsz=imgsz, int8=int8, calibration_dir=dataset_dir)
+
+    rows = []
+    for path in calibration_images(dataset_dir, limit=10_000):
+        image = cv2.imread(path, cv2.IMREAD_COLOR)
+        if image is None:
+            continue
+        frame = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+
+        ref_count, ref_ms = count_detections(reference, frame, imgsz)
+        cand_count, cand_ms = count_detections(candidate, frame, imgsz)
+        rows.append({"image": path, "torch": ref_count, backend: cand_count, "torch_ms": ref_ms, f"{backend}_ms": cand_ms})
+
+    if not rows:
+        raise FileNotFoundError(f"No images found under {dataset_dir}")
+
+    diffs = [abs(row["torch"] - row[backend]) for row in rows]
+    mismatches = [row for row, diff in zip(rows, diffs) if diff > max_count_diff]
+
+    return {
+        "backend": backend,
+        "int8": int8,
+        "images": len(rows),
+        "mean_abs_count_diff": sum(diffs) / len(rows),
+        "mismatch_rate": len(mismatches) / len(rows),
+        "torch_mean_ms": sum(row["torch_ms"] for row in rows) / len(rows),
+        f"{backend}_mean_ms": sum(row[f"{backend}_ms"] for row in rows) / len(rows),
+        "mismatches": mismatches,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Detection count parity check against the PyTorch model.")
+    parser.add_argument("--backend", choices=[b for b in SUPPORTED_BACKENDS if b != "torch"], required=True)
+    parser.add_argument("--int8", action="store_true", help="Check the INT8 quantized export")
+    parser.add_argument("--dataset", default=INT8_CALIBRATION_DIR)
+    parser.add_argument("--imgsz", type=int, default=IMG_SIZE)
+    parser.add_argument("--max-count-diff", type=int, default=0, help="Per-image count difference still considered a match")
+    parser.add_argument("--max-mismatch-rate", type=float, default=0.1, help="Allowed share of mismatching images")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    summary = run_parity_check(args.backend, args.int8, args.dataset, args.imgsz, args.max_count_diff)
+
+    for row in summary["mismatches"]:
+        logger.warning(f"Count mismatch {row['image']}: torch={row['torch']} {args.backend}={row[args.backend]}")
+
+    logger.info(
+        f"{summary['images']} images | mean |count diff| {summary['mean_abs_count_diff']:.3f} | "
+        f"mismatch rate {summary['mismatch_rate']:.1%} | "
+        f"torch {summary['torch_mean_ms']:.1f}ms vs {args.backend} {summary[f'{args.backend}_mean_ms']:.1f}ms"
+    )
+    return 0 if summary["mismatch_rate"] <= args.max_mismatch_rate else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
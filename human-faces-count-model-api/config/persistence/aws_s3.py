@@ -1,14 +1,20 @@
 import boto3
+from botocore.config import Config
 
 from config.base_config import (
     AWS_ACCESS_KEY_ID,
     AWS_SECRET_ACCESS_KEY,
-    AWS_REGION
+    AWS_REGION,
+    S3_ENDPOINT_URL,
+    S3_UPLOAD_WORKERS
 )
 
 s3 =  boto3.session.Session().client(
             "s3",
             region_name=AWS_REGION,
+            endpoint_url=S3_ENDPOINT_URL,
             aws_access_key_id=AWS_ACCESS_KEY_ID,
-            aws_secret_access_key=AWS_SECRET_ACCESS_KEY
+            aws_secret_access_key=AWS_SECRET_ACCESS_KEY,
+            # one pooled connection per upload thread (+ the synchronous path)
+            config=Config(max_pool_connections=S3_UPLOAD_WORKERS + 1)
         )
\ No newline at end of file
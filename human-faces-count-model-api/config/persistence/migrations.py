@@ -0,0 +1,105 @@
+"""Schema changes that create_all cannot apply to existing tables, run at API startup.
+
+Converting existing faces_data rows to faces_blob touches every row, and moving a plain table into
+the DB_PARTITIONING layout copies it, so both are separate steps (stop the workers for --partition):
+
+    python -m config.persistence.migrations --convert-faces
+    python -m config.persistence.migrations --partition
+"""
+import argparse
+import logging
+
+from sqlalchemy import inspect, select, update, bindparam, text
+
+logger = logging.getLogger(__name__)
+
+
+def add_missing_columns(conn, table):
+    existing = {column["name"] for column in inspect(conn).get_columns(table.name)}
+    for column in table.columns:
+        if column.name not in existing:
+            column_type = column.type.compile(dialect=conn.dialect)
+            conn.execute(text(f'ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}'))
+            logger.info(f"Added column {table.name}.{column.name}")
+
+
+def drop_stale_not_null(conn, table):
+    """Relax NOT NULL on columns the model now declares nullable (Postgres only)."""
+    if conn.dialect.name != "postgresql":
+        return
+    for column in inspect(conn).get_columns(table.name):
+        model_column = table.columns.get(column["name"])
+        if model_column is not None and model_column.nullable and not column["nullable"]:
+            conn.execute(text(f'ALTER TABLE {table.name} ALTER COLUMN {column["name"]} DROP NOT NULL'))
+            logger.info(f"Dropped NOT NULL on {table.name}.{column['name']}")
+
+
+def run_migrations(engine):
+    """Bring existing tables up to the models; safe to run on every start."""
+    from app.models.counts import FaceDetectionCount
+
+    from .partitions import enabled, is_partitioned
+
+    table = FaceDetectionCount.__table__
+    with engine.begin() as conn:
+        if enabled(conn) and not is_partitioned(conn):
+            logger.error("DB_PARTITIONING is set but face_detection_counts is a plain table; upserts will fail "
+                         "until it is converted with: python -m config.persistence.migrations --partition")
+        add_missing_columns(conn, table)
+        drop_stale_not_null(conn, table)
+        # create_all skips indexes added to tables that already exist
+        for index in table.indexes:
+            index.create(bind=conn, checkfirst=True)
+
+
+def convert_faces_data(engine, chunk_size=None):
+    """Move faces_data JSON into faces_blob, one committed chunk at a time; returns rows converted."""
+    from config.base_config import FACES_MIGRATION_CHUNK
+    from app.models.counts import FaceDetectionCount, encode_faces
+
+    table = FaceDetectionCount.__table__
+    chunk_size = chunk_size or FACES_MIGRATION_CHUNK
+    pending = (
+        select(table.c.id, table.c.faces_data)
+        .where(table.c.faces_blob.is_(None), table.c.faces_data.isnot(None))
+        .limit(chunk_size)
+    )
+    convert = (
+        update(table)
+        .where(table.c.id == bindparam("row_id"))
+        .values(faces_blob=bindparam("blob"), faces_data=None)
+    )
+
+    total = 0
+    while True:
+        with engine.begin() as conn:
+            rows = conn.execute(pending).all()
+            if not rows:
+                return total
+            conn.execute(convert, [{"row_id": row.id, "blob": encode_faces(row.faces_data)} for row in rows])
+        total += len(rows)
+        logger.info(f"Converted faces_data of {total} row(s)")
+
+
+def main():
+    from config.persistence.postgres_db import engine
+
+    parser = argparse.ArgumentParser(description="Apply schema migrations to face_detection_counts.")
+    parser.add_argument("--convert-faces", action="store_true", help="also move faces_data JSON into faces_blob")
+    parser.add_argument("--partition", action="store_true", help="also copy a plain table into DB_PARTITIONING partitions")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    run_migrations(engine)
+    if args.partition:
+        from .partitions import convert_to_partitioned
+        print(f"Copied {convert_to_partitioned(engine)} row(s) into partitions")
+    if args.convert_faces:
+        from config.base_config import FACES_STORAGE
+        if FACES_STORAGE != "blob":
+            logger.warning("FACES_STORAGE is not blob: new rows keep writing faces_data JSON while old rows are converted")
+        print(f"Converted {convert_faces_data(engine)} row(s) to faces_blob")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,242 @@
+"""Monthly (and optionally per-customer) Postgres partitions of face_detection_counts.
+
+Layout with DB_PARTITIONING=month_customer:
+
+    face_detection_counts                    RANGE (datetime)
+      face_detection_counts_p202610          LIST (customer_id)
+        face_detection_counts_p202610_c<h>   one per PARTITION_CUSTOMERS entry (h = hash of the id)
+        face_detection_counts_p202610_default
+
+With DB_PARTITIONING=month the month partitions are plain tables. Partitions are created
+ahead of time by maintain_partitions and on demand for the months of rows being written;
+retention drops partitions instead of deleting rows. Every function is a no-op unless the
+engine is Postgres and partitioning is enabled.
+"""
+import hashlib
+import logging
+import re
+import threading
+import zlib
+from datetime import datetime
+
+from sqlalchemy import text
+
+from config.base_config import (
+    DB_PARTITIONING, PARTITION_PREMAKE_MONTHS, PARTITION_RETENTION_MONTHS, PARTITION_CUSTOMERS
+)
+
+logger = logging.getLogger(__name__)
+
+TABLE = "face_detection_counts"
+_MONTH_NAME = re.compile(rf"^{TABLE}_p(\d{{4}})(\d{{2}})$")
+_LOCK_KEY = zlib.crc32(f"{TABLE}:partitions".encode())   # pg_advisory_xact_lock key for partition DDL
+
+_known_months = set()
+_known_lock = threading.Lock()
+
+
+def enabled(conn_or_engine) -> bool:
+    return DB_PARTITIONING in ("month", "month_customer") and conn_or_engine.dialect.name == "postgresql"
+
+
+def parse_customers(spec=PARTITION_CUSTOMERS) -> dict:
+    """"acme:6,globex" -> {"acme": 6, "globex": None}: dedicated customers and their retention months."""
+    customers = {}
+    for entry in filter(None, (part.strip() for part in spec.split(","))):
+        customer, _, months = entry.rpartition(":") if ":" in entry else (entry, "", "")
+        customers[customer] = int(months) if months else None
+    return customers
+
+
+def month_start(dt: datetime) -> datetime:
+    return datetime(dt.year, dt.month, 1)
+
+
+def add_months(month: datetime, months: int) -> datetime:
+    index = month.year * 12 + month.month - 1 + months
+    return datetime(index // 12, index % 12 + 1, 1)
+
+
+def month_partition(month: datetime) -> str:
+    return f"{TABLE}_p{month:%Y%m}"
+
+
+def customer_partition(month: datetime, customer_id: str) -> str:
+    # Customer ids are not valid identifiers in general (and names are capped at 63 bytes)
+    return f"{month_partition(month)}_c{hashlib.sha1(customer_id.encode()).hexdigest()[:12]}"
+
+
+def _literal(value: str) -> str:
+    return "'" + value.replace("'", "''") + "'"
+
+
+def _exists(conn, name) -> bool:
+    return conn.execute(text("SELECT to_regclass(:name) IS NOT NULL"), {"name": name}).scalar()
+
+
+def _children(conn, parent):
+    return conn.execute(text(
+        "SELECT c.relname FROM pg_inherits i "
+        "JOIN pg_class c ON c.oid = i.inhrelid JOIN pg_class p ON p.oid = i.inhparent "
+        "WHERE p.relname = :parent"
+    ), {"parent": parent}).scalars().all()
+
+
+def create_month(conn, month: datetime, customers=None):
+    """Create the partition of one month (with its customer partitions); idempotent."""
+    customers = parse_customers() if customers is None else customers
+    name = month_partition(month)
+    by_customer = DB_PARTITIONING == "month_customer"
+
+    if not _exists(conn, name):
+        conn.execute(text(
+            f"CREATE TABLE {name} PARTITION OF {TABLE} "
+            f"FOR VALUES FROM ('{month:%Y-%m-%d}') TO ('{add_months(month, 1):%Y-%m-%d}')"
+            + (" PARTITION BY LIST (customer_id)" if by_customer else "")
+        ))
+        if by_customer:
+            conn.execute(text(f"CREATE TABLE {name}_default PARTITION OF {name} DEFAULT"))
+        logger.info(f"Created partition {name}")
+
+    if not by_customer:
+        return
+    for customer_id in customers:
+        sub = customer_partition(month, customer_id)
+        if _exists(conn, sub):
+            continue
+        # Fails if the month's DEFAULT partition already holds rows of a newly listed customer
+        try:
+            with conn.begin_nested():
+                conn.execute(text(f"CREATE TABLE {sub} PARTITION OF {name} FOR VALUES IN ({_literal(customer_id)})"))
+            logger.info(f"Created partition {sub} for customer {customer_id}")
+        except Exception as e:
+            logger.warning(f"Could not create partition {sub} for customer {customer_id}: {type(e).__name__} - {e}")
+
+
+def ensure_months(engine, months):
+    """Make sure partitions exist for the given month starts (cached per process)."""
+    if not enabled(engine):
+        return
+    with _known_lock:
+        missing = sorted(set(months) - _known_months)
+    if not missing:
+        return
+    with engine.begin() as conn:
+        conn.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": _LOCK_KEY})
+        for month in missing:
+            create_month(conn, month)
+    with _known_lock:
+        _known_months.update(missing)
+
+
+def ensure_row_partitions(engine, rows):
+    """Insert routing: partitions for the months of rows about to be written."""
+    ensure_months(engine, {month_start(row["datetime"]) for row in rows})
+
+
+def expired(partition_month: datetime, retention_months, now: datetime) -> bool:
+    """A month expires once it ends before the first of the month retention_months ago."""
+    if not retention_months:
+        return False
+    return add_months(partition_month, 1) <= add_months(month_start(now), -retention_months)
+
+
+def apply_retention(conn, now: datetime, customers=None):
+    """Drop partitions past retention; returns the dropped table names."""
+    customers = parse_customers() if customers is None else customers
+    dropped = []
+
+    if DB_PARTITIONING == "month" and any(months is not None for months in customers.values()):
+        logger.warning("Per-customer retention needs DB_PARTITIONING=month_customer, using PARTITION_RETENTION_MONTHS")
+
+    for name in _children(conn, TABLE):
+        match = _MONTH_NAME.match(name)
+        if match is None:
+            continue
+        month = datetime(int(match.group(1)), int(match.group(2)), 1)
+
+        if DB_PARTITIONING == "month_customer":
+            for customer_id, months in customers.items():
+                sub = customer_partition(month, customer_id)
+                if expired(month, months or PARTITION_RETENTION_MONTHS, now) and _exists(conn, sub):
+                    conn.execute(text(f"DROP TABLE {sub}"))
+                    dropped.append(sub)
+            if expired(month, PARTITION_RETENTION_MONTHS, now) and _exists(conn, f"{name}_default"):
+                conn.execute(text(f"DROP TABLE {name}_default"))
+                dropped.append(f"{name}_default")
+            drop_month = not _children(conn, name)
+        else:
+            drop_month = expired(month, PARTITION_RETENTION_MONTHS, now)
+
+        if drop_month:
+            conn.execute(text(f"DROP TABLE {name}"))
+            dropped.append(name)
+            with _known_lock:
+                _known_months.discard(month)
+
+    for name in dropped:
+        logger.info(f"Retention dropped partition {name}")
+    return dropped
+
+
+def maintain_partitions(engine, now=None):
+    """Pre-create the current and next PARTITION_PREMAKE_MONTHS months, then apply retention."""
+    if not enabled(engine):
+        return {"created": 0, "dropped": []}
+    now = now or datetime.utcnow()
+    months = [add_months(month_start(now), i) for i in range(PARTITION_PREMAKE_MONTHS + 1)]
+    with engine.begin() as conn:
+        conn.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": _LOCK_KEY})
+        for month in months:
+            create_month(conn, month)
+        dropped = apply_retention(conn, now)
+    with _known_lock:
+        _known_months.update(months)
+    return {"created": len(months), "dropped": dropped}
+
+
+def is_partitioned(conn) -> bool:
+    return conn.execute(text(
+        "SELECT relkind = 'p' FROM pg_class WHERE oid = to_regclass(:name)"
+    ), {"name": TABLE}).scalar() or False
+
+
+def convert_to_partitioned(engine, legacy_suffix="_unpartitioned"):
+    """Move an existing plain face_detection_counts into the partitioned layout, month by month.
+
+    Stop the workers first. The old table is kept as face_detection_counts_unpartitioned
+    for the operator to drop once the copy is verified. Returns the rows copied.
+    """
+    from app.models.counts import FaceDetectionCount
+
+    if not enabled(engine):
+        raise RuntimeError("Set DB_PARTITIONING=month or month_customer on a Postgres DATABASE_URL first")
+    legacy = f"{TABLE}{legacy_suffix}"
+
+    with engine.begin() as conn:
+        if is_partitioned(conn):
+            logger.info(f"{TABLE} is already partitioned")
+            return 0
+        conn.execute(text(f"ALTER TABLE {TABLE} RENAME TO {legacy}"))
+        # Index names are global; free them for the partitioned table
+        for index in conn.execute(text("SELECT indexname FROM pg_indexes WHERE tablename = :t"), {"t": legacy}).scalars():
+            conn.execute(text(f"ALTER INDEX {index} RENAME TO {(index + legacy_suffix)[:63]}"))
+        FaceDetectionCount.__table__.create(bind=conn)
+        first, last = conn.execute(text(f"SELECT min(datetime), max(datetime) FROM {legacy}")).one()
+
+    copied = 0
+    if first is not None:
+        columns = ", ".join(column.name for column in FaceDetectionCount.__table__.columns)
+        month = month_start(first)
+        while month <= last:
+            ensure_months(engine, [month])
+            with engine.begin() as conn:
+                copied += conn.execute(text(
+                    f"INSERT INTO {TABLE} ({columns}) SELECT {columns} FROM {legacy} "
+                    f"WHERE datetime >= :start AND datetime < :end"
+                ), {"start": month, "end": add_months(month, 1)}).rowcount
+            logger.info(f"Copied {month:%Y-%m} into {month_partition(month)} ({copied} rows so far)")
+            month = add_months(month, 1)
+
+    maintain_partitions(engine)
+    return copied
@@ -0,0 +1,146 @@
+import logging
+import threading
+import time
+
+from config.base_config import SHARED_STORE_URL
+
+logger = logging.getLogger(__name__)
+
+
+class InMemoryStore:
+    """Process-local stand-in implementing the subset of the Redis client API used here.
+
+    Values come back as bytes, like redis-py without decode_responses. Only state within
+    one process is shared, so use a real Redis (SHARED_STORE_URL) across workers/hosts.
+    """
+
+    def __init__(self):
+        self._data = {}
+        self._expiry = {}
+        self._lock = threading.RLock()
+
+    def _alive(self, name):
+        expires = self._expiry.get(name)
+        if expires is not None and expires <= time.monotonic():
+            self._data.pop(name, None)
+            self._expiry.pop(name, None)
+        return name in self._data
+
+    @staticmethod
+    def _encode(value):
+        if isinstance(value, bytes):
+            return value
+        return str(value).encode("utf-8")
+
+    def get(self, name):
+        with self._lock:
+            return self._data[name] if self._alive(name) else None
+
+    def set(self, name, value, ex=None, nx=False):
+        with self._lock:
+            if nx and self._alive(name):
+                return None
+            self._data[name] = self._encode(value)
+            self._expiry.pop(name, None)
+            if ex is not None:
+                self._expiry[name] = time.monotonic() + ex
+            return True
+
+    def delete(self, *names):
+        with self._lock:
+            removed = 0
+            for name in names:
+                removed += int(self._alive(name))
+                self._data.pop(name, None)
+                self._expiry.pop(name, None)
+            return removed
+
+    def expire(self, name, seconds):
+        with self._lock:
+            if not self._alive(name):
+                return False
+            self._expiry[name] = time.monotonic() + seconds
+            return True
+
+    def incr(self, name, amount=1):
+        with self._lock:
+            value = int(self._data[name]) + amount if self._alive(name) else amount
+            self._data[name] = self._encode(value)
+            return value
+
+    def decr(self, name, amount=1):
+        return self.incr(name, -amount)
+
+    def _zset(self, name):
+        if not self._alive(name):
+            self._data[name] = {}
+        return self._data[name]
+
+    def zadd(self, name, mapping, gt=False):
+        with self._lock:
+            zset = self._zset(name)
+            mapping = {self._encode(member): float(score) for member, score in mapping.items()}
+            added = sum(member not in zset for member in mapping)
+            if gt:
+                # Like ZADD GT: existing members only move to a greater score
+                mapping = {member: score for member, score in mapping.items() if score > zset.get(member, float("-inf"))}
+            zset.update(mapping)
+            return added
+
+    def zscore(self, name, member):
+        with self._lock:
+            return self._zset(name).get(self._encode(member))
+
+    def zrem(self, name, *members):
+        with self._lock:
+            zset = self._zset(name)
+            return sum(zset.pop(self._encode(member), None) is not None for member in members)
+
+    def zremrangebyscore(self, name, min, max):
+        with self._lock:
+            zset = self._zset(name)
+            expired = [member for member, score in zset.items() if float(min) <= score <= float(max)]
+            for member in expired:
+                del zset[member]
+            return len(expired)
+
+    def zrank(self, name, member):
+        with self._lock:
+            ranked = sorted(self._zset(name).items(), key=lambda item: (item[1], item[0]))
+            members = [m for m, _ in ranked]
+            member = self._encode(member)
+            return members.index(member) if member in members else None
+
+    def zcard(self, name):
+        with self._lock:
+            return len(self._zset(name))
+
+    def ping(self):
+        return True
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def require_shared_store(feature: str):
+    """Log an error when a cross-process feature is enabled without SHARED_STORE_URL."""
+    if not SHARED_STORE_URL:
+        logger.error(f"{feature} needs state shared by the API and all workers, but SHARED_STORE_URL is not set; "
+                     f"each process will only see its own state")
+
+
+def get_shared_store():
+    """Redis client when SHARED_STORE_URL is set, otherwise a process-local InMemoryStore."""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                if SHARED_STORE_URL:
+                    import redis
+                    _store = redis.Redis.from_url(SHARED_STORE_URL, socket_timeout=1, socket_connect_timeout=1)
+                    logger.info("Using Redis shared store")
+                else:
+                    _store = InMemoryStore()
+                    logger.info("SHARED_STORE_URL not set, using in-process shared store")
+    return _store
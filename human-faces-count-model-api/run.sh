@@ -1,9 +1,37 @@
 #!/bin/bash
 source venv/bin/activate
 
-# Start Celery worker in background
-echo "Starting Celery Faces Processing Worker..."
-celery -A app.celery_app.celery_app worker --loglevel=info &
+# Optional per-host model server, shared by all Celery children (MODEL_SERVER=true)
+if [ "${MODEL_SERVER:-false}" = "true" ]; then
+  echo "Starting Faces Model Server..."
+  rm -f "${MODEL_SERVER_SOCKET:-/tmp/faces-model-server.sock}"   # stale socket of a previous run
+  python -m app.model_server.server &
+
+  # Workers do not load the model themselves; start them once the server is listening
+  for _ in $(seq 1 ${MODEL_SERVER_START_TIMEOUT:-300}); do
+    [ -S "${MODEL_SERVER_SOCKET:-/tmp/faces-model-server.sock}" ] && break
+    sleep 1
+  done
+fi
+
+# Start Celery workers in background: the live pool only serves live queues, so backfill can never
+# take its slots; the backfill pool serves backfill and helps out with live frames between tasks
+LIVE_QUEUES=$(python -c "from app.helpers.fair_scheduling import lane_queues; print(','.join(lane_queues('live')))")
+BACKFILL_QUEUES=$(python -c "from app.helpers.fair_scheduling import lane_queues; print(','.join(lane_queues('backfill')))")
+METRICS_PORT=${WORKER_METRICS_PORT:-9400}
+
+echo "Starting Celery Faces Processing Workers (live, backfill)..."
+celery -A app.celery_app.celery_app worker --loglevel=info --pool=${CELERY_POOL:-prefork} -n live@%h -Q "$LIVE_QUEUES" \
+  ${CELERY_LIVE_CONCURRENCY:+--concurrency=$CELERY_LIVE_CONCURRENCY} &
+WORKER_METRICS_PORT=$([ "$METRICS_PORT" = "0" ] && echo 0 || echo $((METRICS_PORT + 100))) \
+celery -A app.celery_app.celery_app worker --loglevel=info --pool=${CELERY_POOL:-prefork} -n backfill@%h -Q "$BACKFILL_QUEUES,$LIVE_QUEUES" \
+  --concurrency=${CELERY_BACKFILL_CONCURRENCY:-1} &
+
+# Partition maintenance schedule (DB_PARTITIONING=month|month_customer); run a single beat per deployment
+if [ "${DB_PARTITIONING:-none}" != "none" ]; then
+  echo "Starting Celery Beat..."
+  celery -A app.celery_app.celery_app beat --loglevel=info &
+fi
 
 # Start FastAPI app
 echo "Starting Faces Count FastAPI Server..."
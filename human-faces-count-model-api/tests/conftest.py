@@ -0,0 +1,9 @@
+import os
+import sys
+
+# Settings are read at import time: in-memory database and broker, no external services
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+os.environ.setdefault("RABBITMQ_URL", "memory://")
+os.environ.setdefault("CELERY_RESULT_BACKEND", "cache+memory://")
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,77 @@
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import create_engine, select
+
+from app.helpers.bulk_writer import BulkWriter, upsert_rows
+from app.models.counts import FaceDetectionCount
+from config.persistence.postgres_db import Base
+
+TABLE = FaceDetectionCount.__table__
+START = datetime(2025, 1, 1, 10, 0, 0)
+
+
+def detection(i, count=1, customer_id="acme"):
+    return FaceDetectionCount.row_from_detection(
+        original_image_url=f"https://cdn.local/img_{i}.jpg",
+        annotated_image_url=f"https://s3.local/img_{i}.jpg",
+        face_count=count,
+        device_imei="imei-1",
+        customer_id=customer_id,
+        datetime=START + timedelta(seconds=i),
+        faces_data=[{"bbox": [1, 2, 3, 4], "confidence": 0.9}] * (count or 0),
+    )
+
+
+@pytest.fixture
+def engine(tmp_path):
+    # A file, so the writer thread's connections see the same database
+    engine = create_engine(f"sqlite:///{tmp_path / 'faces.db'}")
+    Base.metadata.create_all(engine)
+    yield engine
+    engine.dispose()
+
+
+def stored_counts(engine):
+    with engine.connect() as conn:
+        return dict(conn.execute(select(TABLE.c.original_image_url, TABLE.c.face_count)).all())
+
+
+def test_multi_row_upsert_inserts_then_updates(engine):
+    with engine.begin() as conn:
+        assert upsert_rows(conn, [detection(i) for i in range(5)]) == 5
+    with engine.begin() as conn:
+        upsert_rows(conn, [detection(0, count=4), detection(5)])
+
+    counts = stored_counts(engine)
+    assert len(counts) == 6
+    assert counts["https://cdn.local/img_0.jpg"] == 4
+
+
+def test_duplicate_ids_collapse_to_the_newest_row(engine):
+    with engine.begin() as conn:
+        assert upsert_rows(conn, [detection(0, count=1), detection(1), detection(0, count=3)]) == 2
+    assert stored_counts(engine) == {"https://cdn.local/img_0.jpg": 3, "https://cdn.local/img_1.jpg": 1}
+
+
+def test_writer_batches_rows(engine):
+    writer = BulkWriter(engine=engine, flush_size=4, flush_interval_ms=50)
+    for i in range(10):
+        writer.submit(detection(i))
+    writer.close()
+
+    assert len(stored_counts(engine)) == 10
+    assert writer.stats["rows_written"] == 10
+    assert writer.stats["rows_failed"] == 0
+    assert writer.stats["flushes"] < 10
+
+
+def test_bad_row_falls_back_to_row_by_row(engine):
+    writer = BulkWriter(engine=engine, flush_size=3, flush_interval_ms=1000)
+    writer.submit(detection(0))
+    writer.submit(detection(1, count=None))   # violates NOT NULL, fails the whole batch
+    writer.submit(detection(2))
+    writer.close()
+
+    assert set(stored_counts(engine)) == {"https://cdn.local/img_0.jpg", "https://cdn.local/img_2.jpg"}
+    assert writer.stats == {"rows_written": 2, "rows_failed": 1, "flushes": 1}
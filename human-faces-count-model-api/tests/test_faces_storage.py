@@ -0,0 +1,76 @@
+from datetime import datetime
+
+import numpy as np
+import pytest
+from sqlalchemy import create_engine, insert, select
+
+from app.models import counts
+from app.models.counts import FaceDetectionCount, encode_faces, decode_boxes, decode_faces
+from config.persistence.migrations import convert_faces_data
+from config.persistence.postgres_db import Base
+
+TABLE = FaceDetectionCount.__table__
+FACES = [
+    {"bbox": [10, 20, 30, 40], "confidence": 0.87},
+    {"bbox": [0, 0, 1919, 1079], "confidence": 0.5},
+]
+
+
+def test_round_trip_keeps_the_api_shape():
+    blob = encode_faces(FACES)
+    assert len(blob) == 9 * len(FACES)
+    assert decode_faces(blob) == FACES
+
+
+def test_encoding_rounds_and_clips():
+    faces = [{"bbox": [10.4, 20.6, -3, 70000], "confidence": 1.2}, {"bbox": [1, 2, 3, 4], "confidence": 0.123}]
+    assert decode_faces(encode_faces(faces)) == [
+        {"bbox": [10, 21, 0, 65535], "confidence": 1.0},
+        {"bbox": [1, 2, 3, 4], "confidence": 0.12},
+    ]
+
+
+def test_no_faces():
+    assert encode_faces([]) == b""
+    assert decode_faces(b"") == []
+    boxes, confs = decode_boxes(b"")
+    assert boxes.shape == (0, 4) and confs.shape == (0,)
+
+
+def test_decode_boxes_are_views_of_the_blob():
+    boxes, confs = decode_boxes(encode_faces(FACES))
+    assert boxes.dtype == np.dtype("<u2") and confs.dtype == np.uint8
+    assert boxes.tolist() == [face["bbox"] for face in FACES]
+    assert not boxes.flags.owndata
+
+
+@pytest.mark.parametrize("storage", ["json", "blob"])
+def test_rows_follow_faces_storage(monkeypatch, storage):
+    monkeypatch.setattr(counts, "FACES_STORAGE", storage)
+    row = FaceDetectionCount.row_from_detection("https://cdn.local/a.jpg", "https://s3.local/a.jpg", 2,
+                                                "imei", "acme", datetime(2025, 1, 1), FACES)
+    assert (row["faces_data"] is not None) == (storage == "json")
+    assert (row["faces_blob"] is not None) == (storage == "blob")
+    assert FaceDetectionCount(**row).faces == FACES
+
+
+def test_migration_converts_json_rows_in_chunks(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'faces.db'}")
+    Base.metadata.create_all(engine)
+
+    def row(i, **columns):
+        return dict(id=f"{i:016x}", original_image_url=f"u{i}", annotated_image_url=f"a{i}", face_count=len(FACES),
+                    device_imei="imei", customer_id="acme", datetime=datetime(2025, 1, 1, 0, 0, i), **columns)
+
+    with engine.begin() as conn:
+        conn.execute(insert(TABLE), [row(i, faces_data=FACES, faces_blob=None) for i in range(5)])
+        conn.execute(insert(TABLE), [row(5, faces_data=None, faces_blob=encode_faces(FACES[:1]))])
+
+    assert convert_faces_data(engine, chunk_size=2) == 5
+    assert convert_faces_data(engine, chunk_size=2) == 0   # idempotent
+
+    with engine.connect() as conn:
+        stored = conn.execute(select(TABLE).order_by(TABLE.c.id)).all()
+    assert all(r.faces_data is None and r.faces_blob is not None for r in stored)
+    assert [decode_faces(r.faces_blob) for r in stored] == [FACES] * 5 + [FACES[:1]]
+    engine.dispose()
@@ -0,0 +1,86 @@
+import time
+
+import pytest
+
+from app.helpers.fair_scheduling import TenantLimiter, route_task, queue_name, lane_queues, shard_of
+from config.persistence.shared_store import InMemoryStore
+
+
+def test_live_frames_route_to_their_customer_shard():
+    route = route_task("save_image_and_metadata_task", ("https://x/a.jpg", "acme", "image/jpeg", "s"), {}, {})
+    assert route == {"queue": f"faces.live.{shard_of('acme')}"}
+
+    route = route_task("save_image_and_metadata_task", (), {"original_url": "u", "customer_id": "acme"}, {})
+    assert route == {"queue": queue_name("live", "acme")}
+
+
+def test_backfill_routes():
+    items = [{"original_url": "u", "customer_id": "globex"}]
+    assert route_task("process_image_batch_task", (items,), {}, {}) == {"queue": queue_name("backfill", "globex")}
+    # lane="backfill" on a single frame, e.g. a deferred stale frame
+    route = route_task("save_image_and_metadata_task", ("u", "globex", "image/jpeg", None), {"lane": "backfill"}, {})
+    assert route == {"queue": queue_name("backfill", "globex")}
+    assert route_task("some_other_task", (), {}, {}) is None
+
+
+def test_tasks_land_on_shard_queues_of_the_broker():
+    from app.celery_app import celery_app
+    from app.tasks.face_tasks import save_image_and_metadata_task, process_image_batch_task
+
+    customers = ["acme", "globex", "initech"]
+    with celery_app.connection_for_write() as conn:
+        channel = conn.default_channel
+        for queue in lane_queues("live") + lane_queues("backfill"):
+            channel.queue_declare(queue)
+            channel.queue_purge(queue)
+
+        for customer in customers:
+            save_image_and_metadata_task.apply_async(("u", customer, "image/jpeg", "s"), connection=conn)
+        process_image_batch_task.apply_async(([{"original_url": "u", "customer_id": "acme"}],), connection=conn)
+
+        def queued(queue):
+            return channel.queue_declare(queue, passive=True).message_count
+
+        for queue in lane_queues("live"):
+            assert queued(queue) == sum(queue_name("live", c) == queue for c in customers)
+        for queue in lane_queues("backfill"):
+            assert queued(queue) == (queue == queue_name("backfill", "acme"))
+
+
+@pytest.fixture
+def limiter():
+    return TenantLimiter(default_limit=2, limits={"vip": 0}, slot_ttl=0.3, store=InMemoryStore())
+
+
+def test_limiter_throttles_and_releases(limiter):
+    assert limiter.acquire("acme", "t1")
+    assert limiter.acquire("acme", "t2")
+    assert not limiter.acquire("acme", "t3")
+    assert limiter.acquire("globex", "t4")   # caps are per customer
+
+    limiter.release("acme", "t1")
+    assert limiter.acquire("acme", "t3")
+    assert not limiter.acquire("acme", "t5")
+
+
+def test_limiter_override_zero_is_unlimited(limiter):
+    assert all(limiter.acquire("vip", f"t{i}") for i in range(10))
+
+
+def test_leaked_slot_expires(limiter):
+    # A killed child never releases its slots
+    limiter.acquire("acme", "dead1")
+    limiter.acquire("acme", "dead2")
+    assert not limiter.acquire("acme", "t1")
+    time.sleep(0.4)
+    assert limiter.acquire("acme", "t1")
+
+
+def test_late_release_does_not_free_another_slot(limiter):
+    limiter.acquire("acme", "slow")
+    limiter.acquire("acme", "t1")
+    time.sleep(0.4)   # slow outlives the TTL and its slot is reclaimed
+    assert limiter.acquire("acme", "t2")
+    assert limiter.acquire("acme", "t3")
+    limiter.release("acme", "slow")   # must not drop anyone else's slot
+    assert not limiter.acquire("acme", "t4")
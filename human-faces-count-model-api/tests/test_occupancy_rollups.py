@@ -0,0 +1,176 @@
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, select
+from sqlalchemy.orm import sessionmaker
+
+from app.helpers import bulk_writer
+from app.helpers.bulk_writer import upsert_rows
+from app.helpers.occupancy_rollups import GRANULARITIES, backfill_rollups
+from app.models.counts import OccupancyMinute, OccupancyHour, OccupancyDay
+from app.routes import occupancy_routes
+from config.persistence.postgres_db import Base
+
+T0 = datetime(2025, 1, 1, 10, 0, 0)
+DAY = datetime(2025, 1, 1)
+
+
+@pytest.fixture
+def engine(tmp_path, monkeypatch):
+    monkeypatch.setattr(bulk_writer, "OCCUPANCY_ROLLUPS", True)
+    engine = create_engine(f"sqlite:///{tmp_path / 'faces.db'}")
+    Base.metadata.create_all(engine)
+    yield engine
+    engine.dispose()
+
+
+def row(i, count, at=None, device="imei-1", customer="acme"):
+    return dict(id=f"{i:016x}", original_image_url=f"https://cdn.local/{i}.jpg",
+                annotated_image_url=f"https://s3.local/{i}.jpg", face_count=count, device_imei=device,
+                customer_id=customer, datetime=at or T0 + timedelta(seconds=20 * i))
+
+
+def write(engine, *rows):
+    with engine.begin() as conn:
+        upsert_rows(conn, list(rows))
+
+
+def rollups(engine):
+    with engine.connect() as conn:
+        return {name: sorted(tuple(r) for r in conn.execute(select(model.__table__)))
+                for name, (model, _) in GRANULARITIES.items()}
+
+
+def bucket(engine, model, at, device="imei-1"):
+    with engine.connect() as conn:
+        return conn.execute(select(model.__table__).where(
+            model.device_imei == device, model.bucket == at)).mappings().one_or_none()
+
+
+def assert_matches_rebuild(engine):
+    merged = rollups(engine)
+    backfill_rollups(engine)
+    assert merged == rollups(engine)
+
+
+def test_new_rows_are_merged(engine):
+    write(engine, row(0, 2), row(1, 5), row(2, 1))
+    write(engine, row(3, 4))
+    hour = bucket(engine, OccupancyHour, T0)
+    assert (hour.samples, hour.count_sum, hour.count_min, hour.count_max, hour.last_count) == (4, 12, 1, 5, 4)
+    assert_matches_rebuild(engine)
+
+
+def test_identical_redelivery_is_counted_once(engine):
+    write(engine, row(0, 2), row(1, 5))
+    write(engine, row(0, 2))
+    write(engine, row(1, 5), row(1, 5))   # duplicate id within one batch
+    assert bucket(engine, OccupancyHour, T0).samples == 2
+    assert_matches_rebuild(engine)
+
+
+def test_changed_redelivery_rebuilds_its_buckets(engine):
+    write(engine, row(0, 2), row(1, 5), row(2, 1))
+    write(engine, row(1, 9))
+    hour = bucket(engine, OccupancyHour, T0)
+    assert (hour.samples, hour.count_sum, hour.count_max) == (3, 12, 9)
+
+    write(engine, row(1, 0))   # the old maximum must go away too
+    hour = bucket(engine, OccupancyHour, T0)
+    assert (hour.samples, hour.count_sum, hour.count_min, hour.count_max) == (3, 3, 0, 2)
+    assert_matches_rebuild(engine)
+
+
+def test_redelivery_on_another_device_moves_the_sample(engine):
+    write(engine, row(0, 2), row(1, 5))
+    write(engine, row(1, 5, device="imei-2"))
+    assert bucket(engine, OccupancyDay, DAY).samples == 1
+    assert bucket(engine, OccupancyDay, DAY, device="imei-2").samples == 1
+    assert_matches_rebuild(engine)
+
+
+def test_mixed_batch_of_new_same_and_changed_rows(engine):
+    write(engine, *(row(i, i % 3) for i in range(10)))
+    write(engine, row(2, 7), row(3, 0), row(12, 1), row(2, 8))
+    assert bucket(engine, OccupancyDay, DAY).samples == 11
+    assert_matches_rebuild(engine)
+
+
+def test_bucket_boundaries(engine):
+    write(engine,
+          row(0, 1, at=datetime(2025, 1, 1, 10, 59, 59)),
+          row(1, 2, at=datetime(2025, 1, 1, 11, 0, 0)),
+          row(2, 3, at=datetime(2025, 1, 1, 23, 59, 59, 999999)),
+          row(3, 4, at=datetime(2025, 1, 2, 0, 0, 0)))
+
+    assert bucket(engine, OccupancyMinute, datetime(2025, 1, 1, 10, 59)).samples == 1
+    assert bucket(engine, OccupancyMinute, datetime(2025, 1, 1, 11, 0)).samples == 1
+    assert bucket(engine, OccupancyHour, datetime(2025, 1, 1, 10)).last_count == 1
+    assert bucket(engine, OccupancyHour, datetime(2025, 1, 1, 11)).last_count == 2
+    day = bucket(engine, OccupancyDay, datetime(2025, 1, 1))
+    assert (day.samples, day.last_count, day.last_at) == (3, 3, datetime(2025, 1, 1, 23, 59, 59, 999999))
+    assert bucket(engine, OccupancyDay, datetime(2025, 1, 2)).samples == 1
+
+    # A changed row at a boundary only rebuilds the buckets it falls in
+    write(engine, row(1, 6, at=datetime(2025, 1, 1, 11, 0, 0)))
+    assert bucket(engine, OccupancyHour, datetime(2025, 1, 1, 11)).count_max == 6
+    assert bucket(engine, OccupancyHour, datetime(2025, 1, 1, 10)).count_max == 1
+    assert_matches_rebuild(engine)
+
+
+@pytest.fixture
+def client(engine, monkeypatch):
+    monkeypatch.setattr(occupancy_routes, "SyncSessionLocal", sessionmaker(bind=engine))
+    app = FastAPI()
+    app.include_router(occupancy_routes.router)
+    return TestClient(app)
+
+
+def get(client, **params):
+    return client.get("/occupancy/acme", params={k: v.isoformat() if isinstance(v, datetime) else v
+                                                 for k, v in params.items()})
+
+
+def test_range_query_is_start_inclusive_end_exclusive(engine, client):
+    write(engine, *(row(i, i, at=T0 + timedelta(minutes=i)) for i in range(10)))
+    write(engine, row(20, 7, at=T0 + timedelta(minutes=1), device="imei-2"))
+
+    # start mid-minute still returns that minute's bucket; end excludes the bucket starting at it
+    response = get(client, start=T0 + timedelta(minutes=2, seconds=30), end=T0 + timedelta(minutes=5))
+    assert response.status_code == 200
+    body = response.json()
+    assert body["granularity"] == "minute"
+    assert [(p["device_imei"], p["bucket"], p["last"]) for p in body["points"]] == [
+        ("imei-1", "2025-01-01T10:02:00", 2), ("imei-1", "2025-01-01T10:03:00", 3), ("imei-1", "2025-01-01T10:04:00", 4),
+    ]
+
+    body = get(client, start=T0, end=T0 + timedelta(hours=1), device_imei="imei-2").json()
+    assert [(p["device_imei"], p["max"]) for p in body["points"]] == [("imei-2", 7)]
+
+
+def test_range_query_granularities(engine, client):
+    write(engine, *(row(i, i % 4, at=T0 + timedelta(hours=5 * i)) for i in range(12)))
+
+    body = get(client, start=T0, end=T0 + timedelta(days=3)).json()
+    assert body["granularity"] == "hour"
+    assert len(body["points"]) == 12
+
+    body = get(client, start=T0 - timedelta(days=30), end=T0 + timedelta(days=30)).json()
+    assert body["granularity"] == "day"
+    assert [p["samples"] for p in body["points"]] == [3, 5, 4]
+    assert sum(p["avg"] * p["samples"] for p in body["points"]) == sum(i % 4 for i in range(12))
+
+    body = get(client, start=T0, end=T0 + timedelta(days=3), granularity="day").json()
+    assert [p["bucket"] for p in body["points"]] == ["2025-01-01T00:00:00", "2025-01-02T00:00:00", "2025-01-03T00:00:00"]
+
+
+def test_range_query_errors(engine, client, monkeypatch):
+    assert get(client, start=T0, end=T0).status_code == 422
+    assert get(client, start=T0, end=T0 + timedelta(hours=1), granularity="week").status_code == 422
+
+    write(engine, *(row(i, 1, at=T0 + timedelta(minutes=i)) for i in range(5)))
+    monkeypatch.setattr(occupancy_routes, "OCCUPANCY_MAX_POINTS", 3)
+    assert get(client, start=T0, end=T0 + timedelta(hours=1)).status_code == 422
+    assert get(client, start=T0, end=T0 + timedelta(hours=1), granularity="hour").status_code == 200
@@ -0,0 +1,99 @@
+import numpy as np
+import pytest
+
+from app.helpers import persistence
+from app.helpers.result_cache import ResultCache, url_cache_key, digest_cache_key
+from app.helpers.upload_pipeline import UploadPipeline
+from app.tasks import face_tasks
+from config.persistence.shared_store import InMemoryStore
+
+RESULT = {"count": 2, "faces": [{"bbox": [1, 2, 3, 4], "confidence": 0.9}] * 2, "annotated_url": "https://s3.local/a.jpg"}
+
+
+class BrokenStore:
+    def get(self, name):
+        raise ConnectionError("shared store down")
+
+    set = delete = get
+
+
+def test_keys_are_stable():
+    assert url_cache_key("https://cdn.local/a.jpg") == url_cache_key("https://cdn.local/a.jpg")
+    assert url_cache_key("https://cdn.local/a.jpg") != url_cache_key("https://cdn.local/b.jpg")
+    assert digest_cache_key(b"jpeg") == digest_cache_key(memoryview(b"jpeg"))
+
+
+def test_local_lru_evicts_the_least_recently_used():
+    store = InMemoryStore()
+    cache = ResultCache(max_entries=2, store=store)
+    cache.set("a", {"count": 1})
+    cache.set("b", {"count": 2})
+    assert cache.get("a") == {"count": 1}   # a is now the most recent
+    cache.set("c", {"count": 3})
+
+    assert list(cache._local) == ["a", "c"]
+    assert cache.get("b") == {"count": 2}   # evicted locally, still in the shared store
+    assert cache.stats == {"local_hits": 1, "shared_hits": 1, "misses": 0}
+
+
+def test_entries_are_shared_between_processes():
+    store = InMemoryStore()
+    ResultCache(store=store).set("k", RESULT)
+    other = ResultCache(store=store)
+    assert other.get("k") == RESULT
+    assert other.get("k") == RESULT
+    assert other.stats == {"local_hits": 1, "shared_hits": 1, "misses": 0}
+
+
+def test_shared_store_failures_are_misses():
+    cache = ResultCache(store=BrokenStore())
+    assert cache.get("k") is None
+    cache.set("k", RESULT)   # does not raise, kept locally
+    assert cache.get("k") == RESULT
+    cache.delete("k")
+    assert cache.get("k") is None
+    assert cache.stats["misses"] == 2
+
+
+def test_delete_drops_both_levels():
+    store = InMemoryStore()
+    cache = ResultCache(store=store)
+    cache.set("a", RESULT)
+    cache.set("b", RESULT)
+    cache.delete("a", "b")
+    assert cache.get("a") is None and cache.get("b") is None
+    assert store.get("a") is None
+
+
+class FailingS3:
+    def put_object(self, **kwargs):
+        raise IOError("S3 unavailable")
+
+
+def test_failed_upload_evicts_the_cached_result(monkeypatch):
+    cache = ResultCache(store=InMemoryStore())
+    uploads = UploadPipeline(client=FailingS3(), bucket="bucket", retries=0)
+    monkeypatch.setattr(face_tasks, "result_cache", cache)
+    monkeypatch.setattr(face_tasks, "RESULT_CACHE_ENABLED", True)
+    monkeypatch.setattr(persistence, "SAVE_MODE", "cloud")
+    monkeypatch.setattr(persistence, "S3_ASYNC_UPLOAD", True)
+    monkeypatch.setattr(persistence, "get_upload_pipeline", lambda: uploads)
+
+    prepared = face_tasks.PreparedImage(
+        original_url="https://cdn.local/a.jpg", customer_id="acme", fileType="image/jpeg", target_session=None,
+        url_key=url_cache_key("https://cdn.local/a.jpg"), digest_key=digest_cache_key(b"jpeg"),
+        frame=None, scale=1, imgsz=640, device_imei=None, name=None, signature=None,
+    )
+    url = uploads.submit(np.zeros((8, 8, 3), dtype=np.uint8), "acme/a.jpg", "image/jpeg")
+    entry = dict(RESULT, annotated_url=url)
+    cache.set(prepared.url_key, entry)
+    cache.set(prepared.digest_key, entry)
+    cache.set("unrelated", RESULT)
+
+    # What finish_image registers after caching; the upload may fail before or after this
+    persistence.on_upload_failure(url, lambda: face_tasks.forget_result(prepared, url))
+    uploads.drain()
+
+    assert cache.get(prepared.url_key) is None
+    assert cache.get(prepared.digest_key) is None
+    assert cache.get("unrelated") == RESULT
@@ -0,0 +1,56 @@
+import random
+import threading
+import time
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.helpers.staleness import StalenessTracker, capture_epoch
+from config.persistence.shared_store import InMemoryStore
+
+T0 = datetime(2025, 10, 23, 14, 32, 54)
+
+
+@pytest.fixture
+def tracker():
+    return StalenessTracker(max_age=0, ttl=60, store=InMemoryStore())
+
+
+def test_marker_only_moves_forward(tracker):
+    tracker.mark("imei", T0 + timedelta(seconds=10))
+    tracker.mark("imei", T0)
+    assert tracker.newest("imei") == capture_epoch(T0 + timedelta(seconds=10))
+
+
+def test_concurrent_marks_keep_the_newest(tracker):
+    captures = [T0 + timedelta(seconds=i) for i in range(200)]
+    random.shuffle(captures)
+    threads = [threading.Thread(target=tracker.mark, args=("imei", dt)) for dt in captures]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert tracker.newest("imei") == capture_epoch(T0 + timedelta(seconds=199))
+
+
+def test_superseded_frames_are_stale(tracker):
+    tracker.mark("imei", T0)
+    assert tracker.stale_reason("imei", T0, now=T0) is None
+    tracker.mark("imei", T0 + timedelta(seconds=5))
+    assert tracker.stale_reason("imei", T0, now=T0).startswith("superseded by a frame captured at 2025-10-23 14:32:59")
+    assert tracker.stale_reason("other", T0, now=T0) is None
+
+
+def test_old_frames_are_stale():
+    tracker = StalenessTracker(max_age=30, store=InMemoryStore())
+    assert tracker.stale_reason("imei", T0, now=T0 + timedelta(seconds=20)) is None
+    assert tracker.stale_reason("imei", T0, now=T0 + timedelta(seconds=40)).startswith("captured 40s ago")
+
+
+def test_capture_times_are_utc_whatever_the_host_timezone(monkeypatch):
+    for zone in ("UTC", "America/New_York", "Asia/Kolkata"):
+        monkeypatch.setenv("TZ", zone)
+        time.tzset()
+        assert capture_epoch(datetime(1970, 1, 1, 0, 0, 10)) == 10
+    monkeypatch.undo()
+    time.tzset()
@@ -0,0 +1,134 @@
+import threading
+import time
+
+import numpy as np
+import pytest
+
+from app.helpers import persistence
+from app.helpers.upload_pipeline import UploadPipeline, s3_object_url
+
+FRAME = np.zeros((32, 32, 3), dtype=np.uint8)
+
+
+class StubS3:
+    """put_object/upload_fileobj stand-in that fails the first `failures` calls."""
+
+    def __init__(self, failures=0, gate=None):
+        self.failures = failures
+        self.gate = gate
+        self.calls = []
+        self.objects = {}
+
+    def _store(self, kind, key, body):
+        if self.gate is not None:
+            self.gate.wait(5)
+        self.calls.append((kind, key))
+        if self.failures:
+            self.failures -= 1
+            raise IOError("S3 unavailable")
+        self.objects[key] = body
+
+    def put_object(self, Body, Bucket, Key, ContentType):
+        self._store("put", Key, Body)
+
+    def upload_fileobj(self, Fileobj, Bucket, Key, ExtraArgs=None, Config=None):
+        self._store("multipart", Key, Fileobj.read())
+
+
+def pipeline(client, **kwargs):
+    kwargs.setdefault("max_workers", 2)
+    kwargs.setdefault("max_pending", 4)
+    kwargs.setdefault("retries", 2)
+    kwargs.setdefault("multipart_threshold", 1 << 30)
+    return UploadPipeline(client=client, bucket="bucket", **kwargs)
+
+
+def test_submit_returns_the_object_url_and_uploads():
+    client = StubS3()
+    uploads = pipeline(client)
+    assert uploads.submit(FRAME, "c/a.jpg", "image/jpeg") == s3_object_url("c/a.jpg", "bucket")
+    uploads.drain()
+    assert client.calls == [("put", "c/a.jpg")]
+    assert client.objects["c/a.jpg"][:2] == b"\xff\xd8"
+    assert uploads.stats == {"uploaded": 1, "failed": 0, "retries": 0}
+    assert uploads.pending == 0
+
+
+def test_transient_failures_are_retried():
+    client = StubS3(failures=2)
+    uploads = pipeline(client, retries=2)
+    uploads.submit(FRAME, "c/a.jpg", "image/jpeg")
+    uploads.drain()
+    assert len(client.calls) == 3
+    assert uploads.stats == {"uploaded": 1, "failed": 0, "retries": 2}
+
+
+def test_large_bodies_use_multipart():
+    client = StubS3()
+    uploads = pipeline(client, multipart_threshold=4096)
+    uploads.submit(np.random.randint(0, 255, (256, 256, 3), dtype=np.uint8), "c/big.jpg", "image/jpeg")
+    uploads.submit(FRAME, "c/small.jpg", "image/jpeg")
+    uploads.drain()
+    assert sorted(client.calls) == [("multipart", "c/big.jpg"), ("put", "c/small.jpg")]
+
+
+def test_submit_blocks_when_max_pending_are_in_flight():
+    gate = threading.Event()
+    uploads = pipeline(StubS3(gate=gate), max_workers=1, max_pending=2)
+    uploads.submit(FRAME, "c/1.jpg", "image/jpeg")
+    uploads.submit(FRAME, "c/2.jpg", "image/jpeg")
+
+    third = threading.Thread(target=uploads.submit, args=(FRAME, "c/3.jpg", "image/jpeg"))
+    third.start()
+    third.join(0.2)
+    assert third.is_alive()
+    assert uploads.pending == 2
+
+    gate.set()
+    third.join(5)
+    assert not third.is_alive()
+    uploads.drain()
+    assert uploads.pending == 0
+    assert uploads.stats["uploaded"] == 3
+
+
+def test_failure_callbacks_run_once_the_upload_is_given_up():
+    uploads = pipeline(StubS3(failures=10), retries=0)
+    fired, done = [], []
+    url = uploads.submit(FRAME, "c/a.jpg", "image/jpeg", on_done=done.append)
+    uploads.when_failed(url, lambda: fired.append("in flight"))
+    uploads.drain()
+    uploads.when_failed(url, lambda: fired.append("late"))   # registered after the failure: runs at once
+
+    assert done == [False]
+    assert fired == ["in flight", "late"]
+    assert uploads.stats["failed"] == 1
+
+
+def test_no_failure_callbacks_after_success():
+    uploads = pipeline(StubS3())
+    fired, done = [], []
+    url = uploads.submit(FRAME, "c/a.jpg", "image/jpeg", on_done=done.append)
+    uploads.when_failed(url, lambda: fired.append("in flight"))
+    uploads.drain()
+    uploads.when_failed(url, lambda: fired.append("late"))
+    assert done == [True]
+    assert fired == []
+
+
+@pytest.mark.parametrize("failures, expected", [(0, "s3"), (10, "original")])
+def test_row_is_written_after_the_upload(monkeypatch, failures, expected):
+    uploads = pipeline(StubS3(failures=failures), retries=0)
+    rows = []
+    monkeypatch.setattr(persistence, "SAVE_MODE", "cloud")
+    monkeypatch.setattr(persistence, "S3_ASYNC_UPLOAD", True)
+    monkeypatch.setattr(persistence, "get_upload_pipeline", lambda: uploads)
+    monkeypatch.setattr(persistence, "save_metadata_to_db", lambda *args: rows.append(args))
+
+    original = "https://cdn.local/350612079150221_20251023_143254.jpg"
+    url, _ = persistence.save_image_and_metadata(FRAME, [], 0, original, "acme", "image/jpeg")
+    uploads.drain()
+
+    assert url == s3_object_url("acme/350612079150221/10/20251023/350612079150221_20251023_143254.jpg", "bucket")
+    assert len(rows) == 1
+    assert rows[0][1] == (url if expected == "s3" else original)